@@ -1,4 +1,3 @@
-import asyncio
 import json
 import re
 import textwrap
@@ -42,6 +41,7 @@ from aliasing.workshop import WorkshopCollectableObject
 from cogs5e.models.errors import ConsumableException, InvalidArgument
 from utils.argparser import argparse
 from utils.dice import PersistentRollContext
+from utils.executors import run_in_executor
 
 DEFAULT_BUILTINS = {
     # builtins
@@ -755,9 +755,7 @@ class ScriptingEvaluator(draconic.DraconicInterpreter):
         self, string, execution_scope: ExecutionScope = ExecutionScope.UNKNOWN, invoking_object: _CodeInvokerT = None
     ):
         """Async convenience method around :meth:`ScriptingEvaluator.transformed_str`."""
-        return await asyncio.get_event_loop().run_in_executor(
-            None, self.transformed_str, string, execution_scope, invoking_object
-        )
+        return await run_in_executor("draconic", self.transformed_str, string, execution_scope, invoking_object)
 
     def transformed_str(
         self, string, execution_scope: ExecutionScope = ExecutionScope.UNKNOWN, invoking_object: _CodeInvokerT = None
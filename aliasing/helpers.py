@@ -7,6 +7,7 @@ import disnake
 import draconic
 from disnake.ext.commands import ArgumentParsingError
 
+import cogs5e.initiative as init
 from aliasing import evaluators
 from aliasing.api.functions import AliasException
 from aliasing.constants import CVAR_SIZE_LIMIT, GVAR_SIZE_LIMIT, SVAR_SIZE_LIMIT, UVAR_SIZE_LIMIT, VAR_NAME_LIMIT
@@ -355,6 +356,7 @@ async def parse_snippets(args, ctx, statblock=None, character=None) -> str:
     elif statblock is not None:
         evaluator.with_statblock(statblock)
 
+    acquired_lock = await _acquire_combat_lock(ctx)
     try:
         for index, arg in enumerate(args):  # parse snippets
             server_invoker = False
@@ -381,7 +383,11 @@ async def parse_snippets(args, ctx, statblock=None, character=None) -> str:
                 arg = await evaluator.transformed_str_async(arg, execution_scope=ExecutionScope.PERSONAL_SNIPPET)
                 args[index] = argquote(arg)
     finally:
-        await evaluator.run_commits()
+        try:
+            await evaluator.run_commits()
+        finally:
+            if acquired_lock:
+                init.Combat.release_lock(ctx)
     return " ".join(args)
 
 
@@ -404,15 +410,33 @@ async def parse_draconic(
         evaluator.with_character(character)
     elif statblock is not None:
         evaluator.with_statblock(statblock)
+    acquired_lock = await _acquire_combat_lock(ctx)
     try:
         out = await evaluator.transformed_str_async(
             program, execution_scope=execution_scope, invoking_object=invoking_object
         )
     finally:
-        await evaluator.run_commits()
+        try:
+            await evaluator.run_commits()
+        finally:
+            if acquired_lock:
+                init.Combat.release_lock(ctx)
     return out
 
 
+async def _acquire_combat_lock(ctx):
+    """
+    Takes the lock of the channel's combat before running a script, since the script may modify the combat and can't
+    wait for the lock from the thread it runs on.
+
+    :return: Whether the lock was acquired by this call (if not, the invocation already held it).
+    :raises CombatBusy: if another command holds the lock for too long.
+    """
+    if ctx.guild is None:  # there is no combat to modify
+        return False
+    return await init.Combat.acquire_lock(ctx, timeout=init.combat.COMBAT_LOCK_SCRIPT_TIMEOUT)
+
+
 # handler
 async def handle_alias_exception(ctx, err):
     e = err.original
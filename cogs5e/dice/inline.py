@@ -1,11 +1,15 @@
+import asyncio
+import functools
 import re
 import time
 
+import cachetools
 import d20
 import disnake
 
 import utils.settings
 from cogs5e.models import embeds
+from cogs5e.models.character import Character
 from cogs5e.models.errors import AvraeException, InvalidArgument, NoCharacter
 from utils import constants
 from utils.aldclient import discord_user_to_dict
@@ -16,11 +20,14 @@ from .utils import string_search_adv
 INLINE_ROLLING_EMOJI = "\U0001f3b2"  # :game_die:
 INLINE_ROLLING_RE = re.compile(r"\[\[(.+?]?)]]")
 _sentinel = object()
+_parser = d20.Roller()
 
 
 class InlineRoller:
     def __init__(self, bot):
         self.bot = bot
+        # (user id, onboarding type) pairs we know have been onboarded; onboarding is never undone
+        self._onboarded = cachetools.LRUCache(maxsize=100000)
 
     # ==== entrypoints ====
     async def handle_message_inline_rolls(self, message):
@@ -28,15 +35,17 @@ class InlineRoller:
         if not INLINE_ROLLING_RE.search(message.content):
             return
 
-        # inline rolling feature flag
-        if not await self.bot.ldclient.variation(
-            "cog.dice.inline_rolling.enabled", user=discord_user_to_dict(message.author), default=False
-        ):
+        # inline rolling feature flag and server settings
+        flag_enabled, guild_settings = await asyncio.gather(
+            self.bot.ldclient.variation(
+                "cog.dice.inline_rolling.enabled", user=discord_user_to_dict(message.author), default=False
+            ),
+            self._get_guild_settings(message.guild),
+        )
+        if not flag_enabled:
             return
 
-        if message.guild is not None:  # (always enabled in pms)
-            guild_settings = await utils.settings.ServerSettings.for_guild(self.bot.mdb, message.guild.id)
-
+        if guild_settings is not None:  # (always enabled in pms)
             # if inline rolling is disabled on this server, skip
             if guild_settings.inline_enabled is utils.settings.guild.InlineRollingType.DISABLED:
                 return
@@ -71,46 +80,59 @@ class InlineRoller:
         if message.guild is None:
             return
 
-        # inline rolling feature flag
-        if not await self.bot.ldclient.variation(
-            "cog.dice.inline_rolling.enabled", user=discord_user_to_dict(message.author), default=False
-        ):
+        # inline rolling feature flag and server settings
+        flag_enabled, guild_settings = await asyncio.gather(
+            self.bot.ldclient.variation(
+                "cog.dice.inline_rolling.enabled", user=discord_user_to_dict(message.author), default=False
+            ),
+            self._get_guild_settings(message.guild),
+        )
+        if not flag_enabled:
             return
 
         # if inline rolling is not set to reactions, skip
-        guild_settings = await utils.settings.ServerSettings.for_guild(self.bot.mdb, message.guild.id)
         if guild_settings.inline_enabled is not utils.settings.guild.InlineRollingType.REACTION:
             return
 
-        # if this message has already been processed, skip
-        if await self.bot.rdb.get(f"cog.dice.inline_rolling.messages.{message.id}.processed"):
+        # save that this message has been processed, unless it already has been, in which case skip
+        if not await self.bot.rdb.set(
+            f"cog.dice.inline_rolling.messages.{message.id}.processed", str(time.time()), ex=60 * 60 * 24, nx=True
+        ):
             return
 
-        # otherwise save that this message has been processed, remove reactions, and do the rolls
-        await self.bot.rdb.setex(
-            f"cog.dice.inline_rolling.messages.{message.id}.processed", str(time.time()), 60 * 60 * 24
-        )
+        # remove reactions and do the rolls
         await self.do_inline_rolls(message)
         try:
             await reaction.clear()
         except disnake.HTTPException:
             pass
 
+    async def _get_guild_settings(self, guild):
+        if guild is None:
+            return None
+        return await utils.settings.ServerSettings.for_guild(self.bot.mdb, guild.id)
+
     # ==== execution ====
     async def do_inline_rolls(self, message):
-        roll_exprs = _find_inline_exprs(message.content)
+        out = await self.roll_message(message)
+        if not out:
+            return
+
+        await message.reply("\n".join(out))
 
+    async def roll_message(self, message):
+        """Rolls all of the inline expressions in a message, returning a list of result lines."""
         out = []
         roller = d20.Roller(context=PersistentRollContext())
         char_replacer = CharacterReplacer(self.bot, message)
-        for expr, context_before, context_after in roll_exprs:
+        for expr, context_before, context_after in _find_inline_exprs(message.content):
             context_before = context_before.replace("\n", " ")
             context_after = context_after.replace("\n", " ")
 
             try:
                 expr, char_comment = await char_replacer.replace(expr)
                 expr, adv = string_search_adv(expr)
-                result = roller.roll(expr, advantage=adv, allow_comments=True)
+                result = roller.roll(_parse_inline_expr(expr), advantage=adv)
                 if result.comment:
                     out.append(f"**{result.comment.strip()}**: {result.result}")
                 elif char_comment:
@@ -121,15 +143,23 @@ class InlineRoller:
                 continue
             except (d20.RollError, AvraeException) as e:
                 out.append(f"{context_before}({e!s}){context_after}")
-
-        if not out:
-            return
-
-        await message.reply("\n".join(out))
+        return out
 
     # ==== onboarding ====
+    async def _is_onboarded(self, user, onboarding_type):
+        if (user.id, onboarding_type) in self._onboarded:
+            return True
+        if await self.bot.rdb.get(f"cog.dice.inline_rolling.users.{user.id}.onboarded.{onboarding_type}"):
+            self._onboarded[user.id, onboarding_type] = True
+            return True
+        return False
+
+    async def _set_onboarded(self, user, onboarding_type):
+        await self.bot.rdb.set(f"cog.dice.inline_rolling.users.{user.id}.onboarded.{onboarding_type}", str(time.time()))
+        self._onboarded[user.id, onboarding_type] = True
+
     async def inline_rolling_message_onboarding(self, user):
-        if await self.bot.rdb.get(f"cog.dice.inline_rolling.users.{user.id}.onboarded.message"):
+        if await self._is_onboarded(user, "message"):
             return
 
         embed = embeds.EmbedWithColor()
@@ -156,10 +186,10 @@ class InlineRoller:
             await user.send(embed=embed)
         except disnake.HTTPException:
             return
-        await self.bot.rdb.set(f"cog.dice.inline_rolling.users.{user.id}.onboarded.message", str(time.time()))
+        await self._set_onboarded(user, "message")
 
     async def inline_rolling_reaction_onboarding(self, user):
-        if await self.bot.rdb.get(f"cog.dice.inline_rolling.users.{user.id}.onboarded.reaction"):
+        if await self._is_onboarded(user, "reaction"):
             return
 
         embed = embeds.EmbedWithColor()
@@ -185,7 +215,7 @@ class InlineRoller:
             await user.send(embed=embed)
         except disnake.HTTPException:
             return
-        await self.bot.rdb.set(f"cog.dice.inline_rolling.users.{user.id}.onboarded.reaction", str(time.time()))
+        await self._set_onboarded(user, "reaction")
 
 
 # ==== character-aware rolls ====
@@ -201,12 +231,16 @@ class CharacterReplacer:
         self._character = _sentinel
 
     async def _get_character(self):
-        if self._character is not _sentinel:
-            return self._character
-        elif self._character is None:
+        if self._character is None:
             raise NoCharacter()
-        ctx = await self.bot.get_context(self.message)
-        character = await ctx.get_character()
+        elif self._character is not _sentinel:
+            return self._character
+        guild_id = self.message.guild.id if self.message.guild is not None else None
+        try:
+            character = await Character.from_bot_and_owner(self.bot, self.message.author.id, guild_id)
+        except NoCharacter:
+            self._character = None
+            raise
         self._character = character
         return character
 
@@ -240,6 +274,12 @@ class CharacterReplacer:
 
 
 # ==== helpers ====
+@functools.lru_cache(maxsize=1024)
+def _parse_inline_expr(expr):
+    """Parses an inline roll expression (with comments), caching the parsed tree since rolling does not modify it."""
+    return _parser.parse(expr, allow_comments=True)
+
+
 def _find_inline_exprs(content, context_before=5, context_after=2, max_context_len=128):
     """Returns an iterator of tuples (expr, context_before, context_after)."""
 
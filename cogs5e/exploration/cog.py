@@ -251,16 +251,7 @@ class ExplorationTracker(commands.Cog):
                     numrounds = numrounds * 10 * 60
 
                 messages = await exploration.skip_rounds(ctx, numrounds)
-                if len(messages[1]) > 0:
-                    embed = EmbedWithColor()
-                    embed.description = "\n".join(messages[1])
-                    await ctx.author.send(embed=embed)
-                out = [exploration.get_summary()]
-                await ctx.send("\n".join(out))
-                if messages[0] is not None and messages[0] != "":
-                    embed = EmbedWithColor()
-                    embed.description = messages[0]
-                    await ctx.send(embed=embed)
+                await self._send_skip_messages(ctx, exploration, messages)
                 await exploration.final()
 
     @explore.command()
@@ -276,12 +267,30 @@ class ExplorationTracker(commands.Cog):
             if combat is not None:
                 await ctx.send("Can't rest during combat! Finish the combat first.")
             else:
-                if length is "short":
-                    exploration.skip_rounds(600)
-                elif length is "long":
-                    exploration.skip_rounds(4800)
+                if length == "short":
+                    messages = await exploration.skip_rounds(ctx, 600)
+                elif length == "long":
+                    messages = await exploration.skip_rounds(ctx, 4800)
                 else:
-                    await ctx.send("Invalid rest length. It has to be either short or long")
+                    return await ctx.send("Invalid rest length. It has to be either short or long")
+                await ctx.send(f"The party takes a {length} rest.")
+                await self._send_skip_messages(ctx, exploration, messages)
+                await exploration.final()
+
+    @staticmethod
+    async def _send_skip_messages(ctx, exploration, messages):
+        """Sends the encounters rolled (to the DM) and the lights that ran out while skipping rounds."""
+        light_end_messages, encounter_messages = messages
+        if len(encounter_messages) > 0:
+            embed = EmbedWithColor()
+            embed.description = "\n".join(encounter_messages)
+            await ctx.author.send(embed=embed)
+        out = [exploration.get_summary()]
+        await ctx.send("\n".join(out))
+        if light_end_messages is not None and light_end_messages != "":
+            embed = EmbedWithColor()
+            embed.description = light_end_messages
+            await ctx.send(embed=embed)
 
     @explore.command(name="list", aliases=["summary"])
     async def list(self, ctx, *args):
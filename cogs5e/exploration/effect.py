@@ -151,6 +151,8 @@ class Effect:
         """Sets the parent of an effect."""
         self.parent = EffectReference.from_effect(parent)
         parent.children.append(EffectReference.from_effect(self))
+        if self.explorer is not None:
+            self.explorer._invalidate_summary_cache()
         return self
 
     @property
@@ -1,4 +1,5 @@
 import logging
+import random
 from collections import namedtuple
 
 import cachetools
@@ -13,6 +14,8 @@ from ..models.embeds import EmbedWithColor
 
 log = logging.getLogger(__name__)
 
+D100 = range(1, 101)
+
 
 class Encounter:
     # cache encounters for 10 seconds to avoid race conditions
@@ -286,16 +289,14 @@ class Encounter:
         :param: chance: how likely it is for an encounter to be rolled
         :return: List of (encounter, number appearing) tuples
         """
-        dice = self.dice_expression
-        adv = d20.AdvType.NONE
-        encounters = []
-        for n in range(number):
-            chn = d20.roll("1d100", advantage=adv, allow_comments=True, stringifier=VerboseMDStringifier()).total
-            if chn < chance:
-                res = d20.roll(dice, advantage=adv, allow_comments=True, stringifier=VerboseMDStringifier())
-                total = res.total
-                encounters.append(self.get_renc(total))
-        return encounters
+        # each check is a d100 roll under the chance - roll them all at once, then only roll the encounter table for
+        # the checks that succeeded
+        checks = random.choices(D100, k=number)
+        num_encounters = sum(1 for chn in checks if chn < chance)
+        if not num_encounters:
+            return []
+        dice = d20.parse(self.dice_expression, allow_comments=True)
+        return [self.get_renc(d20.roll(dice).total) for _ in range(num_encounters)]
 
 
 SetActiveResult = namedtuple("SetActiveResult", "did_unset_server_active")
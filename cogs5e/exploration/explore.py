@@ -353,6 +353,23 @@ class Explore:
         self.encthreshold = number
         self.enctimer = number
 
+    def _advance_enctimer(self, num_rounds):
+        """
+        Advances the encounter timer by a number of rounds at once.
+        The timer counts down every round; when it reaches 0, an encounter check is made and it resets to the threshold.
+
+        :return: The number of encounter checks made in that time.
+        """
+        if num_rounds < self._enctimer:
+            self._enctimer -= num_rounds
+            return 0
+        elapsed = num_rounds - self._enctimer  # rounds since the first check
+        if self._encthreshold <= 0:
+            self._enctimer = 0
+            return 1
+        self._enctimer = self._encthreshold - elapsed % self._encthreshold
+        return 1 + elapsed // self._encthreshold
+
     async def skip_rounds(self, ctx, num_rounds):
         messages = []
         light_end_messages = []
@@ -361,13 +378,9 @@ class Explore:
         except NoEncounter:
             enc = None
         if self._enctimer != 0 and enc is not None:
-            div = num_rounds // self._enctimer
-            mod = num_rounds % self._enctimer
-            if div == 0:
-                self._enctimer -= num_rounds
-            else:
-                self._enctimer = self._encthreshold - mod
-                encounter_list = enc.roll_encounters(div, self.chance)
+            num_checks = self._advance_enctimer(num_rounds)
+            if num_checks:
+                encounter_list = enc.roll_encounters(num_checks, self.chance)
                 encounter_strs = ["Random encounters rolled:\n"]
                 for enc in encounter_list:
                     if enc[1] is None:
@@ -1,4 +1,3 @@
-import asyncio
 import datetime
 import json
 import logging
@@ -18,6 +17,7 @@ from cogs5e.sheets.abc import SheetLoaderABC
 from .errors import MissingValues
 from .encounter import Encounter
 from utils import config
+from utils.executors import run_in_executor
 
 log = logging.getLogger(__name__)
 
@@ -136,7 +136,7 @@ class GoogleSheet(SheetLoaderABC):
                 return gspread.authorize(credentials)
 
             try:
-                GoogleSheet.g_client = await asyncio.get_event_loop().run_in_executor(None, _)
+                GoogleSheet.g_client = await run_in_executor("gsheet", _)
             except:
                 GoogleSheet._client_initializing = False
                 raise
@@ -157,7 +157,7 @@ class GoogleSheet(SheetLoaderABC):
                 )
 
             try:
-                await asyncio.get_event_loop().run_in_executor(None, _)
+                await run_in_executor("gsheet", _)
             except:
                 GoogleSheet._client_initializing = False
                 raise
@@ -190,7 +190,7 @@ class GoogleSheet(SheetLoaderABC):
             )
         except Exception:
             raise
-        return await asyncio.get_event_loop().run_in_executor(None, self._load_encounter, owner_id)
+        return await run_in_executor("gsheet", self._load_encounter, owner_id)
 
     def _load_encounter(self, owner_id: str):
         active = False
@@ -216,8 +216,7 @@ class GoogleSheet(SheetLoaderABC):
             await self._init_gsheet_client()
         elif GoogleSheet._is_expired():
             await self._refresh_google_token()
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._genc)
+        return await run_in_executor("gsheet", self._genc)
 
     def get_number_appearing(self):
         """Returns a list of strings containing dice expressions used when rolling number of monsters"""
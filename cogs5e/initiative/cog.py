@@ -58,6 +58,8 @@ class InitTracker(commands.Cog):
 
     async def cog_before_invoke(self, ctx):
         await try_delete(ctx.message)
+        # serialize commands in the same channel so they don't interleave modifications to the combat
+        await Combat.acquire_lock(ctx)
 
     def cog_unload(self):
         self.nlp.deregister_listeners()
@@ -1405,7 +1407,6 @@ class InitTracker(commands.Cog):
     @init.command()
     async def end(self, ctx, args=None):
         """Ends combat in the channel."""
-
         to_end = await confirm(ctx, "Are you sure you want to end combat? (Reply with yes/no)", True)
 
         if to_end is None:
@@ -1415,6 +1416,7 @@ class InitTracker(commands.Cog):
 
         msg = await ctx.send("OK, ending...")
         combat = await ctx.get_combat()
+        combat.cancel_summary_update()
 
         with suppress(disnake.HTTPException):
             await ctx.author.send(f"End of combat report: {combat.round_num} rounds " f"{combat.get_summary(True)}")
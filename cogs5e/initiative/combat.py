@@ -1,4 +1,6 @@
 import asyncio
+import logging
+import weakref
 from functools import cached_property
 from typing import Any, List, Optional, TYPE_CHECKING
 
@@ -6,8 +8,11 @@ import cachetools
 import discord
 import disnake.ext.commands
 from d20 import roll
+from pymongo.errors import DuplicateKeyError
 
+import cogs5e.models.character
 from cogs5e.models.errors import NoCharacter
+from utils import config
 from utils.functions import search_and_select
 from .combatant import Combatant, MonsterCombatant, PlayerCombatant
 from .errors import *
@@ -15,6 +20,15 @@ from .group import CombatantGroup
 from .types import CombatantType
 
 COMBAT_TTL = 60 * 60 * 24 * 7  # 1 week TTL
+COMBAT_CACHE_TTL = 60 * 60  # keep idle combats in memory for 1 hour
+COMBAT_WRITE_BEHIND_DELAY = 2  # seconds to wait before persisting a combat, to coalesce bursts of commands
+# seconds to wait before editing the summary message, to coalesce bursts of commands into one edit
+# tests expect edits to be sent in order with the rest of a command's responses
+# how long scripts wait for another command to finish with the channel's combat before giving up, in seconds
+COMBAT_LOCK_SCRIPT_TIMEOUT = 5
+SUMMARY_EDIT_DEBOUNCE = 0 if config.TESTING else 1
+
+log = logging.getLogger(__name__)
 
 # ==== typing ====
 _NLPRecorderT = Any
@@ -27,12 +41,18 @@ if TYPE_CHECKING:
 
 # ==== code ====
 class Combat:
-    # cache combats for 10 seconds to avoid race conditions
+    # the in-memory combat is authoritative on the shard that owns its channel
     # this makes sure that multiple calls to Combat.from_ctx() in the same invocation or two simultaneous ones
-    # retrieve/modify the same Combat state
-    # caches based on channel id
-    # probably won't encounter any scaling issues, since a combat will be shard-specific
-    _cache = cachetools.TTLCache(maxsize=50, ttl=10)
+    # retrieve/modify the same Combat state, and saves a db round trip on each command
+    # caches based on channel id; the TTL is refreshed on each access
+    # writes from other processes are detected by the version field on commit
+    _cache = cachetools.TTLCache(maxsize=1000, ttl=COMBAT_CACHE_TTL)
+    # per-channel locks to serialize commands that modify a combat
+    _locks = weakref.WeakValueDictionary()
+    # channel id -> (combat, pending write-behind task)
+    _pending_writes = {}
+    # channel id -> pending summary message edit task
+    _pending_summary_edits = {}
 
     def __init__(
         self,
@@ -47,6 +67,7 @@ class Combat:
         current_index: Optional[int] = None,
         metadata: dict = None,
         nlp_record_session_id: str = None,
+        version: int = 0,
     ):
         if combatants is None:
             combatants = []
@@ -63,6 +84,7 @@ class Combat:
         self.ctx = ctx
         self._metadata = metadata
         self.nlp_record_session_id = nlp_record_session_id
+        self._version = version  # the version of the combat document this combat was loaded from/last wrote
 
     @classmethod
     def new(cls, channel_id, message_id, dm_id, options, ctx):
@@ -72,12 +94,20 @@ class Combat:
     @classmethod
     async def from_ctx(cls, ctx):  # cached
         channel_id = str(ctx.channel.id)
-        return await cls.from_id(channel_id, ctx)
+        # the caller is going to modify the combat, so make sure no one else is
+        acquired = await cls.acquire_lock(ctx)
+        try:
+            return await cls.from_id(channel_id, ctx)
+        except CombatNotFound:
+            # don't serialize commands in channels without a combat
+            if acquired:
+                cls.release_lock(ctx)
+            raise
 
     @classmethod
     async def from_id(cls, channel_id, ctx):
         try:
-            return cls._cache[channel_id]
+            inst = cls._cache[channel_id]
         except KeyError:
             raw = await ctx.bot.mdb.combats.find_one({"channel": channel_id})
             if raw is None:
@@ -87,6 +117,22 @@ class Combat:
             cls._cache[channel_id] = inst
             return inst
 
+        # refresh the TTL and contextualize the cached instance
+        cls._cache[channel_id] = inst
+        inst.contextualize(ctx)
+        # characters may have been modified outside of combat since this combat was loaded
+        players = [c for c in inst.get_combatants() if isinstance(c, PlayerCombatant)]
+        if players:
+            await cogs5e.models.character.Character.prefetch_many(
+                ctx.bot, [(c.character_owner, c.character_id) for c in players]
+            )
+            for pc in players:
+                try:
+                    await pc.update_character_ref(ctx)
+                except NoCharacter:
+                    inst._drop_character(pc)
+        return inst
+
     @classmethod
     async def from_dict(cls, raw, ctx):
         inst = cls(
@@ -101,7 +147,10 @@ class Combat:
             raw["current"],
             raw.get("metadata"),
             raw.get("nlp_record_session_id"),
+            raw.get("version", 0),
         )
+        # load all player characters in one query rather than one per combatant
+        await cogs5e.models.character.Character.prefetch_many(ctx.bot, get_raw_character_ids(raw["combatants"]))
         for c in raw["combatants"]:
             inst._combatants.append(await deserialize_combatant(c, ctx, inst))
         return inst
@@ -109,9 +158,11 @@ class Combat:
     # sync deser/ser
     @classmethod
     def from_ctx_sync(cls, ctx):  # cached
+        # this runs on an alias evaluation thread, so it can't wait for the lock; the evaluation takes it before it
+        # starts instead (see aliasing.helpers.parse_draconic)
         channel_id = str(ctx.channel.id)
         try:
-            return cls._cache[channel_id]
+            inst = cls._cache[channel_id]
         except KeyError:
             raw = ctx.bot.mdb.combats.delegate.find_one({"channel": channel_id})
             if raw is None:
@@ -121,6 +172,17 @@ class Combat:
             cls._cache[channel_id] = inst
             return inst
 
+        cls._cache[channel_id] = inst
+        inst.contextualize(ctx)
+        # only pick up characters that are already loaded: this runs on an alias evaluation thread, so we don't want to
+        # wait on the db, and the character refs are checked against the db on the next command that loads the combat
+        for pc in inst.get_combatants():
+            if isinstance(pc, PlayerCombatant):
+                cached = cogs5e.models.character.Character._cache.get((pc.character_owner, pc.character_id))
+                if cached is not None:
+                    pc._character = cached
+        return inst
+
     @classmethod
     def from_dict_sync(cls, raw, ctx):
         inst = cls(
@@ -135,6 +197,7 @@ class Combat:
             raw["current"],
             raw.get("metadata"),
             raw.get("nlp_record_session_id"),
+            raw.get("version", 0),
         )
         for c in raw["combatants"]:
             inst._combatants.append(deserialize_combatant_sync(c, ctx, inst))
@@ -154,6 +217,21 @@ class Combat:
             "nlp_record_session_id": self.nlp_record_session_id,
         }
 
+    def _drop_character(self, pc):
+        """
+        Replaces a player combatant whose character was deleted with a generic combatant, like we do when loading a
+        combat with a deleted character.
+        """
+        combatant = Combatant.from_dict(pc.to_dict(), pc.ctx, self)
+        container = self.get_group(pc.group) if pc.group is not None else self
+        container._combatants[container._combatants.index(pc)] = combatant
+
+    def contextualize(self, ctx):
+        """Sets the context of this combat and all of its combatants to a new invocation's context."""
+        self.ctx = ctx
+        for c in self.get_combatants(groups=True):
+            c.ctx = ctx
+
     # members
     @property
     def channel(self):
@@ -310,6 +388,9 @@ class Combat:
         self._combatants = sorted(self._combatants, key=lambda k: (k.init, int(k.init_skill)), reverse=True)
         for n, c in enumerate(self._combatants):
             c.index = n
+        # summaries reference other combatants by index
+        for c in self.get_combatants():
+            c._invalidate_summary_cache()
 
         if current is not None:
             self._current_index = current.index
@@ -509,6 +590,10 @@ class Combat:
         """Ends combat in a channel."""
         for c in self._combatants:
             c.on_remove()
+        self.cancel_summary_update()
+        pending = Combat._pending_writes.pop(self.channel, None)
+        if pending is not None:
+            pending[1].cancel()
         await self.ctx.bot.mdb.combats.delete_one({"channel": self.channel})
         try:
             del Combat._cache[self.channel]
@@ -580,32 +665,163 @@ class Combat:
 
     # db
     async def commit(self):
-        """Commits the combat to db."""
+        """
+        Commits the combat to db.
+
+        :raises CombatVersionConflict: If the stored combat was modified by another process since it was loaded.
+        """
         if not self.ctx:
             raise RequiresContext
         for pc in self.get_combatants():
             if isinstance(pc, PlayerCombatant):
                 await pc.character.commit(self.ctx)
-        await self.ctx.bot.mdb.combats.update_one(
-            {"channel": self.channel}, {"$set": self.to_dict(), "$currentDate": {"lastchanged": True}}, upsert=True
-        )
+
+        new_version = self._version + 1
+        data = {**self.to_dict(), "version": new_version}
+        update = {"$set": data, "$currentDate": {"lastchanged": True}}
+        if self._version == 0:
+            # new combat, or a combat saved before versioning (which has no version field)
+            try:
+                await self.ctx.bot.mdb.combats.update_one(
+                    {"channel": self.channel, "version": {"$in": [None, 0]}}, update, upsert=True
+                )
+            except DuplicateKeyError:
+                self._on_version_conflict()
+        else:
+            result = await self.ctx.bot.mdb.combats.update_one(
+                {"channel": self.channel, "version": self._version}, update
+            )
+            if result.matched_count == 0:
+                self._on_version_conflict()
+        self._version = new_version
+
+    def _on_version_conflict(self):
+        # drop our copy so that the next command reloads the combat from the db
+        if Combat._cache.get(self.channel) is self:
+            del Combat._cache[self.channel]
+        raise CombatVersionConflict()
+
+    async def commit_soon(self):
+        """
+        Schedules the combat to be committed to db shortly, coalescing multiple calls into a single write.
+        Combats that have never been saved are committed immediately.
+        """
+        Combat._cache[self.channel] = self
+        if self._version == 0:
+            await self.commit()
+        elif self.channel not in Combat._pending_writes:
+            Combat._pending_writes[self.channel] = (self, asyncio.create_task(self._write_behind()))
+
+    async def _write_behind(self):
+        await asyncio.sleep(COMBAT_WRITE_BEHIND_DELAY)
+        # wait for any command modifying the combat to finish, so we don't write its half-done changes
+        async with Combat.lock(self.channel):
+            # pop before writing so any changes made during the write schedule another one
+            Combat._pending_writes.pop(self.channel, None)
+            try:
+                await self.commit()
+            except CombatVersionConflict:
+                log.warning(f"Combat in channel {self.channel} was modified elsewhere, discarding in-memory state")
+            except Exception as e:
+                log.exception(f"Failed to write combat in channel {self.channel}: {e}")
+
+    @staticmethod
+    async def flush_pending_writes():
+        """Immediately commits all combats with pending write-behind commits. Called on shutdown."""
+        pending = list(Combat._pending_writes.values())
+        Combat._pending_writes.clear()
+        for combat, task in pending:
+            task.cancel()
+            async with Combat.lock(combat.channel):
+                try:
+                    await combat.commit()
+                except Exception as e:
+                    log.warning(f"Failed to flush combat in channel {combat.channel}: {e}")
 
     async def final(self):
-        """Commit, update the summary message, and fire any recorder events in parallel."""
+        """Commit (write-behind), update the summary message, and fire any recorder events in parallel."""
         if self.nlp_recorder is None:
-            await asyncio.gather(self.commit(), self.update_summary())
+            await asyncio.gather(self.commit_soon(), self.update_summary())
         else:
-            await asyncio.gather(self.commit(), self.update_summary(), self.nlp_recorder.on_combat_commit(self))
+            await asyncio.gather(self.commit_soon(), self.update_summary(), self.nlp_recorder.on_combat_commit(self))
+
+    # locking
+    @staticmethod
+    def lock(channel_id):
+        """
+        Returns the lock used to serialize modifications to the combat in the given channel.
+        Locks are shared between all callers in this process while anyone holds a reference to them.
+
+        :rtype: asyncio.Lock
+        """
+        channel_id = str(channel_id)
+        lock = Combat._locks.get(channel_id)
+        if lock is None:
+            lock = Combat._locks[channel_id] = asyncio.Lock()
+        return lock
+
+    @staticmethod
+    async def acquire_lock(ctx, timeout=None):
+        """
+        Acquires the lock of the context's channel for the rest of the invocation, unless the invocation already holds
+        it. The lock is released by :meth:`release_lock` once the invocation is done (see ``Avrae.invoke``).
+
+        :param timeout: How long to wait for the lock, in seconds (forever if None).
+        :return: Whether the lock was acquired by this call.
+        :raises CombatBusy: if the lock could not be acquired in time.
+        """
+        if ctx.combat_lock is not None:
+            return False
+        lock = Combat.lock(ctx.channel.id)
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise CombatBusy()
+        ctx.combat_lock = lock
+        return True
+
+    @staticmethod
+    def release_lock(ctx):
+        """Releases the lock of the context's channel, if the invocation holds it."""
+        lock = ctx.combat_lock
+        if lock is not None:
+            ctx.combat_lock = None
+            lock.release()
 
     # misc
     @staticmethod
     async def ensure_unique_chan(ctx):
-        if await ctx.bot.mdb.combats.find_one({"channel": str(ctx.channel.id)}):
+        channel_id = str(ctx.channel.id)
+        if channel_id in Combat._cache or await ctx.bot.mdb.combats.find_one({"channel": channel_id}):
             raise ChannelInCombat
 
     async def update_summary(self):
-        """Edits the summary message with the latest summary."""
-        await self.get_summary_msg().edit(content=self.get_summary())
+        """
+        Edits the summary message with the latest summary.
+        Updates made within a short window of each other are coalesced into a single edit with the latest state.
+        """
+        if not SUMMARY_EDIT_DEBOUNCE:
+            await self.get_summary_msg().edit(content=self.get_summary())
+        elif self.channel not in Combat._pending_summary_edits:
+            Combat._pending_summary_edits[self.channel] = asyncio.create_task(self._debounced_update_summary())
+
+    async def _debounced_update_summary(self):
+        await asyncio.sleep(SUMMARY_EDIT_DEBOUNCE)
+        # pop before editing so any changes made during the edit schedule another one
+        Combat._pending_summary_edits.pop(self.channel, None)
+        try:
+            await self.get_summary_msg().edit(content=self.get_summary())
+        except discord.HTTPException as e:
+            log.warning(f"Failed to update summary of combat in channel {self.channel}: {e}")
+        except Exception as e:
+            # nothing awaits this task, so anything we don't log here is lost
+            log.exception(f"Failed to update summary of combat in channel {self.channel}: {e}")
+
+    def cancel_summary_update(self):
+        """Cancels any pending summary message edit, e.g. before the summary message is edited manually."""
+        pending = Combat._pending_summary_edits.pop(self.channel, None)
+        if pending is not None:
+            pending.cancel()
 
     def get_channel(self):
         """Gets the Channel object of the combat."""
@@ -626,6 +842,18 @@ class Combat:
         return f"Initiative in <#{self.channel}>"
 
 
+def get_raw_character_ids(raw_combatants):
+    """Returns a list of (owner, upstream) pairs for each player combatant in a list of serialized combatants."""
+    ids = []
+    for c in raw_combatants:
+        ctype = CombatantType(c["type"])
+        if ctype == CombatantType.PLAYER:
+            ids.append((c["character_owner"], c["character_id"]))
+        elif ctype == CombatantType.GROUP:
+            ids.extend(get_raw_character_ids(c["combatants"]))
+    return ids
+
+
 async def deserialize_combatant(raw_combatant, ctx, combat):
     ctype = CombatantType(raw_combatant["type"])
     if ctype == CombatantType.GENERIC:
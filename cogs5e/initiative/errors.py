@@ -7,6 +7,8 @@ __all__ = (
     "ChannelInCombat",
     "CombatChannelNotFound",
     "NoCombatants",
+    "CombatVersionConflict",
+    "CombatBusy",
 )
 
 
@@ -49,3 +51,17 @@ class NoCombatants(CombatException):
 
     def __init__(self):
         super().__init__("There are no combatants.")
+
+
+class CombatVersionConflict(CombatException):
+    """Raised when a combat is committed but the stored combat was modified by another process."""
+
+    def __init__(self):
+        super().__init__("This combat was modified elsewhere. Please try again.")
+
+
+class CombatBusy(CombatException):
+    """Raised when the combat in a channel is being modified by another command for too long to wait for it."""
+
+    def __init__(self):
+        super().__init__("The combat in this channel is busy with another command. Please try again in a moment.")
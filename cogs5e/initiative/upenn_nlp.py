@@ -6,13 +6,20 @@ Redis - if the key is present in for a given guild channel, that channel is cons
 
 This key is set when a combat starts and expired 2 minutes after a combat ends in a channel that has opted in to NLP
 recording.
+
+Events are buffered in memory and flushed to a sink (Kinesis Firehose, or a local JSON lines file when
+``NLP_LOCAL_SINK_PATH`` is set) in batches. Combat state is recorded as a full snapshot the first time a combat is
+committed, and as a JSON patch against the previous snapshot afterwards. If a combat's state fails to be delivered, the
+next state recorded for it is a full snapshot again.
 """
+import asyncio
+import copy
 import datetime
 import hashlib
 import logging
 import re
 import time
-from typing import Any, List, MutableMapping, Optional, Sequence, Tuple
+from typing import Any, Dict, List, MutableMapping, Optional, Sequence, Tuple
 
 import botocore.exceptions
 import cachetools
@@ -22,6 +29,7 @@ from pydantic import BaseModel, Field
 
 import utils.context
 from utils import config
+from utils.executors import run_in_executor
 from .combat import Combat
 from .utils import nlp_feature_flag_enabled
 
@@ -113,6 +121,71 @@ class RecordedCombatState(RecordedEvent):
         )
 
 
+class RecordedCombatStateDiff(RecordedEvent):
+    event_type = "combat_state_diff"
+    patch: List[dict]  # RFC 6902 JSON patch against the previous combat_state_update/combat_state_diff
+    human_readable: Optional[str]  # None if unchanged
+
+
+# ==== sinks ====
+class FirehoseSink:
+    """Sends events to the NLP Kinesis Firehose delivery stream."""
+
+    def __init__(self, client):
+        self._client = client
+
+    @classmethod
+    async def create(cls):
+        boto_session = get_session()
+        client = await boto_session.create_client("firehose", region_name=config.DYNAMO_REGION).__aenter__()
+        return cls(client)
+
+    async def put(self, events: Sequence[RecordedEvent]) -> List[RecordedEvent]:
+        """Sends a batch of events. Returns the events that could not be delivered."""
+        try:
+            response = await self._client.put_record_batch(
+                DeliveryStreamName=config.NLP_KINESIS_DELIVERY_STREAM,
+                Records=[{"Data": event.json().encode()} for event in events],
+            )
+        except botocore.exceptions.ClientError:
+            log.exception(f"Failed to record {len(events)} NLP events")
+            return list(events)
+
+        log.debug(str(response))
+        if not (failed_count := response.get("FailedPutCount")):
+            return []
+        log.error(f"Failed to record {failed_count} NLP events; response={response!r}")
+        # the responses are in the same order as the records, and the failed ones have an error code
+        return [
+            event
+            for event, record_response in zip(events, response.get("RequestResponses", []))
+            if record_response.get("ErrorCode")
+        ]
+
+    async def close(self):
+        await self._client.__aexit__(None, None, None)
+
+
+class FileSink:
+    """Appends events to a local file as JSON lines, for running the recorder offline."""
+
+    def __init__(self, path):
+        self.path = path
+
+    async def put(self, events: Sequence[RecordedEvent]) -> List[RecordedEvent]:
+        """Appends a batch of events to the file. Returns the events that could not be delivered (none)."""
+        lines = [f"{event.json()}\n" for event in events]
+        await run_in_executor("nlp-sink", self._write, lines)
+        return []
+
+    def _write(self, lines):
+        with open(self.path, "a") as f:
+            f.writelines(lines)
+
+    async def close(self):
+        pass
+
+
 # ==== recorder ====
 class NLPRecorder:
     # cache: channel id -> (when channels are recorded until, combat id); (0, None) if not recorded
@@ -120,22 +193,34 @@ class NLPRecorder:
         maxsize=100000, ttl=120
     )
 
+    # cache: combat id -> last recorded combat state (to_dict, human readable summary)
+    _last_combat_state: MutableMapping[str, Tuple[dict, str]] = cachetools.TTLCache(maxsize=1000, ttl=ONE_MONTH_SECS)
+
     def __init__(self, bot):
         self.bot = bot
-        self._kinesis_firehose = None
+        self._sink = None
+        self._buffer: List[RecordedEvent] = []
+        self._flush_task = None
 
     async def initialize(self):
-        if config.NLP_KINESIS_DELIVERY_STREAM is None:
+        if config.NLP_LOCAL_SINK_PATH is not None:
+            self._sink = FileSink(config.NLP_LOCAL_SINK_PATH)
+        elif config.NLP_KINESIS_DELIVERY_STREAM is not None:
+            self._sink = await FirehoseSink.create()
+        else:
             log.warning("'NLP_KINESIS_DELIVERY_STREAM' env var is not set - nlp module will not record any events")
             return
-        boto_session = get_session()
-        self._kinesis_firehose = await boto_session.create_client(
-            "firehose", region_name=config.DYNAMO_REGION
-        ).__aenter__()
+        self._flush_task = asyncio.create_task(self._flush_loop())
 
     def close(self):
-        if self._kinesis_firehose is not None:
-            self.bot.loop.create_task(self._kinesis_firehose.__aexit__(None, None, None))
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        if self._sink is not None:
+            self.bot.loop.create_task(self._close_sink())
+
+    async def _close_sink(self):
+        await self.flush()
+        await self._sink.close()
 
     def register_listeners(self):
         self.bot.add_listener(self.on_message)
@@ -207,8 +292,8 @@ class NLPRecorder:
         await self._update_channel_recording_until(
             guild_id=combat.ctx.guild.id, channel_id=int(combat.channel), combat_id=combat.nlp_record_session_id
         )
-        # record a snapshot of the combat's human-readable and machine-readable state
-        await self._record_event(RecordedCombatState.from_combat(combat))
+        # record the changes to the combat's human-readable and machine-readable state since the last snapshot
+        await self._record_event(self._combat_state_event(combat))
 
     async def on_combat_end(self, combat: Combat):
         """
@@ -223,6 +308,7 @@ class NLPRecorder:
         )
         # record a combat end meta marker
         await self._record_event(RecordedEvent(combat_id=combat.nlp_record_session_id, event_type="combat_end"))
+        self._last_combat_state.pop(combat.nlp_record_session_id, None)
 
     # ==== management ====
     async def get_recording_channels(self, guild_id: int):
@@ -321,48 +407,80 @@ class NLPRecorder:
         )
         return recording_until
 
-    async def _record_event(self, event: RecordedEvent):
-        """Saves an event to the recording for the given combat ID."""
-        if self._kinesis_firehose is None:
-            log.warning("skipping event because kinesis firehose is not initialized")
-            return
-        if not await nlp_feature_flag_enabled(self.bot):
-            log.debug("NLP feature flag is disabled, dropping event")
-            return
+    def _combat_state_event(self, combat: Combat) -> RecordedEvent:
+        """
+        Returns a full snapshot of the combat's state if this is the first time we have seen it, or a diff against the
+        last snapshot otherwise.
+        """
+        combat_id = combat.nlp_record_session_id
+        data = combat.to_dict()
+        human_readable = combat.get_summary(private=True)
+        last_state = self._last_combat_state.get(combat_id)
+        # copy so the snapshot does not share mutable state with the combat
+        self._last_combat_state[combat_id] = (copy.deepcopy(data), human_readable)
+
+        if last_state is None:
+            return RecordedCombatState(combat_id=combat_id, data=data, human_readable=human_readable)
+        last_data, last_human_readable = last_state
+        return RecordedCombatStateDiff(
+            combat_id=combat_id,
+            patch=json_diff(last_data, data),
+            human_readable=human_readable if human_readable != last_human_readable else None,
+        )
 
-        log.debug(f"saving 1 event to {event.combat_id=} of type {event.event_type!r}")
-        try:
-            response = await self._kinesis_firehose.put_record(
-                DeliveryStreamName=config.NLP_KINESIS_DELIVERY_STREAM, Record={"Data": event.json().encode()}
-            )
-        except botocore.exceptions.ClientError:
-            log.exception(f"Failed to record NLP event to {event.combat_id=} of type {event.event_type!r}")
-        else:
-            log.debug(str(response))
+    async def _record_event(self, event: RecordedEvent):
+        """Buffers an event to be saved to the recording for the given combat ID."""
+        await self._record_events([event])
 
     async def _record_events(self, events: Sequence[RecordedEvent]):
-        """Saves many events to the recording for the given combat ID."""
+        """Buffers many events to be saved to the recording for the given combat ID."""
         if not events:
             return
-        if self._kinesis_firehose is None:
-            log.warning(f"skipping {len(events)} events because kinesis firehose is not initialized")
+        if self._sink is None:
+            log.warning(f"skipping {len(events)} events because the nlp sink is not initialized")
             return
+
+        log.debug(f"buffering {len(events)} events")
+        self._buffer.extend(events)
+        if len(self._buffer) >= config.NLP_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        """Saves all buffered events to the sink."""
+        if not self._buffer or self._sink is None:
+            return
+        events, self._buffer = self._buffer, []
         if not await nlp_feature_flag_enabled(self.bot):
-            log.debug("NLP feature flag is disabled, dropping event")
+            log.debug(f"NLP feature flag is disabled, dropping {len(events)} events")
+            self._forget_combat_states(events)
             return
 
-        log.debug(f"saving {len(events)} events to kinesis")
-        try:
-            response = await self._kinesis_firehose.put_record_batch(
-                DeliveryStreamName=config.NLP_KINESIS_DELIVERY_STREAM,
-                Records=[{"Data": event.json().encode()} for event in events],
-            )
-        except botocore.exceptions.ClientError:
-            log.exception(f"Failed to record {len(events)} NLP events")
-        else:
-            log.debug(str(response))
-            if failed_count := response.get("FailedPutCount"):
-                log.error(f"Failed to record {failed_count} NLP events; response={response!r}")
+        log.debug(f"saving {len(events)} events")
+        for i in range(0, len(events), config.NLP_BATCH_SIZE):
+            batch = events[i : i + config.NLP_BATCH_SIZE]
+            try:
+                failed = await self._sink.put(batch)
+            except Exception as e:
+                log.exception(f"Failed to record {len(batch)} NLP events: {e}")
+                failed = batch
+            self._forget_combat_states(failed)
+
+    def _forget_combat_states(self, events: Sequence[RecordedEvent]):
+        """
+        Forgets the last recorded state of each combat with a state event in *events* (which were not delivered), so
+        that the next state recorded for it is a full snapshot rather than a diff against a state that was never saved.
+        """
+        for event in events:
+            if isinstance(event, (RecordedCombatState, RecordedCombatStateDiff)):
+                self._last_combat_state.pop(event.combat_id, None)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(config.NLP_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.exception(f"Failed to flush NLP events: {e}")
 
     # ==== docdb ingest impls ====
     # async def _record_event_docdb(self, combat_id: str, event: RecordedEvent):
@@ -388,6 +506,36 @@ class NLPRecorder:
 
 
 # ==== helpers ====
+def json_diff(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """
+    Returns a list of RFC 6902 JSON patch operations that transform *old* into *new*.
+    Dicts are diffed by key and lists of equal length by index; anything else is replaced wholesale.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old.keys() - new.keys():
+            ops.append({"op": "remove", "path": f"{path}/{_escape_json_pointer(key)}"})
+        for key, value in new.items():
+            key_path = f"{path}/{_escape_json_pointer(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": key_path, "value": value})
+            else:
+                ops.extend(json_diff(old[key], value, key_path))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for i, (old_value, new_value) in enumerate(zip(old, new)):
+            ops.extend(json_diff(old_value, new_value, f"{path}/{i}"))
+        return ops
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def _escape_json_pointer(key) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
 def anonymize_id(user_id: int) -> str:
     """
     Returns a new unique ID for the given user ID that cannot be linked back to the original ID.
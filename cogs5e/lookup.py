@@ -629,7 +629,7 @@ class Lookup(commands.Cog):
             out.append(f"pm_result set to {setting}!")
 
         if out:
-            await guild_settings.commit(ctx.bot.mdb)
+            await guild_settings.commit(ctx.bot.mdb, ctx.bot.rdb)
             await ctx.send("Lookup settings set:\n" + "\n".join(out))
         else:
             await ctx.send(f"No settings found. Try using `{ctx.prefix}lookup_settings` to open an interactive menu.")
@@ -723,7 +723,7 @@ class Lookup(commands.Cog):
 
         if guild.member_count >= LARGE_THRESHOLD:
             guild_settings = utils.settings.ServerSettings(guild_id=guild.id, lookup_dm_required=False)
-            await guild_settings.commit(self.bot.mdb)
+            await guild_settings.commit(self.bot.mdb, self.bot.rdb)
 
 
 def setup(bot):
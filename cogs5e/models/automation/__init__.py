@@ -1,6 +1,7 @@
 import aliasing.api.statblock
 import aliasing.evaluators
 from utils.functions import get_guild_member
+from utils.loopwatch import activity
 from .effects import *
 from .errors import *
 from .results import *
@@ -96,11 +97,12 @@ class Automation:
         if before is not None:
             before(autoctx)
 
-        for effect in self.effects:
-            await effect.preflight(autoctx)
+        with activity(f"automation: {spell.name}" if spell is not None else "automation"):
+            for effect in self.effects:
+                await effect.preflight(autoctx)
 
-        for effect in self.effects:
-            results.append(effect.run(autoctx))
+            for effect in self.effects:
+                results.append(effect.run(autoctx))
 
         if after is not None:
             after(autoctx)
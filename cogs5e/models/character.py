@@ -1,8 +1,10 @@
+import copy
 import logging
 from collections import namedtuple
 
 import cachetools
 from discord.ext.commands import NoPrivateMessage
+from pymongo import ReturnDocument
 
 import aliasing.evaluators
 from cogs5e.models.ddbsync import DDBSheetSync
@@ -20,6 +22,7 @@ from cogs5e.models.sheet.statblock import DESERIALIZE_MAP as _DESER, StatBlock
 from cogs5e.models.sheet.coinpurse import Coinpurse
 from cogs5e.sheets.abc import SHEET_VERSION
 from utils.functions import search_and_select
+from utils.redisIO import publish_command
 from utils.settings import CharacterSettings
 
 log = logging.getLogger(__name__)
@@ -29,11 +32,14 @@ log = logging.getLogger(__name__)
 
 
 class Character(StatBlock):
-    # cache characters for 10 seconds to avoid race conditions
+    # cache characters for 5 minutes to avoid reloads and race conditions
     # this makes sure that multiple calls to Character.from_ctx() in the same invocation or two simultaneous ones
     # retrieve/modify the same Character state
-    # caches based on (owner, upstream)
-    _cache = cachetools.TTLCache(maxsize=50, ttl=5)
+    # caches based on (owner, upstream); other clusters drop stale entries when a newer version is committed
+    _cache = cachetools.TTLCache(maxsize=1000, ttl=5 * 60)
+    # which character each owner has active
+    # owner -> {guild id -> upstream active on that guild, None -> globally active upstream}; None if no character
+    _active_cache = cachetools.TTLCache(maxsize=10000, ttl=5 * 60)
 
     def __init__(
         self,
@@ -69,6 +75,8 @@ class Character(StatBlock):
         active_guilds: list = None,
         options_v2: CharacterSettings = None,
         coinpurse=None,
+        version: int = 0,
+        import_hash: str = None,
         **kwargs,
     ):
         if actions is None:
@@ -92,6 +100,9 @@ class Character(StatBlock):
         self._active_guilds = active_guilds
         self._sheet_type = sheet_type
         self._import_version = import_version
+        self._import_hash = import_hash  # a hash of the upstream data this character was imported from, if known
+        self._version = version  # incremented by the database on every commit
+        self._committed_state = None  # see _mark_committed()
         self.coinpurse = coinpurse
 
         # StatBlock super call
@@ -150,31 +161,98 @@ class Character(StatBlock):
     def from_dict(cls, d):
         if "_id" in d:
             del d["_id"]
+        # remember the state as stored before deserializing (and sharing) parts of it, see _mark_committed()
+        committed_state = _committed_state_of(d)
         for key, klass in DESERIALIZE_MAP.items():
             if key in d:
                 d[key] = klass.from_dict(d[key])
-        return cls(**d)
+        inst = cls(**d)
+        inst._committed_state = committed_state
+        return inst
 
     @classmethod
     async def from_ctx(cls, ctx, ignore_guild: bool = False):
-        owner_id = str(ctx.author.id)
-        active_character = None
-        if ctx.guild is not None and not ignore_guild:
-            guild_id = str(ctx.guild.id)
-            active_character = await ctx.bot.mdb.characters.find_one({"owner": owner_id, "active_guilds": guild_id})
-        if active_character is None:
-            active_character = await ctx.bot.mdb.characters.find_one({"owner": owner_id, "active": True})
+        guild_id = ctx.guild.id if ctx.guild is not None and not ignore_guild else None
+        return await cls.from_bot_and_owner(ctx.bot, ctx.author.id, guild_id)
+
+    @classmethod
+    async def from_bot_and_owner(cls, bot, owner_id, guild_id=None):
+        """
+        Returns the character active for the given owner, preferring one active on the given guild if passed.
+
+        :raises NoCharacter: if the owner has no active character.
+        """
+        owner_id = str(owner_id)
+        if guild_id is not None:
+            guild_id = str(guild_id)
+
+        upstream, active_character = await cls._get_active_upstream(bot, owner_id, guild_id)
         if active_character is None:
+            try:
+                return await cls.from_bot_and_ids(bot, owner_id, upstream)
+            except NoCharacter:
+                # the character was deleted since we last saw it, look up the active character again
+                cls._active_cache.pop(owner_id, None)
+                upstream, active_character = await cls._get_active_upstream(bot, owner_id, guild_id)
+                if active_character is None:
+                    return await cls.from_bot_and_ids(bot, owner_id, upstream)
+
+        # return from cache if available and up to date
+        cached = cls._cache.get((owner_id, upstream))
+        if cached is not None and cached._version >= active_character.get("version", 0):
+            return cached
+        # otherwise deserialize and write to cache
+        inst = cls.from_dict(active_character)
+        cls._cache[owner_id, upstream] = inst
+        return inst
+
+    @classmethod
+    async def _get_active_upstream(cls, bot, owner_id: str, guild_id: str = None):
+        """
+        Returns a pair (upstream, character document) for the owner's active character in the given guild.
+        The document is None if the upstream was read from the active character cache.
+
+        :raises NoCharacter: if the owner has no active character.
+        """
+        active_upstreams = cls._active_cache.get(owner_id)
+        if active_upstreams is None:
+            active_upstreams = cls._active_cache[owner_id] = {}
+
+        active_character = None
+        if guild_id is not None:
+            if guild_id not in active_upstreams:
+                active_character = await bot.mdb.characters.find_one({"owner": owner_id, "active_guilds": guild_id})
+                active_upstreams[guild_id] = active_character["upstream"] if active_character is not None else None
+            if active_upstreams[guild_id] is not None:
+                return active_upstreams[guild_id], active_character
+
+        if None not in active_upstreams:
+            active_character = await bot.mdb.characters.find_one({"owner": owner_id, "active": True})
+            active_upstreams[None] = active_character["upstream"] if active_character is not None else None
+        if active_upstreams[None] is None:
             raise NoCharacter()
+        return active_upstreams[None], active_character
 
-        try:
-            # return from cache if available
-            return cls._cache[owner_id, active_character["upstream"]]
-        except KeyError:
-            # otherwise deserialize and write to cache
-            inst = cls.from_dict(active_character)
-            cls._cache[owner_id, active_character["upstream"]] = inst
-            return inst
+    @classmethod
+    def invalidate(cls, owner_id: str, upstream: str, version: int = None):
+        """
+        Removes a character from this process' cache if the cached copy is older than *version* (or regardless of its
+        version, if *version* is not passed).
+        """
+        cached = cls._cache.get((owner_id, upstream))
+        if cached is not None and (version is None or cached._version < version):
+            cls._cache.pop((owner_id, upstream), None)
+
+    @classmethod
+    def invalidate_active(cls, owner_id: str):
+        """Forgets which characters the given owner has active in this process."""
+        cls._active_cache.pop(owner_id, None)
+
+    @staticmethod
+    async def publish_active_changed(rdb, owner_id: str):
+        """Forgets which characters the given owner has active on all clusters."""
+        Character.invalidate_active(owner_id)
+        await publish_command(rdb, "invalidate_active_character", [owner_id])
 
     @classmethod
     async def from_bot_and_ids(cls, bot, owner_id: str, character_id: str):
@@ -212,6 +290,28 @@ class Character(StatBlock):
         cls._cache[owner_id, character_id] = inst
         return inst
 
+    @classmethod
+    async def prefetch_many(cls, bot, ids):
+        """
+        Loads many characters into the character cache in a single query, so that subsequent calls to
+        :meth:`from_bot_and_ids` for the same characters hit the cache.
+        Characters that are already cached or do not exist are skipped.
+
+        :param bot: The bot.
+        :param ids: An iterable of (owner_id, character_id) pairs.
+        """
+        missing = {(str(owner_id), character_id) for owner_id, character_id in ids}
+        missing = [key for key in missing if key not in cls._cache]
+        if not missing:
+            return
+
+        query = {"$or": [{"owner": owner_id, "upstream": character_id} for owner_id, character_id in missing]}
+        async for character in bot.mdb.characters.find(query):
+            key = (character["owner"], character["upstream"])
+            # another invocation may have cached the character while we were waiting on the db
+            if key not in cls._cache:
+                cls._cache[key] = cls.from_dict(character)
+
     # ---------- Serialization ----------
     def to_dict(self):
         d = super().to_dict()
@@ -222,6 +322,7 @@ class Character(StatBlock):
                 "active": self._active,
                 "sheet_type": self._sheet_type,
                 "import_version": self._import_version,
+                "import_hash": self._import_hash,
                 "description": self._description,
                 "image": self._image,
                 "cvars": self.cvars,
@@ -243,10 +344,10 @@ class Character(StatBlock):
     @staticmethod
     async def delete(ctx, owner_id, upstream):
         await ctx.bot.mdb.characters.delete_one({"owner": owner_id, "upstream": upstream})
-        try:
-            del Character._cache[owner_id, upstream]
-        except KeyError:
-            pass
+        Character.invalidate(owner_id, upstream)
+        # drop the character from other clusters' caches regardless of version
+        await publish_command(ctx.bot.rdb, "invalidate_character", [owner_id, upstream, None])
+        await Character.publish_active_changed(ctx.bot.rdb, owner_id)
 
     # ---------- Basic CRUD ----------
     def get_color(self) -> int:
@@ -315,25 +416,94 @@ class Character(StatBlock):
         return out
 
     # ---------- DATABASE ----------
-    async def commit(self, ctx, do_live_integrations=True):
-        """Writes a character object to the database, under the contextual author."""
+    def _commit_data(self):
         data = self.to_dict()
         data.pop("active")  # #1472 - may regress when doing atomic commits, be careful
         data.pop("active_guilds")
+        return data
+
+    def _mark_committed(self, data):
+        """
+        Remembers the state of the character as it is in the database, so that the next commit only has to write
+        the parts that changed since.
+        """
+        self._committed_state = _committed_state_of(data)
+
+    def _get_commit_update(self, data):
+        """
+        Returns a dict of dotted paths to new values that need to be $set to bring the database in line with this
+        character, or None if the whole character must be written (e.g. after a structural edit like an update).
+        """
+        if self._committed_state is None:
+            return None
+        tracked, untracked_digests = self._committed_state
+        for key, value in data.items():
+            if key not in TRACKED_COMMIT_KEYS and untracked_digests.get(key) != _state_digest(value):
+                return None
+
+        update = {}
+        for key in TRACKED_COMMIT_KEYS:
+            update.update(_diff_paths(tracked[key], data[key], key))
+        return update
+
+    async def commit(self, ctx, do_live_integrations=True):
+        """
+        Writes a character object to the database, under the contextual author.
+        Only the paths that changed since the character was loaded or last committed are written, unless the
+        character has changed structurally.
+        """
+        data = self._commit_data()
+        update = self._get_commit_update(data)
         try:
-            await ctx.bot.mdb.characters.update_one(
-                {"owner": self._owner, "upstream": self._upstream},
-                {
-                    "$set": data,
-                    "$setOnInsert": {"active": self._active, "active_guilds": self._active_guilds},  # also #1472
-                },
-                upsert=True,
-            )
+            if update is None:
+                # only a character that has never been written may be inserted, so that a stale copy of a deleted
+                # character doesn't bring it back
+                result = await self._commit_full(ctx, data, upsert=self._version == 0)
+            elif update:
+                # the paths are only valid against the version we diffed against
+                result = await ctx.bot.mdb.characters.find_one_and_update(
+                    {"owner": self._owner, "upstream": self._upstream, "version": self._version or {"$in": [None, 0]}},
+                    {"$set": update, "$inc": {"version": 1}},
+                    projection={"version": True, "_id": False},
+                    return_document=ReturnDocument.AFTER,
+                )
+                if result is None:  # the character was written elsewhere since (or deleted), write it all again
+                    result = await self._commit_full(ctx, data, upsert=False)
+            else:  # nothing changed
+                return
         except OverflowError:
             raise ExternalImportError("A number on the character sheet is too large to store.")
+        if result is None:
+            log.info(f"Not committing character {self._owner}/{self._upstream}, it was deleted")
+            Character.invalidate(self._owner, self._upstream)
+            return
+        self._mark_committed(data)
+        await self.on_commit(result["version"], ctx.bot.rdb)
         if self._live_integration is not None and do_live_integrations and self.options.sync_outbound:
             self._live_integration.commit_soon(ctx)  # creates a task to commit eventually
 
+    async def _commit_full(self, ctx, data, upsert):
+        return await ctx.bot.mdb.characters.find_one_and_update(
+            {"owner": self._owner, "upstream": self._upstream},
+            {
+                "$set": data,
+                "$setOnInsert": {"active": self._active, "active_guilds": self._active_guilds},  # also #1472
+                "$inc": {"version": 1},
+            },
+            projection={"version": True, "_id": False},
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def on_commit(self, version: int, rdb=None):
+        """
+        Called after this character is written to the database with its new version.
+        If *rdb* is passed, also tells other clusters to drop any older cached copy of this character.
+        """
+        self._version = version
+        if rdb is not None:
+            await publish_command(rdb, "invalidate_character", [self._owner, self._upstream, version])
+
     async def set_active(self, ctx):
         """Sets the character as globally active and unsets any server-active character in the current context."""
         owner_id = str(ctx.author.id)
@@ -356,6 +526,7 @@ class Character(StatBlock):
             {"owner": owner_id, "upstream": self._upstream}, {"$set": {"active": True}}
         )
         self._active = True
+        await Character.publish_active_changed(ctx.bot.rdb, owner_id)
         return SetActiveResult(did_unset_server_active=did_unset_server_active)
 
     async def set_server_active(self, ctx):
@@ -377,6 +548,7 @@ class Character(StatBlock):
         )
         if guild_id not in self._active_guilds:
             self._active_guilds.append(guild_id)
+        await Character.publish_active_changed(ctx.bot.rdb, owner_id)
         return SetActiveResult(did_unset_server_active=unset_result.modified_count > 0)
 
     async def unset_server_active(self, ctx):
@@ -395,6 +567,7 @@ class Character(StatBlock):
             self._active_guilds.remove(guild_id)
         except ValueError:
             pass
+        await Character.publish_active_changed(ctx.bot.rdb, str(ctx.author.id))
         return SetActiveResult(did_unset_server_active=unset_result.modified_count > 0)
 
     # ---------- HP ----------
@@ -594,6 +767,7 @@ class Character(StatBlock):
                 sb.max_pact_slots - sb.get_max_slots(sb.pact_slot_level) + sb.get_slots(sb.pact_slot_level),
             )
 
+        self._version = old_character._version
         if (self.owner, self.upstream) in Character._cache:
             Character._cache[self.owner, self.upstream] = self
 
@@ -684,8 +858,48 @@ class CharacterSpellbook(HasIntegrationMixin, Spellbook):
             self._live_integration.sync_slots()
 
 
+def _committed_state_of(data):
+    """
+    Returns what we need to remember about a character as it is in the database (its stored or commit data) to work
+    out what to write on the next commit: a copy of the parts that are diffed path-by-path, and a digest of each of the
+    other parts, which are only checked for changes.
+    """
+    tracked = {key: copy.deepcopy(data.get(key)) for key in TRACKED_COMMIT_KEYS}
+    untracked_digests = {key: _state_digest(value) for key, value in data.items() if key not in TRACKED_COMMIT_KEYS}
+    return tracked, untracked_digests
+
+
+def _state_digest(data):
+    return hash(repr(data))
+
+
+def _diff_paths(old, new, path):
+    """
+    Returns a dict of dotted paths to values that must be $set to turn *old* into *new*.
+    Dicts and same-length lists are compared element-wise; anything else is replaced wholesale.
+    """
+    if old == new:
+        return {}
+    if isinstance(old, dict) and isinstance(new, dict) and old.keys() == new.keys():
+        # keys that are not valid path segments must be set as part of their parent
+        if all(isinstance(k, str) and k and "." not in k and not k.startswith("$") for k in new):
+            out = {}
+            for key, value in new.items():
+                out.update(_diff_paths(old[key], value, f"{path}.{key}"))
+            return out
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        out = {}
+        for idx, (old_value, value) in enumerate(zip(old, new)):
+            out.update(_diff_paths(old_value, value, f"{path}.{idx}"))
+        return out
+    return {path: new}
+
+
 SetActiveResult = namedtuple("SetActiveResult", "did_unset_server_active")
 
+# the parts of a character that change often during play and are written path-by-path
+TRACKED_COMMIT_KEYS = ("hp", "temp_hp", "spellbook", "consumables", "cvars", "death_saves", "coinpurse")
+
 INTEGRATION_MAP = {"dicecloud": DicecloudIntegration, "beyond": DDBSheetSync}
 DESERIALIZE_MAP = {
     **_DESER,
@@ -1,11 +1,12 @@
 import asyncio
 import logging
-import time
+import threading
 import urllib.parse
 
 from MeteorClient import MeteorClient
 
 from utils import config
+from utils.executors import run_in_executor
 from .errors import InsertFailure, LoginFailure
 from .http import DicecloudHTTP
 
@@ -19,50 +20,110 @@ class DicecloudClient:
     instance = None
     user_id = None
 
-    def __init__(self, debug=False):
-        self.meteor_client = MeteorClient(SOCKET_BASE, debug=debug)
+    def __init__(self, debug=False, socket_base=SOCKET_BASE, username=None, password=None):
+        self.meteor_client = MeteorClient(socket_base, debug=debug)
         self.http = DicecloudHTTP(API_BASE, config.DICECLOUD_API_KEY, debug=debug)
         self.logged_in = False
+        self._username = username if username is not None else config.DICECLOUD_USER
+        self._password = password if password is not None else config.DICECLOUD_PASS
+        # the meteor client runs on its own thread and calls us back from there
+        self._lock = threading.Lock()
+        self._initializing = False
+        self._ready_waiters = []  # list of (loop, future) waiting for login
+
+        self.meteor_client.on("connected", self._on_connected)
 
     @classmethod
     def getInstance(cls):
+        """
+        Returns the shared client, creating it if needed. The client connects on first use, see
+        :meth:`ensure_connected`.
+        """
         if cls.instance is None and not config.NO_DICECLOUD:
             try:
                 cls.instance = cls(debug=config.TESTING)
-                cls.instance.initialize()
             except Exception as e:
                 log.warning(e)
                 return None
         return cls.instance
 
     def initialize(self):
+        """
+        Starts connecting and logging in to Dicecloud on the Meteor client's thread. Returns immediately;
+        use :meth:`wait_until_ready` to wait for the login to complete.
+        """
+        with self._lock:
+            if self._initializing or self.logged_in:
+                return
+            self._initializing = True
         log.info(f"Initializing Dicecloud Meteor client (debug={config.TESTING})")
-        self.meteor_client.connect()
-        loops = 0
-        while (not self.meteor_client.connected) and loops < 100:
-            time.sleep(0.1)
-            loops += 1
-        log.info(f"Connected to Dicecloud in {loops / 10} seconds")
-
-        def on_login(error, data):
-            if data:
-                type(self).user_id = data.get("id")
-                self.logged_in = True
-            else:
-                log.warning(error)
-                raise LoginFailure()
-
-        self.meteor_client.login(config.DICECLOUD_USER, config.DICECLOUD_PASS, callback=on_login)
-        loops = 0
-        while not self.logged_in and loops < 100:
-            time.sleep(0.1)
-            loops += 1
+        try:
+            self.meteor_client.connect()
+        except Exception:
+            self._initializing = False
+            raise
+
+    def _on_connected(self):
+        log.info("Connected to Dicecloud")
+        self.meteor_client.login(self._username, self._password, callback=self._on_login)
+
+    def _on_login(self, error, data):
+        if not data:
+            log.warning(f"Could not log in to Dicecloud: {error}")
+            with self._lock:
+                self._initializing = False
+            self._resolve_waiters(LoginFailure())
+            return
+
+        type(self).user_id = data.get("id")
         log.info(f"Logged in as {self.user_id}")
+        with self._lock:
+            self.logged_in = True
+            self._initializing = False
+        self._resolve_waiters()
+
+    def _resolve_waiters(self, exc=None):
+        with self._lock:
+            waiters, self._ready_waiters = self._ready_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve_future, future, exc)
+
+    async def wait_until_ready(self, timeout=10):
+        """
+        Waits until the client is logged in to Dicecloud, without blocking the event loop.
+
+        :raises LoginFailure: if connecting or the login fails.
+        :raises asyncio.TimeoutError: if the login does not complete in time.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._lock:
+            if self.logged_in:
+                return
+            self._ready_waiters.append(waiter)
+        try:
+            # connecting does a blocking websocket handshake before handing off to the meteor client's thread
+            try:
+                await run_in_executor("dicecloud", self.initialize)
+            except Exception as e:
+                log.warning(f"Could not connect to Dicecloud: {e}")
+                raise LoginFailure() from e
+            await asyncio.wait_for(future, timeout)
+        finally:
+            with self._lock:
+                if waiter in self._ready_waiters:
+                    self._ready_waiters.remove(waiter)
+
+    async def close(self):
+        """Closes the connection to Dicecloud and the HTTP session."""
+        self.meteor_client.close()
+        await self.http.close()
 
     async def ensure_connected(self):
         if self.logged_in:  # everything is fine:tm:
             return
-        asyncio.get_event_loop().run_in_executor(None, self.initialize)
+        await self.wait_until_ready()
 
     async def _get_list_id(self, character, list_name=None):
         """
@@ -154,4 +215,13 @@ class DicecloudClient:
         return response
 
 
+def _resolve_future(future, exc=None):
+    if future.done():
+        return
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(None)
+
+
 dicecloud_client = DicecloudClient.getInstance()
@@ -4,6 +4,7 @@ import logging
 
 import aiohttp
 
+from utils import accounting
 from .errors import Forbidden, HTTPException, NotFound, Timeout
 
 MAX_TRIES = 10
@@ -15,6 +16,16 @@ class DicecloudHTTP:
         self.base = api_base
         self.key = api_key
         self.debug = debug
+        self._session = None  # reused between requests, created on first use (inside the event loop)
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(trace_configs=[accounting.http_trace_config()])
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
 
     async def request(self, method, endpoint, body, headers=None, query=None):
         if headers is None:
@@ -32,31 +43,31 @@ class DicecloudHTTP:
         if self.debug:
             print(f"{method} {endpoint}: {body}")
         data = None
-        async with aiohttp.ClientSession() as session:
-            for _ in range(MAX_TRIES):
-                try:
-                    async with session.request(
-                        method, f"{self.base}{endpoint}", data=body, headers=headers, params=query
-                    ) as resp:
-                        log.info(f"Dicecloud returned {resp.status} ({endpoint})")
-                        if resp.status == 200:
-                            data = await resp.json(encoding="utf-8")
-                            break
-                        elif resp.status == 429:
-                            timeout = await resp.json(encoding="utf-8")
-                            log.warning(f"Dicecloud ratelimit hit ({endpoint}) - resets in {timeout}ms")
-                            await asyncio.sleep(timeout["timeToReset"] / 1000)  # rate-limited, wait and try again
-                        elif 400 <= resp.status < 600:
-                            if resp.status == 403:
-                                raise Forbidden(resp.reason)
-                            elif resp.status == 404:
-                                raise NotFound(resp.reason)
-                            else:
-                                raise HTTPException(resp.status, resp.reason)
+        session = self._get_session()
+        for _ in range(MAX_TRIES):
+            try:
+                async with session.request(
+                    method, f"{self.base}{endpoint}", data=body, headers=headers, params=query
+                ) as resp:
+                    log.info(f"Dicecloud returned {resp.status} ({endpoint})")
+                    if resp.status == 200:
+                        data = await resp.json(encoding="utf-8")
+                        break
+                    elif resp.status == 429:
+                        timeout = await resp.json(encoding="utf-8")
+                        log.warning(f"Dicecloud ratelimit hit ({endpoint}) - resets in {timeout}ms")
+                        await asyncio.sleep(timeout["timeToReset"] / 1000)  # rate-limited, wait and try again
+                    elif 400 <= resp.status < 600:
+                        if resp.status == 403:
+                            raise Forbidden(resp.reason)
+                        elif resp.status == 404:
+                            raise NotFound(resp.reason)
                         else:
-                            log.warning(f"Unknown response from Dicecloud: {resp.status}")
-                except aiohttp.ServerDisconnectedError:
-                    raise HTTPException(None, "Server disconnected")
+                            raise HTTPException(resp.status, resp.reason)
+                    else:
+                        log.warning(f"Unknown response from Dicecloud: {resp.status}")
+            except aiohttp.ServerDisconnectedError:
+                raise HTTPException(None, "Server disconnected")
         if not data:  # we did 10 loops and always got either 200 or 429 but we have no data, so we must have 429ed
             raise Timeout(f"Dicecloud failed to respond after {MAX_TRIES} tries. Please try again.")
 
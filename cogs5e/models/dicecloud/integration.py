@@ -17,10 +17,16 @@ def update_callback(error, data):
         log.debug(data)
 
 
+async def _get_meteor_client():
+    client = DicecloudClient.getInstance()
+    await client.ensure_connected()
+    return client.meteor_client
+
+
 class DicecloudIntegration(LiveIntegration):
     async def _do_sync_hp(self):
         try:
-            DicecloudClient.getInstance().meteor_client.update(
+            (await _get_meteor_client()).update(
                 "characters",
                 {"_id": self.character.upstream_id},
                 {"$set": {"hitPoints.adjustment": self.character.hp - self.character.max_hp}},
@@ -39,7 +45,7 @@ class DicecloudIntegration(LiveIntegration):
                 lvl
             ) - self.character.spellbook.get_max_slots(lvl)
         try:
-            DicecloudClient.getInstance().meteor_client.update(
+            (await _get_meteor_client()).update(
                 "characters", {"_id": self.character.upstream[10:]}, {"$set": spell_dict}, callback=update_callback
             )
         except MeteorClient.MeteorClientException:
@@ -49,14 +55,14 @@ class DicecloudIntegration(LiveIntegration):
         used = consumable.get_max() - consumable.value
         try:
             if consumable.live_id in CLASS_RESOURCES:
-                DicecloudClient.getInstance().meteor_client.update(
+                (await _get_meteor_client()).update(
                     "characters",
                     {"_id": self.character.upstream[10:]},
                     {"$set": {f"{consumable.live_id}.adjustment": -used}},
                     callback=update_callback,
                 )
             else:
-                DicecloudClient.getInstance().meteor_client.update(
+                (await _get_meteor_client()).update(
                     "features", {"_id": consumable.live_id}, {"$set": {"used": used}}, callback=update_callback
                 )
         except MeteorClient.MeteorClientException:
@@ -64,7 +70,7 @@ class DicecloudIntegration(LiveIntegration):
 
     async def _do_sync_death_saves(self):
         try:
-            DicecloudClient.getInstance().meteor_client.update(
+            (await _get_meteor_client()).update(
                 "characters",
                 {"_id": self.character.upstream_id},
                 {
@@ -14,6 +14,7 @@ from cogs5e.models.sheet.base import BaseStats, Saves, Skills
 from cogs5e.models.sheet.resistance import Resistances
 from cogs5e.models.sheet.spellcasting import SpellbookSpell
 from gamedata.monster import Monster, MonsterSpellbook, Trait
+from utils import accounting
 from utils.functions import search_and_select
 from utils.subscription_mixins import CommonHomebrewMixin
 
@@ -71,7 +72,7 @@ class Bestiary(CommonHomebrewMixin):
         )
         sha256_hash = hashlib.sha256()
         sha256_hash.update(BESTIARY_SCHEMA_VERSION)
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[accounting.http_trace_config()]) as session:
             if published:
                 creatures = await get_published_bestiary_creatures(url, session, api_base, sha256_hash)
             else:
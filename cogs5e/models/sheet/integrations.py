@@ -1,14 +1,26 @@
 import abc
 import asyncio
 import logging
+import time
+
+import cachetools
 
 log = logging.getLogger(__name__)
 
+# how long to wait for more changes before syncing, in seconds
+SYNC_DEBOUNCE = 2
+# the minimum time between two syncs of the same character, in seconds
+SYNC_MIN_INTERVAL = 5
+# how many times to try a sync, and the base of the exponential backoff between tries, in seconds
+SYNC_ATTEMPTS = 3
+SYNC_RETRY_BACKOFF = 2
+
 
 class LiveIntegration(abc.ABC):
     """Interface defining how to sync character resources with upstream. Tied to the character object's lifecycle."""
 
-    _inflight_tasks = dict()  # map: key -> task to cancel a task if a new one comes along
+    _sync_queues = dict()  # map: key -> SyncQueue of changes waiting to be sent
+    _last_synced = cachetools.TTLCache(maxsize=10000, ttl=SYNC_MIN_INTERVAL)  # map: key -> time of last sync
 
     def __init__(self, character):
         self.character = character
@@ -72,7 +84,7 @@ class LiveIntegration(abc.ABC):
     async def commit(self, ctx):
         """
         Called when the character is committed. Should fire all pending sync tasks.
-        Sets self._ctx for the duration of the commit.
+        Sets self._ctx for the duration of the commit. Raises if any sync task fails.
         """
         self._ctx = ctx
         try:
@@ -89,24 +101,94 @@ class LiveIntegration(abc.ABC):
                 to_await.append(self._do_sync_consumable(cc))
             await asyncio.gather(*to_await)
             self.clear()
-        except asyncio.CancelledError:
-            pass
-        except Exception:
-            log.exception("Error in character sync:")
-            self._inflight_tasks.pop(self._key, None)
-        else:
-            self._inflight_tasks.pop(self._key, None)
         finally:
             self._ctx = None
 
     def commit_soon(self, ctx):
-        """Creates a task to commit any updates in this sync instance soon. May cancel a previous pending sync task."""
-        # if a task to sync this character already exists, cancel it
-        # since this is sync, it operates atomically on _inflight_tasks, so two commit_soon's running on the same
-        # instance cannot be in contention
+        """
+        Queues any updates in this sync instance to be committed soon.
+        Changes queued for the same character in quick succession are merged and sent together.
+        """
+        # since this is sync, it operates atomically on _sync_queues, so two commit_soon's cannot be in contention
+        queue = self._sync_queues.get(self._key)
+        if queue is None:
+            queue = self._sync_queues[self._key] = SyncQueue(self._key)
+        queue.merge(self, ctx)
+        self.clear()
+        queue.start()
+
+
+class SyncQueue:
+    """The changes to a character waiting to be synced with upstream, and the task that will sync them."""
+
+    def __init__(self, key):
+        self.key = key
+        self.integration = None  # the latest integration seen, used to read the latest character state
+        self.ctx = None
+        self.hp = False
+        self.coins = False
+        self.slots = False
+        self.cc_ids = set()
+        self.death_saves = False
+        self._task = None
+
+    @property
+    def has_changes(self):
+        return self.hp or self.coins or self.slots or self.cc_ids or self.death_saves
+
+    def merge(self, integration: LiveIntegration, ctx):
+        """Merges the changes marked on an integration into this queue."""
+        self.integration = integration
+        self.ctx = ctx
+        self.hp = self.hp or integration._should_sync_hp
+        self.coins = self.coins or integration._should_sync_coins
+        self.slots = self.slots or integration._should_sync_slots
+        self.cc_ids.update(integration._should_sync_ccs)
+        self.death_saves = self.death_saves or integration._should_sync_death_saves
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _apply_to(self, integration: LiveIntegration):
+        """Moves all queued changes onto the given integration, to be sent on its next commit."""
+        integration._should_sync_hp = self.hp
+        integration._should_sync_coins = self.coins
+        integration._should_sync_slots = self.slots
+        integration._should_sync_ccs = {
+            cc.live_id: cc for cc in integration.character.consumables if cc.live_id in self.cc_ids
+        }
+        integration._should_sync_death_saves = self.death_saves
+        self.hp = self.coins = self.slots = self.death_saves = False
+        self.cc_ids = set()
+
+    async def _run(self):
         try:
-            self._inflight_tasks.pop(self._key).cancel()
-        except KeyError:
-            pass
-        task = asyncio.create_task(self.commit(ctx))
-        self._inflight_tasks[self._key] = task
+            while self.has_changes:
+                await asyncio.sleep(SYNC_DEBOUNCE)
+                # rate limit syncs of the same character
+                if (last_synced := LiveIntegration._last_synced.get(self.key)) is not None:
+                    await asyncio.sleep(max(last_synced + SYNC_MIN_INTERVAL - time.monotonic(), 0))
+
+                integration, ctx = self.integration, self.ctx
+                self._apply_to(integration)
+                await self._commit_with_retry(integration, ctx)
+                LiveIntegration._last_synced[self.key] = time.monotonic()
+        finally:
+            if LiveIntegration._sync_queues.get(self.key) is self and not self.has_changes:
+                del LiveIntegration._sync_queues[self.key]
+
+    @staticmethod
+    async def _commit_with_retry(integration: LiveIntegration, ctx):
+        for attempt in range(SYNC_ATTEMPTS):
+            try:
+                await integration.commit(ctx)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                if attempt + 1 == SYNC_ATTEMPTS:
+                    log.exception("Error in character sync:")
+                    return
+                log.warning(f"Error in character sync, retrying (attempt {attempt + 1})", exc_info=True)
+                await asyncio.sleep(SYNC_RETRY_BACKOFF * 2**attempt)
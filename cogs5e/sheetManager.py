@@ -478,7 +478,7 @@ class SheetManager(commands.Cog):
             parser = GoogleSheet(_id)
             loading = await ctx.send("Updating character data from Google...")
         elif sheet_type == "beyond":
-            parser = BeyondSheetParser(_id)
+            parser = BeyondSheetParser(_id, old_character=old_character)
             loading = await ctx.send("Updating character data from Beyond...")
         else:
             return await ctx.send(f"Error: Unknown sheet type {sheet_type}.")
@@ -492,6 +492,12 @@ class SheetManager(commands.Cog):
             log.warning(traceback.format_exc())
             return await loading.edit(content=f"Error loading character: {eep}")
 
+        if parser.unchanged:
+            await loading.edit(content=f"{character.name} is already up to date!")
+            if args.last("v"):
+                await ctx.send(embed=character.get_sheet_embed())
+            return
+
         character.update(old_character)
 
         # keeps an old check if the old character was active on the current server
@@ -575,7 +581,7 @@ class SheetManager(commands.Cog):
                 f"interactive menu!"
             )
 
-        await char.options.commit(ctx.bot.mdb, char)
+        await char.options.commit(ctx.bot.mdb, char, ctx.bot.rdb)
         await ctx.send("\n".join(out))
 
     async def _confirm_overwrite(self, ctx, _id):
@@ -2,6 +2,9 @@ class SheetLoaderABC:
     def __init__(self, url):
         self.url = url
         self.character_data = None
+        # set by loaders that can tell the upstream sheet has not changed since the character was last imported,
+        # in which case load_character() returns the old character as-is
+        self.unchanged = False
 
     async def load_character(self, ctx, args):
         raise NotImplemented
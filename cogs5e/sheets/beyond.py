@@ -3,7 +3,10 @@ Created on May 26, 2020
 
 @author: andrew
 """
+import asyncio
+import hashlib
 import itertools
+import json
 import logging
 import re
 
@@ -22,12 +25,16 @@ from cogs5e.models.sheet.player import CustomCounter
 from cogs5e.models.sheet.resistance import Resistances
 from cogs5e.models.sheet.spellcasting import Spellbook, SpellbookSpell
 from cogs5e.sheets.abc import SHEET_VERSION, SheetLoaderABC
+from cogs5e.sheets.utils import parse_scheduler
 from gamedata.compendium import compendium
-from utils import config, constants, enums
+from utils import accounting, config, constants, enums
 from utils.functions import smart_trim
 
 log = logging.getLogger(__name__)
 
+# the arguments that change how a character is parsed, see _get_import_hash()
+IMPORT_ARGS = ("nocc", "noprep")
+
 ENDPOINT = config.DDB_CHAR_COMPUTATION_ENDPT
 if config.ENVIRONMENT == "development":
     DDB_URL_RE = re.compile(
@@ -57,13 +64,41 @@ SKILL_MAP = {
 }
 RESET_MAP = {1: "short", 2: "long", 3: "long", 4: "none"}
 
+# character computation requests share a bounded connection pool
+MAX_CONNECTIONS = 32
+REQUEST_TIMEOUT = 30
+_http = None
+
+
+def _get_http():
+    global _http
+    if _http is None or _http.closed:
+        _http = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            trace_configs=[accounting.http_trace_config()],
+        )
+    return _http
+
+
+async def close_http():
+    """Closes the shared connection pool used for character imports."""
+    if _http is not None:
+        await _http.close()
+
 
 class BeyondSheetParser(SheetLoaderABC):
-    def __init__(self, charId):
+    def __init__(self, charId, old_character=None):
+        """
+        :param old_character: The character this import is updating, if any. If the sheet data has not changed since
+                              this character was imported, it is returned as-is without reparsing.
+        """
         super(BeyondSheetParser, self).__init__(charId)
         self.ctx = None
         self.args = None
         self._is_live = None
+        self._old_character = old_character
+        self._import_hash = None
 
     async def load_character(self, ctx, args):
         """
@@ -77,6 +112,17 @@ class BeyondSheetParser(SheetLoaderABC):
         owner_id = str(ctx.author.id)
         await self._get_character()
 
+        if (
+            self._old_character is not None
+            and self._old_character._import_version == SHEET_VERSION
+            and self._old_character._import_hash == self._import_hash
+        ):
+            self.unchanged = True
+            return self._old_character
+
+        return await parse_scheduler.run(owner_id, self._load_character, owner_id, args)
+
+    def _load_character(self, owner_id: str, args):
         upstream = f"beyond-{self.url}"
         active = False
         sheet_type = "beyond"
@@ -146,6 +192,7 @@ class BeyondSheetParser(SheetLoaderABC):
             ddb_campaign_id=campaign_id,
             actions=actions,
             coinpurse=coinpurse,
+            import_hash=self._import_hash,
         )
         return character
 
@@ -158,11 +205,12 @@ class BeyondSheetParser(SheetLoaderABC):
         if ddb_user is not None:
             headers = {"Authorization": f"Bearer {ddb_user.token}"}
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{ENDPOINT}?charId={char_id}", headers=headers) as resp:
+        try:
+            async with _get_http().get(f"{ENDPOINT}?charId={char_id}", headers=headers) as resp:
                 log.debug(f"DDB returned {resp.status}")
                 if resp.status == 200:
-                    character = await resp.json()
+                    raw_character = await resp.read()
+                    character = json.loads(raw_character)
                 elif resp.status == 403:
                     if ddb_user is None:
                         raise ExternalImportError(
@@ -178,12 +226,25 @@ class BeyondSheetParser(SheetLoaderABC):
                     )
                 else:
                     raise ExternalImportError(f"Beyond returned an error: {resp.status} - {resp.reason}")
+        except asyncio.TimeoutError:
+            raise ExternalImportError("Timed out connecting to D&D Beyond. Please try again in a few minutes.")
         character["_id"] = char_id
         self.character_data = character
         self._is_live = (ddb_user is not None) and (ddb_user.user_id == str(character["ownerId"]))
+        self._import_hash = self._get_import_hash(raw_character)
         log.debug(character)
         return character
 
+    def _get_import_hash(self, raw_character: bytes) -> str:
+        """
+        Returns a hash of everything the parsed character depends on: the sheet data, the import options, and the
+        gamedata spells and actions are matched against.
+        """
+        h = hashlib.sha256(raw_character)
+        args = {arg: self.args.last(arg) for arg in IMPORT_ARGS}
+        h.update(f"|{self._is_live}|{args!r}|{compendium.content_hash}".encode())
+        return h.hexdigest()
+
     def _get_stats(self) -> BaseStats:
         """Returns a dict of stats."""
         c = self.character_data
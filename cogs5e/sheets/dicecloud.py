@@ -5,6 +5,7 @@ Created on Jan 19, 2017
 """
 
 import ast
+import asyncio
 import collections
 import logging
 import re
@@ -15,14 +16,14 @@ from cogs5e.models.sheet.coinpurse import Coinpurse
 
 from cogs5e.models.character import Character
 from cogs5e.models.dicecloud.client import DicecloudClient
-from cogs5e.models.dicecloud.errors import DicecloudException
+from cogs5e.models.dicecloud.errors import DicecloudException, LoginFailure
 from cogs5e.models.errors import ExternalImportError
 from cogs5e.models.sheet.action import Actions
 from cogs5e.models.sheet.attack import Attack, AttackList
 from cogs5e.models.sheet.base import BaseStats, Levels, Saves, Skill, Skills
 from cogs5e.models.sheet.resistance import Resistances
 from cogs5e.models.sheet.spellcasting import Spellbook, SpellbookSpell
-from cogs5e.sheets.utils import get_actions_for_names
+from cogs5e.sheets.utils import get_actions_for_names, parse_scheduler
 from gamedata.compendium import compendium
 from utils.constants import DAMAGE_TYPES, SAVE_NAMES, SKILL_MAP, SKILL_NAMES, STAT_NAMES
 from utils.functions import search
@@ -72,6 +73,9 @@ class DicecloudParser(SheetLoaderABC):
         except DicecloudException as e:
             raise ExternalImportError(f"Dicecloud returned an error: {e}")
 
+        return await parse_scheduler.run(owner_id, self._load_character, owner_id, args)
+
+    def _load_character(self, owner_id: str, args):
         upstream = f"dicecloud-{self.url}"
         active = False
         sheet_type = "dicecloud"
@@ -143,7 +147,13 @@ class DicecloudParser(SheetLoaderABC):
     async def get_character(self):
         """Saves the character JSON data to this object."""
         url = self.url
-        character = await DicecloudClient.getInstance().get_character(url)
+        client = DicecloudClient.getInstance()
+        try:
+            # we need to be logged in to tell whether the character can be live-synced
+            await client.ensure_connected()
+        except (LoginFailure, asyncio.TimeoutError):
+            log.warning("Could not log in to Dicecloud, importing without live sync")
+        character = await client.get_character(url)
         character["_id"] = url
         self.character_data = character
         return character
@@ -606,7 +616,6 @@ class DicecloudEvaluator(draconic.SimpleInterpreter):
 
 
 if __name__ == "__main__":
-    import asyncio
     import json
     from utils.argparser import argparse
 
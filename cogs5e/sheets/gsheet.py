@@ -4,7 +4,6 @@ Created on May 8, 2017
 @author: andrew
 """
 
-import asyncio
 import datetime
 import json
 import logging
@@ -12,6 +11,7 @@ import re
 from contextlib import contextmanager
 from urllib.parse import urlparse
 
+import cachetools
 import google.oauth2.service_account
 import gspread
 from d20 import RollSyntaxError
@@ -19,7 +19,8 @@ from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials
 from gspread import SpreadsheetNotFound
 from gspread.exceptions import APIError, WorksheetNotFound
-from gspread.utils import a1_to_rowcol, fill_gaps
+from gspread.urls import DRIVE_FILES_API_V3_URL
+from gspread.utils import a1_to_rowcol, absolute_range_name, fill_gaps
 from cogs5e.models.sheet.coinpurse import Coinpurse
 
 from cogs5e.models.character import Character
@@ -31,11 +32,12 @@ from cogs5e.models.sheet.resistance import Resistances
 from cogs5e.models.sheet.spellcasting import Spellbook, SpellbookSpell
 from cogs5e.sheets.abc import SHEET_VERSION, SheetLoaderABC
 from cogs5e.sheets.errors import MissingAttribute, AttackSyntaxError, InvalidImageURL, InvalidCoin
-from cogs5e.sheets.utils import get_actions_for_names
+from cogs5e.sheets.utils import get_actions_for_names, parse_scheduler
 from gamedata.compendium import compendium
 from utils import config
 from utils.constants import DAMAGE_TYPES, COIN_TYPES
 from utils.dice import get_roll_comment
+from utils.executors import run_in_executor
 from utils.functions import search
 
 log = logging.getLogger(__name__)
@@ -185,6 +187,11 @@ RESIST_COLS = (
 )  # AI69:AI79, 2.1 only
 SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
 
+# worksheets other than the first that the importer reads, if they exist
+EXTRA_WORKSHEETS = ("Additional", "Inventory")
+# map: (spreadsheet id, revision) -> fetched worksheet values
+_sheet_cache = cachetools.TTLCache(maxsize=250, ttl=900)
+
 URL_KEY_V1_RE = re.compile(r"key=([^&#]+)")
 URL_KEY_V2_RE = re.compile(r"/spreadsheets/d/([a-zA-Z0-9-_]+)")
 
@@ -215,19 +222,10 @@ def letter2num(letters, zbase=True):
 
 
 class TempCharacter:
-    def __init__(self, worksheet):
-        self.worksheet = worksheet
-        self.values = worksheet.get_all_values()
-        self.unformatted_values = self._get_all_unformatted_values()
-
-    def _get_all_unformatted_values(self):
-        data = self.worksheet.spreadsheet.values_get(
-            self.worksheet.title, params={"valueRenderOption": "UNFORMATTED_VALUE"}
-        )
-        try:
-            return fill_gaps(data["values"])
-        except KeyError:
-            return []
+    def __init__(self, title, values, unformatted_values):
+        self.title = title
+        self.values = values
+        self.unformatted_values = unformatted_values
 
     @staticmethod
     def _get_value(source, pos):
@@ -300,7 +298,7 @@ class GoogleSheet(SheetLoaderABC):
                 return gspread.authorize(credentials)
 
             try:
-                GoogleSheet.g_client = await asyncio.get_event_loop().run_in_executor(None, _)
+                GoogleSheet.g_client = await run_in_executor("gsheet", _)
             except:
                 GoogleSheet._client_initializing = False
                 raise
@@ -321,7 +319,7 @@ class GoogleSheet(SheetLoaderABC):
                 )
 
             try:
-                await asyncio.get_event_loop().run_in_executor(None, _)
+                await run_in_executor("gsheet", _)
             except:
                 GoogleSheet._client_initializing = False
                 raise
@@ -332,18 +330,58 @@ class GoogleSheet(SheetLoaderABC):
         return datetime.datetime.now() > GoogleSheet._token_expiry
 
     # load character data
-    def _gchar(self):
+    def _get_revision(self):
+        """
+        Returns the Drive revision number of the spreadsheet, which changes whenever its contents change, or None if
+        it could not be retrieved.
+        """
+        try:
+            resp = GoogleSheet.g_client.request(
+                "get",
+                f"{DRIVE_FILES_API_V3_URL}/{self.url}",
+                params={"fields": "version", "supportsAllDrives": True},
+            )
+            return resp.json()["version"]
+        except (APIError, KeyError):
+            return None
+
+    def _fetch_worksheets(self):
+        """
+        Fetches the formatted and unformatted values of the first worksheet and the extra worksheets in one batch
+        request per render option.
+
+        :returns: A tuple (first worksheet title, map: title -> (values, unformatted values)).
+        """
         doc = GoogleSheet.g_client.open_by_key(self.url)
-        self.character_data = TempCharacter(doc.sheet1)
+        titles = [s["properties"]["title"] for s in doc.fetch_sheet_metadata()["sheets"]]
+        first = titles[0]
+        wanted = [first] + [t for t in EXTRA_WORKSHEETS if t in titles and t != first]
+        ranges = [absolute_range_name(t) for t in wanted]
+
+        formatted = doc.values_batch_get(ranges, params={"valueRenderOption": "FORMATTED_VALUE"})
+        unformatted = doc.values_batch_get(ranges, params={"valueRenderOption": "UNFORMATTED_VALUE"})
+        worksheets = {}
+        for title, f_range, u_range in zip(wanted, formatted["valueRanges"], unformatted["valueRanges"]):
+            worksheets[title] = (fill_gaps(f_range.get("values", [])), fill_gaps(u_range.get("values", [])))
+        return first, worksheets
+
+    def _gchar(self, first, worksheets):
+        def worksheet(title):
+            try:
+                return TempCharacter(title, *worksheets[title])
+            except KeyError:
+                raise WorksheetNotFound(title)
+
+        self.character_data = worksheet(first)
         vcell = self.character_data.value("AQ4")
         if "1.3" in vcell:
             self.version = (1, 3)
         elif vcell:
-            self.additional = TempCharacter(doc.worksheet("Additional"))
+            self.additional = worksheet("Additional")
             self.version = (2, 1) if "2.1" in vcell else (2, 0) if "2" in vcell else (1, 0)
             if self.version >= (2, 1):
                 try:
-                    self.inventory = TempCharacter(doc.worksheet("Inventory"))
+                    self.inventory = worksheet("Inventory")
                 except WorksheetNotFound:
                     self.inventory = None
 
@@ -365,7 +403,7 @@ class GoogleSheet(SheetLoaderABC):
             )
         except Exception:
             raise
-        return await asyncio.get_event_loop().run_in_executor(None, self._load_character, owner_id, args)
+        return await parse_scheduler.run(owner_id, self._load_character, owner_id, args)
 
     def _load_character(self, owner_id: str, args):
         upstream = f"google-{self.url}"
@@ -438,8 +476,17 @@ class GoogleSheet(SheetLoaderABC):
             await self._init_gsheet_client()
         elif GoogleSheet._is_expired():
             await self._refresh_google_token()
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._gchar)
+
+        # the sheet's values only change when its revision does, so we can skip downloading them if we've seen it
+        revision = await run_in_executor("gsheet", self._get_revision)
+        cache_key = (self.url, revision)
+        if revision is not None and cache_key in _sheet_cache:
+            first, worksheets = _sheet_cache[cache_key]
+        else:
+            first, worksheets = await run_in_executor("gsheet", self._fetch_worksheets)
+            if revision is not None:
+                _sheet_cache[cache_key] = first, worksheets
+        self._gchar(first, worksheets)
 
     # calculator functions
     def get_description(self):
@@ -482,7 +529,7 @@ class GoogleSheet(SheetLoaderABC):
         try:
             prof_bonus = int(character.value("H14"))
         except (TypeError, ValueError):
-            raise MissingAttribute("Proficiency Bonus", "H14", character.worksheet.title)
+            raise MissingAttribute("Proficiency Bonus", "H14", character.title)
         index = 15
         stat_dict = {}
         for stat in ("strength", "dexterity", "constitution", "intelligence", "wisdom", "charisma"):
@@ -490,7 +537,7 @@ class GoogleSheet(SheetLoaderABC):
                 stat_dict[stat] = int(character.value("C" + str(index)))
                 index += 5
             except (TypeError, ValueError):
-                raise MissingAttribute(stat, "C" + str(index), character.worksheet.title)
+                raise MissingAttribute(stat, "C" + str(index), character.title)
         stats = BaseStats(prof_bonus, **stat_dict)
         self._stats = stats
         return stats
@@ -516,7 +563,7 @@ class GoogleSheet(SheetLoaderABC):
                     sheet = "Inventory"
                 else:
                     cell = COIN_TYPES[c_type]["gSheet"]["v14"]
-                    sheet = self.character_data.worksheet.title
+                    sheet = self.character_data.title
                 raise InvalidCoin(cell, sheet, COIN_TYPES[c_type]["name"], e)
         return Coinpurse(pp=coins["pp"], gp=coins["gp"], ep=coins["ep"], sp=coins["sp"], cp=coins["cp"])
 
@@ -527,7 +574,7 @@ class GoogleSheet(SheetLoaderABC):
             total_level = int(self.character_data.value("AL6"))
             self.total_level = total_level
         except ValueError:
-            raise MissingAttribute("Character level", "AL5", self.character_data.worksheet.title)
+            raise MissingAttribute("Character level", "AL5", self.character_data.title)
         level_dict = {}
         if self.additional:
             for rownum in range(69, 79):  # sheet2, C69:C78
@@ -585,7 +632,7 @@ class GoogleSheet(SheetLoaderABC):
                 # add bonuses manually since the cell does not include them
                 value = int(character.value(cell)) + all_check_bonus + joat_bonus
             except (TypeError, ValueError):
-                raise MissingAttribute(skill, cell, character.worksheet.title)
+                raise MissingAttribute(skill, cell, character.title)
             prof = 0
             if is_joat:
                 prof = 0.5
@@ -602,7 +649,7 @@ class GoogleSheet(SheetLoaderABC):
             try:
                 value = int(character.value(cell))
             except (TypeError, ValueError):
-                raise MissingAttribute(skill, cell, character.worksheet.title)
+                raise MissingAttribute(skill, cell, character.title)
             adv = None
             if self.version >= (2, 0) and advcell:
                 advtype = character.unformatted_value(advcell)
@@ -646,13 +693,13 @@ class GoogleSheet(SheetLoaderABC):
         try:
             return int(self.character_data.value("R12"))
         except (TypeError, ValueError):
-            raise MissingAttribute("AC", "R12", self.character_data.worksheet.title)
+            raise MissingAttribute("AC", "R12", self.character_data.title)
 
     def get_hp(self):
         try:
             return int(self.character_data.unformatted_value("U16"))
         except (TypeError, ValueError):
-            raise MissingAttribute("Max HP", "U16", self.character_data.worksheet.title)
+            raise MissingAttribute("Max HP", "U16", self.character_data.title)
 
     def get_race(self):
         return self.character_data.value("T7").strip()
@@ -668,10 +715,10 @@ class GoogleSheet(SheetLoaderABC):
             try:
                 result = urlparse(image)
                 if not all([result.scheme, result.netloc]):
-                    raise InvalidImageURL(self.character_data.worksheet.title, f"Invalid URL: {image}")
+                    raise InvalidImageURL(self.character_data.title, f"Invalid URL: {image}")
                 return image
             except ValueError as e:
-                raise InvalidImageURL(self.character_data.worksheet.title, e)
+                raise InvalidImageURL(self.character_data.title, e)
         return None
 
     def get_spellbook(self):
@@ -760,7 +807,7 @@ class GoogleSheet(SheetLoaderABC):
             try:
                 dice, comment = get_roll_comment(damage.strip())
             except RollSyntaxError as e:
-                raise AttackSyntaxError(name, damage_index, wksht.worksheet.title, e)
+                raise AttackSyntaxError(name, damage_index, wksht.title, e)
             if details:
                 details = details.strip()
             if any(d in comment.lower() for d in DAMAGE_TYPES):
@@ -0,0 +1,273 @@
+"""
+Background job to re-import many characters from their upstream sheets at once, e.g. after a big content change.
+
+The job walks characters of one sheet type in _id order, loading a batch at a time with bounded concurrency, and writes
+only the characters that changed. Its progress is saved in Redis after every batch so it can be paused (from any
+cluster) and resumed later from where it left off.
+"""
+import asyncio
+import collections
+import contextlib
+import json
+import logging
+import time
+
+from bson import ObjectId
+
+from cogs5e.models.character import Character
+from cogs5e.models.errors import ExternalImportError
+from cogs5e.sheets.beyond import BeyondSheetParser
+from cogs5e.sheets.dicecloud import DicecloudParser
+from cogs5e.sheets.gsheet import GoogleSheet
+from utils.argparser import argparse
+from utils.redisIO import publish_command
+
+log = logging.getLogger(__name__)
+
+SHEET_TYPES = ("beyond", "dicecloud", "google")
+# the number of characters read from the database (and written back) at a time
+REFRESH_BATCH_SIZE = 100
+# the number of characters loaded from upstream at once
+REFRESH_CONCURRENCY = 8
+# if a job stops saving progress for this long (e.g. its cluster died), another job can take over, in seconds
+REFRESH_LOCK_TTL = 600
+
+# saves the progress of a job and renews its lock, only if the job still holds the lock
+# KEYS: lock key, progress key; ARGV: lock token, lock TTL, progress JSON
+_SAVE_PROGRESS_SCRIPT = """
+if redis.call("get", KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call("set", KEYS[1], ARGV[1], "EX", ARGV[2])
+redis.call("set", KEYS[2], ARGV[3])
+return 1
+"""
+# releases the lock of a job, only if the job still holds it
+# KEYS: lock key; ARGV: lock token
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+return redis.call("del", KEYS[1])
+"""
+
+_Author = collections.namedtuple("_Author", "id")
+
+
+class RefreshContext:
+    """The parts of a command context the sheet loaders need to load a character on its owner's behalf."""
+
+    def __init__(self, bot, owner_id):
+        self.bot = bot
+        self.author = _Author(int(owner_id))
+        self.guild = None
+
+
+def get_sheet_loader(character):
+    """
+    Returns the sheet loader that re-imports the given character from its upstream.
+
+    :type character: Character
+    :rtype: cogs5e.sheets.abc.SheetLoaderABC
+    """
+    sheet_type = character.sheet_type
+    _id = character.upstream[len(sheet_type) + 1 :]  # upstreams look like "{sheet_type}-{id}"
+    if sheet_type == "beyond":
+        return BeyondSheetParser(_id, old_character=character)
+    elif sheet_type == "dicecloud":
+        return DicecloudParser(_id)
+    elif sheet_type == "google":
+        return GoogleSheet(_id)
+    raise ValueError(f"Unknown sheet type {sheet_type}")
+
+
+class CharacterRefreshJob:
+    def __init__(
+        self, bot, sheet_type, concurrency=REFRESH_CONCURRENCY, batch_size=REFRESH_BATCH_SIZE, loader=get_sheet_loader
+    ):
+        """
+        :param sheet_type: The type of character to refresh.
+        :param loader: A function that takes a character and returns the sheet loader to re-import it with.
+        """
+        self.bot = bot
+        self.sheet_type = sheet_type
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.loader = loader
+        self._lock_token = str(ObjectId())
+
+    # ==== redis state ====
+    @staticmethod
+    def progress_key(sheet_type):
+        return f"character-refresh.{sheet_type}.progress"
+
+    @staticmethod
+    def paused_key(sheet_type):
+        return f"character-refresh.{sheet_type}.paused"
+
+    @staticmethod
+    def lock_key(sheet_type):
+        return f"character-refresh.{sheet_type}.lock"
+
+    @staticmethod
+    def new_progress():
+        return {
+            "state": "running",
+            "last_id": None,
+            "seen": 0,
+            "refreshed": 0,
+            "unchanged": 0,
+            "conflicted": 0,
+            "failed": 0,
+            "started_at": time.time(),
+            "updated_at": time.time(),
+        }
+
+    @classmethod
+    async def get_progress(cls, rdb, sheet_type):
+        """Returns the progress of the last refresh of the given sheet type, or None if there was none."""
+        progress = await rdb.jget(cls.progress_key(sheet_type))
+        if progress is not None and progress["state"] == "running" and await rdb.exists(cls.paused_key(sheet_type)):
+            progress["state"] = "pausing"
+        return progress
+
+    @staticmethod
+    def summarize(progress):
+        return (
+            f"{progress['state']} - {progress['seen']} seen, {progress['refreshed']} refreshed, "
+            f"{progress['unchanged']} unchanged, {progress['conflicted']} conflicted, {progress['failed']} failed"
+        )
+
+    @classmethod
+    async def pause(cls, rdb, sheet_type):
+        """Asks the running refresh of the given sheet type to stop after its current batch."""
+        await rdb.set(cls.paused_key(sheet_type), "1")
+
+    async def _save_progress(self, progress):
+        """
+        Saves the progress of the job and renews its lock.
+
+        :raises ExternalImportError: if the lock expired and was taken by another job.
+        """
+        progress["updated_at"] = time.time()
+        saved = await self.bot.rdb.eval(
+            _SAVE_PROGRESS_SCRIPT,
+            keys=[self.lock_key(self.sheet_type), self.progress_key(self.sheet_type)],
+            args=[self._lock_token, REFRESH_LOCK_TTL, json.dumps(progress)],
+        )
+        if not saved:
+            raise ExternalImportError(f"The {self.sheet_type} refresh was taken over by another job.")
+
+    # ==== job ====
+    async def run(self, restart=False):
+        """
+        Runs the refresh until every character has been seen or the job is paused.
+        Resumes from the last saved batch unless *restart* is passed.
+
+        :returns: The final progress of the job.
+        """
+        rdb = self.bot.rdb
+        if not await rdb.set(self.lock_key(self.sheet_type), self._lock_token, ex=REFRESH_LOCK_TTL, nx=True):
+            raise ExternalImportError(f"A {self.sheet_type} refresh is already running.")
+        progress = None
+        try:
+            await rdb.delete(self.paused_key(self.sheet_type))
+            progress = await rdb.jget(self.progress_key(self.sheet_type))
+            if restart or progress is None or progress["state"] == "done":
+                progress = self.new_progress()
+            progress["state"] = "running"
+            await self._save_progress(progress)
+
+            while True:
+                if await rdb.exists(self.paused_key(self.sheet_type)):
+                    progress["state"] = "paused"
+                    break
+                query = {"sheet_type": self.sheet_type}
+                if progress["last_id"] is not None:
+                    query["_id"] = {"$gt": ObjectId(progress["last_id"])}
+                batch = await self.bot.mdb.characters.find(query).sort("_id", 1).to_list(self.batch_size)
+                if not batch:
+                    progress["state"] = "done"
+                    break
+
+                await self._refresh_batch(batch, progress)
+                progress["last_id"] = str(batch[-1]["_id"])
+                await self._save_progress(progress)
+        finally:
+            if progress is not None:
+                if progress["state"] == "running":  # we were interrupted by an error
+                    progress["state"] = "paused"
+                with contextlib.suppress(ExternalImportError):  # the job that took over owns the progress now
+                    await self._save_progress(progress)
+            await rdb.eval(_RELEASE_LOCK_SCRIPT, keys=[self.lock_key(self.sheet_type)], args=[self._lock_token])
+        log.info(f"Character refresh of {self.sheet_type} characters {progress['state']}: {progress}")
+        return progress
+
+    async def _refresh_batch(self, batch, progress):
+        sem = asyncio.Semaphore(self.concurrency)
+        # load one character per owner at a time, so the job never takes more than its share of an owner's parse queue
+        owner_locks = collections.defaultdict(asyncio.Lock)
+
+        async def load(doc):
+            async with owner_locks[doc["owner"]], sem:
+                return await self._load_one(doc)
+
+        results = await asyncio.gather(*(load(doc) for doc in batch))
+        changed = [result for result in results if isinstance(result, Character)]
+        progress["seen"] += len(batch)
+        progress["failed"] += results.count(False)
+        progress["unchanged"] += results.count(None)
+        if not changed:
+            return
+
+        written = await asyncio.gather(*(self._write_one(character) for character in changed))
+        progress["refreshed"] += sum(written)
+        progress["conflicted"] += written.count(False)
+
+        # only characters we wrote changed; others keep the copies they have
+        for character, was_written in zip(changed, written):
+            if not was_written:
+                continue
+            Character.invalidate(character.owner, character.upstream)
+            await publish_command(
+                self.bot.rdb, "invalidate_character", [character.owner, character.upstream, character._version + 1]
+            )
+
+    async def _write_one(self, character):
+        """
+        Writes a refreshed character, only if it has not been committed since we read it, so we don't clobber changes
+        made while the job was loading it; those characters are counted as conflicts and left for the user to !update.
+
+        :returns: Whether the character was written.
+        """
+        version_filter = character._version if character._version else {"$in": [0, None]}
+        result = await self.bot.mdb.characters.update_one(
+            {"owner": character.owner, "upstream": character.upstream, "version": version_filter},
+            {"$set": character._commit_data(), "$inc": {"version": 1}},
+        )
+        return result.matched_count > 0
+
+    async def _load_one(self, doc):
+        """
+        Re-imports one character.
+
+        :returns: The updated character if it changed, None if it did not, or False if it could not be loaded.
+        """
+        try:
+            old_character = Character.from_dict(dict(doc))
+            old_data = old_character._commit_data()
+            loader = self.loader(old_character)
+            character = await loader.load_character(RefreshContext(self.bot, old_character.owner), argparse(""))
+        except ExternalImportError as e:
+            log.debug(f"Could not refresh character {doc.get('upstream')} owned by {doc.get('owner')}: {e}")
+            return False
+        except Exception:
+            log.warning(f"Error refreshing character {doc.get('upstream')} owned by {doc.get('owner')}", exc_info=True)
+            return False
+
+        if loader.unchanged:
+            return None
+        character.update(old_character)
+        if character._commit_data() == old_data:
+            return None
+        return character
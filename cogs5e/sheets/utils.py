@@ -1,7 +1,12 @@
+import asyncio
 import collections
+import functools
+import time
 
+from cogs5e.models.errors import ExternalImportError
 from cogs5e.models.sheet.action import Action
 from gamedata import compendium
+from utils.executors import EXECUTOR_SIZES, get_executor
 
 
 # ==== Name => Action Discovery ====
@@ -83,3 +88,94 @@ def get_actions_for_names(names):
             )
 
     return actions
+
+
+# ==== Parse Scheduling ====
+# the number of sheets that can be parsed at once
+PARSE_WORKERS = EXECUTOR_SIZES["sheet-parse"]
+# the number of imports a single user can have waiting to be parsed
+MAX_QUEUED_PER_USER = 3
+# how often a parse waiting for the compendium to finish reloading checks on it, in seconds
+COMPENDIUM_RELOAD_POLL = 0.1
+
+
+class ParseScheduler:
+    """
+    Runs sheet parsing on the "sheet-parse" executor with bounded concurrency. When more parses are waiting than there
+    are workers, users take turns so one user's !update storm cannot starve everyone else.
+
+    The workers are threads, so parsing still holds the GIL and competes with the event loop for CPU; this only bounds
+    how many parses run at once and keeps them from running on the loop itself.
+    Parses read the compendium, which may be rebuilt on another thread while they run; a parse that overlaps a reload is
+    run again (see :func:`_parse_consistent`).
+    """
+
+    def __init__(self, max_workers=PARSE_WORKERS):
+        self.max_workers = max_workers
+        self._queues = collections.OrderedDict()  # map: user id -> deque of (func, args, future) waiting to run
+        self._running = 0
+
+    async def run(self, user_id, func, *args):
+        """
+        Runs ``func(*args)`` on a parse worker once it is *user_id*'s turn, and returns the result.
+
+        :raises ExternalImportError: if the user already has too many parses waiting.
+        """
+        queue = self._queues.get(user_id)
+        if queue is not None and len(queue) >= MAX_QUEUED_PER_USER:
+            raise ExternalImportError("You are importing too many characters at once! Please wait a few seconds.")
+
+        future = asyncio.get_event_loop().create_future()
+        if queue is None:
+            queue = self._queues[user_id] = collections.deque()
+        queue.append((func, args, future))
+        self._dispatch()
+        return await future
+
+    def _dispatch(self):
+        while self._running < self.max_workers and self._queues:
+            # take the next parse from the user at the front of the line, then send them to the back
+            user_id, queue = self._queues.popitem(last=False)
+            func, args, future = queue.popleft()
+            if queue:
+                self._queues[user_id] = queue
+            if future.cancelled():
+                continue
+
+            self._running += 1
+            task = asyncio.get_event_loop().run_in_executor(get_executor("sheet-parse"), _parse_consistent, func, args)
+            task.add_done_callback(functools.partial(self._on_done, future))
+
+    def _on_done(self, future, task):
+        self._running -= 1
+        if not future.cancelled():
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+        self._dispatch()
+
+
+def _parse_consistent(func, args):
+    """
+    Runs ``func(*args)`` on a worker thread, running it again if the compendium was reloaded while it ran, so that the
+    result is never built from a half-rebuilt compendium.
+    """
+    while True:
+        seq = compendium.reload_seq
+        if seq % 2:  # a reload is in progress
+            time.sleep(COMPENDIUM_RELOAD_POLL)
+            continue
+        try:
+            result = func(*args)
+        except Exception:
+            if compendium.reload_seq != seq:
+                continue
+            raise
+        if compendium.reload_seq == seq:
+            return result
+
+
+parse_scheduler = ParseScheduler()
@@ -149,6 +149,8 @@ class Effect:
         """Sets the parent of an effect."""
         self.parent = EffectReference.from_effect(parent)
         parent.children.append(EffectReference.from_effect(self))
+        if self.participant is not None:
+            self.participant._invalidate_summary_cache()
         return self
 
     @property
@@ -154,6 +154,7 @@ class Participant(BaseParticipant, StatBlock):
     @name.setter
     def name(self, new_name):
         self._name = new_name
+        self._invalidate_summary_cache()
 
     @property
     def controller(self):
@@ -186,6 +187,7 @@ class Participant(BaseParticipant, StatBlock):
         self._max_hp = new_max_hp
         if self._hp is None:
             self._hp = new_max_hp
+        self._invalidate_summary_cache()
 
     @property
     def hp(self):
@@ -194,6 +196,16 @@ class Participant(BaseParticipant, StatBlock):
     @hp.setter
     def hp(self, new_hp):
         self._hp = new_hp
+        self._invalidate_summary_cache()
+
+    @property
+    def temp_hp(self):
+        return self._temp_hp
+
+    @temp_hp.setter
+    def temp_hp(self, new_temp_hp):
+        self._temp_hp = max(0, new_temp_hp)  # 0 ≤ temp_hp
+        self._invalidate_summary_cache()
 
     def hp_str(self, private=False):
         f"""Returns a string representation of the {participant_name}'s HP."""
@@ -231,6 +243,7 @@ class Participant(BaseParticipant, StatBlock):
     @ac.setter
     def ac(self, new_ac):
         self._ac = new_ac
+        self._invalidate_summary_cache()
 
     @property
     def is_private(self):
@@ -239,6 +252,7 @@ class Participant(BaseParticipant, StatBlock):
     @is_private.setter
     def is_private(self, new_privacy):
         self._private = new_privacy
+        self._invalidate_summary_cache()
 
     @property
     def resistances(self):
@@ -286,6 +300,7 @@ class Participant(BaseParticipant, StatBlock):
     @notes.setter
     def notes(self, new_notes):
         self._notes = new_notes
+        self._invalidate_summary_cache()
 
     @property
     def group(self):
@@ -393,6 +408,11 @@ class Participant(BaseParticipant, StatBlock):
             del self._cache["parsed_effects"]
         if "attacks" in self._cache:
             del self._cache["attacks"]
+        self._invalidate_summary_cache()
+
+    def _invalidate_summary_cache(self):
+        if "summary" in self._cache:
+            del self._cache["summary"]
 
     def is_concentrating(self):
         return any(e.concentration for e in self.get_effects())
@@ -424,11 +444,13 @@ class Participant(BaseParticipant, StatBlock):
         """
         for e in self.get_effects().copy():
             e.on_turn(num_rounds)
+        self._invalidate_summary_cache()
 
     def on_turn_end(self, num_rounds=1):
         """A method called at the end of the round"""
         for e in self.get_effects().copy():
             e.on_turn_end(num_rounds)
+        self._invalidate_summary_cache()
 
     def on_remove(self):
         f"""
@@ -440,8 +462,22 @@ class Participant(BaseParticipant, StatBlock):
     def get_summary(self, private=False, no_notes=False):
         f"""
         Gets a short summary of {article} {participant_name}'s status.
+        Summaries are cached until the {participant_name} changes or the turn advances.
         :return: A string describing the {participant_name}.
         """
+        if self.ongoing_event is None:
+            return self._build_summary(private, no_notes)
+        key = self._summary_cache_key(private, no_notes)
+        summaries = self._cache.setdefault("summary", {})
+        if key not in summaries:
+            summaries[key] = self._build_summary(private, no_notes)
+        return summaries[key]
+
+    def _summary_cache_key(self, private, no_notes):
+        # effect durations are displayed relative to the current turn
+        return private, no_notes, self.ongoing_event.index, self.ongoing_event.round_num
+
+    def _build_summary(self, private, no_notes):
         hp_str = f"{self.hp_str(private)} " if self.hp_str(private) else ""
         if not no_notes:
             return f"{self.name} {hp_str}{self._get_effects_and_notes()}"
@@ -659,6 +695,7 @@ class PlayerParticipant(Participant):
         :param int|None new_ac: The new AC
         """
         self._ac = new_ac
+        self._invalidate_summary_cache()
 
     @property
     def spellbook(self):
@@ -673,6 +710,7 @@ class PlayerParticipant(Participant):
     @max_hp.setter
     def max_hp(self, new_max_hp):
         self._max_hp = new_max_hp
+        self._invalidate_summary_cache()
 
     @property
     def hp(self):
@@ -703,5 +741,16 @@ class PlayerParticipant(Participant):
     def get_scope_locals(self):
         return {**self.character.get_scope_locals(), **super().get_scope_locals()}
 
+    def _summary_cache_key(self, private, no_notes):
+        # the character's hp can change outside of the ongoing event
+        character = self.character
+        return (
+            *super()._summary_cache_key(private, no_notes),
+            character.hp,
+            character.temp_hp,
+            character.max_hp,
+            character.ac,
+        )
+
     def get_color(self):
         return self.character.get_color()
@@ -16,14 +16,20 @@ from discord.errors import NotFound
 from discord.ext import commands
 
 import utils.redisIO as redis
+from cogs5e.models.character import Character
+from cogs5e.models.errors import ExternalImportError
+from cogs5e.sheets.refresh import CharacterRefreshJob, REFRESH_CONCURRENCY, SHEET_TYPES
+from ddb.gamelog import CampaignLink
+from ddb.utils import invalidate_user_map
 from gamedata.compendium import compendium
 from utils import checks, config
+from utils.executors import executor_stats
 from utils.functions import confirm, search_and_select
+from utils.redisIO import COMMAND_PUBSUB_CHANNEL
+from utils.settings import ServerSettings
 
 log = logging.getLogger(__name__)
 
-COMMAND_PUBSUB_CHANNEL = f"admin-commands:{config.ENVIRONMENT}"  # >:c
-
 
 class AdminUtils(commands.Cog):
     """
@@ -40,6 +46,9 @@ class AdminUtils(commands.Cog):
         self._ps_cmd_map = {}  # set up in admin_pubsub()
         self._ps_requests_pending = {}
 
+        # character refresh jobs running on this cluster
+        self._refresh_tasks = {}  # map: sheet type -> task
+
     # ==== setup tasks ====
     async def cog_load(self):
         self.bot.muted = set(await self.bot.rdb.jget("muted", []))
@@ -66,6 +75,14 @@ class AdminUtils(commands.Cog):
             "restart_shard": self._restart_shard,
             "kill_cluster": self._kill_cluster,
             "set_dd_sample_rate": self._set_dd_sample_rate,
+            "gamelog_stats": self._gamelog_stats,
+            "executor_stats": self._executor_stats,
+            "invalidate_server_settings": self._invalidate_server_settings,
+            "invalidate_prefix": self._invalidate_prefix,
+            "invalidate_character": self._invalidate_character,
+            "invalidate_active_character": self._invalidate_active_character,
+            "invalidate_campaign_link": self._invalidate_campaign_link,
+            "invalidate_ddb_user_map": self._invalidate_ddb_user_map,
         }
         while True:  # if we ever disconnect from pubsub, wait 5s and try reinitializing
             try:  # connect to the pubsub channel
@@ -240,6 +257,44 @@ class AdminUtils(commands.Cog):
         resp = await self.pscall("set_dd_sample_rate", kwargs={"sample_rate": sample_rate})
         await self._send_replies(ctx, resp)
 
+    @admin.command(hidden=True, name="gamelog-stats")
+    @checks.is_owner()
+    async def admin_gamelog_stats(self, ctx):
+        """Shows how many game log events each cluster has handled, dropped, and has waiting."""
+        resp = await self.pscall("gamelog_stats")
+        await self._send_replies(ctx, resp)
+
+    @admin.command(hidden=True, name="executor-stats")
+    @checks.is_owner()
+    async def admin_executor_stats(self, ctx):
+        """Shows how much blocking work each cluster's executors have waiting and running."""
+        resp = await self.pscall("executor_stats")
+        await self._send_replies(ctx, resp)
+
+    @admin.command(hidden=True, name="loop-stats")
+    @checks.is_owner()
+    async def admin_loop_stats(self, ctx, activity_name: str = None):
+        """
+        Shows what has blocked this cluster's event loop the most, or the latest stack that a given activity blocked
+        the loop with. Needs LOOP_WATCHDOG_THRESHOLD to be set.
+        """
+        watchdog = self.bot.watchdog
+        if watchdog is None:
+            return await ctx.send("The event loop watchdog is not running on this cluster.")
+        if activity_name is not None:
+            stack = watchdog.stacks.get(activity_name)
+            if stack is None:
+                return await ctx.send(f"No stack captured for `{activity_name}`.")
+            return await ctx.send(f"```py\n{stack[-1900:]}\n```")
+
+        out = [
+            f"Cluster {self.bot.cluster_id}: {watchdog.stats['blocked']} blocks over {watchdog.threshold}s "
+            f"in {watchdog.stats['beats']} beats, max lag {watchdog.max_lag:.3f}s"
+        ]
+        for name, count, blocked_time in watchdog.top_offenders():
+            out.append(f"{name}: {count} blocks, {blocked_time:.2f}s total")
+        await ctx.send("```\n" + "\n".join(out)[:1900] + "\n```")
+
     # ---- cluster management ----
     @admin.command(hidden=True, name="restart-shard")
     @checks.is_owner()
@@ -313,6 +368,41 @@ class AdminUtils(commands.Cog):
         result = await self.bot.mdb.workshop_tags.delete_many({"slug": slug})
         await ctx.send(f"Deleted {result.deleted_count} tags")
 
+    # ---- character refresh ----
+    @admin.group(hidden=True, name="refresh", invoke_without_command=True)
+    @checks.is_owner()
+    async def admin_refresh(self, ctx):
+        """Shows the progress of bulk character refreshes."""
+        out = []
+        for sheet_type in SHEET_TYPES:
+            progress = await CharacterRefreshJob.get_progress(self.bot.rdb, sheet_type)
+            if progress is None:
+                out.append(f"`{sheet_type}`: never run")
+                continue
+            out.append(f"`{sheet_type}`: {CharacterRefreshJob.summarize(progress)}")
+        out.append("subcommands: `start <sheet_type> [concurrency] [restart]`, `pause <sheet_type>`")
+        await ctx.send("\n".join(out))
+
+    @admin_refresh.command(name="start")
+    @checks.is_owner()
+    async def admin_refresh_start(self, ctx, sheet_type, concurrency: int = REFRESH_CONCURRENCY, restart: bool = False):
+        """
+        Re-imports every character of a sheet type from upstream in the background, on this cluster.
+        Resumes a paused refresh unless `restart` is passed.
+        """
+        if sheet_type not in SHEET_TYPES:
+            return await ctx.send(f"sheet type must be one of {', '.join(SHEET_TYPES)}")
+        job = CharacterRefreshJob(self.bot, sheet_type, concurrency=concurrency)
+        self._refresh_tasks[sheet_type] = asyncio.create_task(self._run_refresh(ctx, job, restart))
+        await ctx.send(f"Started refreshing {sheet_type} characters.")
+
+    @admin_refresh.command(name="pause")
+    @checks.is_owner()
+    async def admin_refresh_pause(self, ctx, sheet_type):
+        """Pauses a character refresh after its current batch. Works from any cluster."""
+        await CharacterRefreshJob.pause(self.bot.rdb, sheet_type)
+        await ctx.send(f"Pausing the {sheet_type} refresh after its current batch.")
+
     # ==== listener ====
     @commands.Cog.listener()
     async def on_guild_join(self, server):
@@ -330,6 +420,18 @@ class AdminUtils(commands.Cog):
             out = f"{base}\n{out}"
         await ctx.send(out)
 
+    async def _run_refresh(self, ctx, job, restart):
+        try:
+            progress = await job.run(restart=restart)
+        except ExternalImportError as e:
+            return await ctx.send(str(e))
+        except Exception as e:
+            log.exception(f"Error in {job.sheet_type} character refresh:")
+            return await ctx.send(f"The {job.sheet_type} refresh stopped with an error: {e}")
+        finally:
+            self._refresh_tasks.pop(job.sheet_type, None)
+        await ctx.send(f"{job.sheet_type} refresh {CharacterRefreshJob.summarize(progress)}")
+
     # ==== methods (called by pubsub) ====
     async def _leave(self, guild_id):
         guild = self.bot.get_guild(guild_id)
@@ -386,6 +488,13 @@ class AdminUtils(commands.Cog):
     async def _ping(self):
         return dict(self.bot.latencies)
 
+    async def _gamelog_stats(self):
+        dispatcher = self.bot.glclient.dispatcher
+        return f"{dict(dispatcher.stats)}, waiting: {sum(dispatcher.queue_sizes())}"
+
+    async def _executor_stats(self):
+        return "\n".join(f"{name}: {summary}" for name, summary in executor_stats().items()) or "no executors used"
+
     async def _set_dd_sample_rate(self, sample_rate: float):
         if config.DD_SERVICE is None:
             return "no DD_SERVICE set, this process is not sampling"
@@ -411,6 +520,36 @@ class AdminUtils(commands.Cog):
         os.kill(os.getpid(), signal.SIGTERM)  # please shut down gracefully
         return "Shutting down..."
 
+    @staticmethod
+    async def _invalidate_server_settings(guild_id: int):
+        ServerSettings.invalidate(guild_id)
+        return False  # no reply
+
+    async def _invalidate_prefix(self, guild_id: str):
+        # this includes the sending cluster, which will reload the new prefix from the db on the next message
+        self.bot.invalidate_prefix(guild_id)
+        return False  # no reply
+
+    @staticmethod
+    async def _invalidate_character(owner_id: str, upstream: str, version: int):
+        Character.invalidate(owner_id, upstream, version)
+        return False  # no reply
+
+    @staticmethod
+    async def _invalidate_active_character(owner_id: str):
+        Character.invalidate_active(owner_id)
+        return False  # no reply
+
+    @staticmethod
+    async def _invalidate_campaign_link(campaign_id: str):
+        CampaignLink.invalidate(campaign_id)
+        return False  # no reply
+
+    @staticmethod
+    async def _invalidate_ddb_user_map(*ddb_ids: str):
+        invalidate_user_map(*ddb_ids)
+        return False  # no reply
+
     # ==== pubsub ====
     async def pscall(self, command, args=None, kwargs=None, *, expected_replies=config.NUM_CLUSTERS or 1, timeout=30):
         """Makes an IPC call to all clusters. Returns a dict of {cluster_id: reply_data}."""
@@ -26,6 +26,7 @@ from cogs5e.models.errors import InvalidArgument, NoCharacter, NotAllowed
 from utils import checks
 from utils.constants import DAMAGE_TYPES, SAVE_NAMES, SKILL_NAMES, STAT_ABBREVIATIONS, STAT_NAMES
 from utils.functions import a_or_an, confirm, get_selection, search_and_select, user_from_id
+from utils.redisIO import publish_command
 
 ALIASER_ROLES = ("server aliaser", "dragonspeaker")
 
@@ -592,6 +593,9 @@ class Customization(commands.Cog):
         # update db
         await self.bot.mdb.prefixes.update_one({"guild_id": guild_id}, {"$set": {"prefix": prefix}}, upsert=True)
 
+        # invalidate other clusters' caches
+        await publish_command(self.bot.rdb, "invalidate_prefix", [guild_id], sender=self.bot.cluster_id)
+
         await ctx.send(f"Prefix set to `{prefix}` for this server. Use commands like `{prefix}roll` now!")
 
     @commands.command()
@@ -5,14 +5,193 @@ Created on Jul 17, 2017
 """
 import asyncio
 import datetime
+import logging
 import time
 from collections import Counter
 
 from discord.ext import commands
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from utils import config
 
 GUILD_RDB_KEY = "stats.cluster_guilds"
+STATS_FLUSH_INTERVAL = 30  # seconds between writes of buffered analytics
+MAX_BUFFERED_EVENTS = 10000  # if more command events than this are buffered, the oldest are dropped
+
+log = logging.getLogger(__name__)
+
+
+class StatsAggregator:
+    """
+    Accumulates analytics counters and command events in memory, and writes them to the db in bulk when flushed.
+    """
+
+    def __init__(self, mdb, max_events=MAX_BUFFERED_EVENTS):
+        self.mdb = mdb
+        self.max_events = max_events
+        self._reset()
+        self._flush_lock = asyncio.Lock()
+
+    def _reset(self):
+        # key -> number of commands since last flush
+        self.user_activity = Counter()
+        self.guild_activity = Counter()
+        self.command_activity = Counter()
+        self.random_stats = Counter()
+        # key -> time of last command since last flush
+        self.user_last_command = {}
+        self.guild_last_command = {}
+        self.command_last_invoked = {}
+        self.command_events = []
+        self.dropped_events = 0
+
+    @property
+    def num_buffered_events(self):
+        return len(self.command_events)
+
+    def record_command(self, ctx):
+        now = datetime.datetime.utcnow()
+        command_name = ctx.command.qualified_name
+        guild_id = 0 if ctx.guild is None else ctx.guild.id
+
+        self.user_activity[ctx.author.id] += 1
+        self.user_last_command[ctx.author.id] = now
+        self.guild_activity[guild_id] += 1
+        self.guild_last_command[guild_id] = now
+        self.command_activity[command_name] += 1
+        self.command_last_invoked[command_name] = now
+        self.random_stats["commands_used_life"] += 1
+
+        self.command_events.append(
+            {"timestamp": now, "command_name": command_name, "user_id": ctx.author.id, "guild_id": guild_id}
+        )
+        if len(self.command_events) > self.max_events:
+            del self.command_events[0]
+            self.dropped_events += 1
+
+    def increase_stat(self, stat, amount=1):
+        self.random_stats[stat] += amount
+
+    async def flush(self):
+        """
+        Writes all buffered counters and events to the db.
+        Anything that fails to be written is merged back into the buffers, to be written on the next flush.
+        """
+        async with self._flush_lock:
+            user_activity, guild_activity = self.user_activity, self.guild_activity
+            command_activity, random_stats = self.command_activity, self.random_stats
+            user_last_command, guild_last_command = self.user_last_command, self.guild_last_command
+            command_last_invoked, command_events = self.command_last_invoked, self.command_events
+            if self.dropped_events:
+                log.warning(f"Dropped {self.dropped_events} command events because the stats buffer was full")
+            self._reset()
+
+            failed = await _bulk_write(
+                self.mdb.analytics_user_activity,
+                {
+                    user_id: UpdateOne(
+                        {"user_id": user_id},
+                        {"$inc": {"commands_called": n}, "$max": {"last_command_time": user_last_command[user_id]}},
+                        upsert=True,
+                    )
+                    for user_id, n in user_activity.items()
+                },
+            )
+            _merge_back(failed, user_activity, user_last_command, self.user_activity, self.user_last_command)
+
+            failed = await _bulk_write(
+                self.mdb.analytics_guild_activity,
+                {
+                    guild_id: UpdateOne(
+                        {"guild_id": guild_id},
+                        {"$inc": {"commands_called": n}, "$max": {"last_command_time": guild_last_command[guild_id]}},
+                        upsert=True,
+                    )
+                    for guild_id, n in guild_activity.items()
+                },
+            )
+            _merge_back(failed, guild_activity, guild_last_command, self.guild_activity, self.guild_last_command)
+
+            failed = await _bulk_write(
+                self.mdb.analytics_command_activity,
+                {
+                    name: UpdateOne(
+                        {"name": name},
+                        {"$inc": {"num_invocations": n}, "$max": {"last_invoked_time": command_last_invoked[name]}},
+                        upsert=True,
+                    )
+                    for name, n in command_activity.items()
+                },
+            )
+            _merge_back(
+                failed, command_activity, command_last_invoked, self.command_activity, self.command_last_invoked
+            )
+
+            failed = await _bulk_write(
+                self.mdb.random_stats,
+                {key: UpdateOne({"key": key}, {"$inc": {"value": n}}, upsert=True) for key, n in random_stats.items()},
+            )
+            _merge_back(failed, random_stats, None, self.random_stats, None)
+
+            failed_events = await _insert_many(self.mdb.analytics_command_events, command_events)
+            if failed_events:
+                # keep the failed events ahead of the ones recorded since, dropping the oldest if the buffer is full
+                self.command_events[:0] = failed_events
+                if (overflow := len(self.command_events) - self.max_events) > 0:
+                    del self.command_events[:overflow]
+                    self.dropped_events += overflow
+
+
+async def _bulk_write(collection, ops):
+    """
+    Writes a map of key -> write operation to a collection, unordered.
+
+    :return: The keys whose writes failed.
+    """
+    if not ops:
+        return []
+    keys = list(ops)
+    try:
+        await collection.bulk_write(list(ops.values()), ordered=False)
+    except BulkWriteError as e:
+        # the other writes of an unordered bulk write go through
+        write_errors = e.details["writeErrors"]
+        log.warning(f"Failed to write {len(write_errors)} stats to {collection.name}: {write_errors[0]['errmsg']}")
+        return [keys[error["index"]] for error in write_errors]
+    except Exception as e:
+        # we don't know whether any of the writes went through, so we might count some of them twice when we retry
+        log.warning(f"Failed to write {len(keys)} stats to {collection.name}: {e!r}")
+        return keys
+    return []
+
+
+async def _insert_many(collection, documents):
+    """
+    Inserts a list of documents into a collection, unordered.
+
+    :return: The documents that failed to be inserted.
+    """
+    if not documents:
+        return []
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details["writeErrors"]
+        log.warning(f"Failed to insert {len(write_errors)} documents to {collection.name}: {write_errors[0]['errmsg']}")
+        return [documents[error["index"]] for error in write_errors]
+    except Exception as e:
+        log.warning(f"Failed to insert {len(documents)} documents to {collection.name}: {e!r}")
+        return documents
+    return []
+
+
+def _merge_back(keys, counts, last_times, counter, last_times_buffer):
+    """Adds the counts (and last times, if tracked) of *keys* that failed to be written back into the buffers."""
+    for key in keys:
+        counter[key] += counts[key]
+        if last_times is not None:
+            last_times_buffer[key] = max(last_times[key], last_times_buffer.get(key, last_times[key]))
 
 
 class Stats(commands.Cog):
@@ -25,16 +204,29 @@ class Stats(commands.Cog):
         self.bot = bot
         self.start_time = time.monotonic()
         self.command_stats = Counter()
+        self.aggregator = StatsAggregator(bot.mdb)
         self.bot.loop.create_task(self.scheduled_update())
+        self._flush_task = self.bot.loop.create_task(self.scheduled_flush())
+
+    def cog_unload(self):
+        self._flush_task.cancel()
+        self.bot.loop.create_task(self.flush())
+
+    async def flush(self):
+        """Writes all buffered analytics to the db. Called periodically and on shutdown."""
+        try:
+            await self.aggregator.flush()
+        except Exception as e:
+            log.exception(f"Failed to flush stats: {e}")
 
     # ===== listeners =====
     @commands.Cog.listener()
     async def on_command(self, ctx):
         command = ctx.command.qualified_name
         self.command_stats[command] += 1
-        await self.user_activity(ctx)
-        await self.guild_activity(ctx)
-        await self.command_activity(ctx)
+        self.aggregator.record_command(ctx)
+        if self.aggregator.num_buffered_events >= self.aggregator.max_events:
+            await self.aggregator.flush()
 
     # ===== tasks =====
     async def scheduled_update(self):
@@ -47,6 +239,11 @@ class Stats(commands.Cog):
             await self.publish_shared_statistics()
             await asyncio.sleep(60 * 60)  # every hour
 
+    async def scheduled_flush(self):
+        while True:
+            await asyncio.sleep(STATS_FLUSH_INTERVAL)
+            await self.flush()
+
     # ===== internal stat sharing =====
     async def clean_published_stats(self):
         cluster_servers = await self.bot.rdb.get_whole_dict(GUILD_RDB_KEY)
@@ -58,45 +255,6 @@ class Stats(commands.Cog):
         cluster_servers = len(self.bot.guilds)
         await self.bot.rdb.hset(GUILD_RDB_KEY, str(self.bot.cluster_id), cluster_servers)
 
-    # ===== analytic loggers =====
-    async def user_activity(self, ctx):
-        await self.bot.mdb.analytics_user_activity.update_one(
-            {"user_id": ctx.author.id},
-            {"$inc": {"commands_called": 1}, "$currentDate": {"last_command_time": True}},
-            upsert=True,
-        )
-
-    async def guild_activity(self, ctx):
-        if ctx.guild is None:
-            guild_id = 0
-        else:
-            guild_id = ctx.guild.id
-
-        await self.bot.mdb.analytics_guild_activity.update_one(
-            {"guild_id": guild_id},
-            {"$inc": {"commands_called": 1}, "$currentDate": {"last_command_time": True}},
-            upsert=True,
-        )
-
-    async def command_activity(self, ctx):
-        await self.increase_stat(ctx, "commands_used_life")
-        # log command lifetime stat
-        await self.bot.mdb.analytics_command_activity.update_one(
-            {"name": ctx.command.qualified_name},
-            {"$inc": {"num_invocations": 1}, "$currentDate": {"last_invoked_time": True}},  # yay, atomic operations
-            upsert=True,
-        )
-        # log event
-        guild_id = 0 if ctx.guild is None else ctx.guild.id
-        await self.bot.mdb.analytics_command_events.insert_one(
-            {
-                "timestamp": datetime.datetime.utcnow(),
-                "command_name": ctx.command.qualified_name,
-                "user_id": ctx.author.id,
-                "guild_id": guild_id,
-            }
-        )
-
     async def update_hourly(self):
         class _ContextProxy:
             def __init__(self, bot):
@@ -157,7 +315,11 @@ class Stats(commands.Cog):
     # ===== utils =====
     @staticmethod
     async def increase_stat(ctx, stat):
-        await ctx.bot.mdb.random_stats.update_one({"key": stat}, {"$inc": {"value": 1}}, upsert=True)
+        stats_cog = ctx.bot.get_cog("Stats")
+        if stats_cog is not None:
+            stats_cog.aggregator.increase_stat(stat)
+        else:
+            await ctx.bot.mdb.random_stats.update_one({"key": stat}, {"$inc": {"value": 1}}, upsert=True)
 
     @staticmethod
     async def get_statistic(ctx, stat):
@@ -7,6 +7,7 @@ import textwrap
 import discord
 from discord.ext import commands
 
+from cogs5e.initiative import Combat
 from cogs5e.models.embeds import EmbedWithAuthor
 from utils import checks, config
 from utils.aldclient import discord_user_to_dict
@@ -139,7 +140,10 @@ class Tutorials(commands.Cog):
             return
 
         # run tutorial state listener
-        await state.listener(ctx, user_state)
+        try:
+            await state.listener(ctx, user_state)
+        finally:
+            Combat.release_lock(ctx)
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild):
@@ -7,6 +7,7 @@ import time
 import traceback
 
 import aioredis
+import cachetools
 import d20
 import discord
 import motor.motor_asyncio
@@ -19,14 +20,19 @@ from discord.ext.commands.errors import CommandInvokeError
 
 from aliasing.errors import CollectableRequiresLicenses, EvaluationError
 from aliasing.helpers import handle_alias_exception, handle_alias_required_licenses, handle_aliases
+from cogs5e.initiative import Combat
+from cogs5e.models.dicecloud.client import DicecloudClient
 from cogs5e.models.errors import AvraeException, RequiresLicense
+from cogs5e.sheets import beyond
 from ddb import BeyondClient, BeyondClientBase
 from ddb.gamelog import GameLogClient
 from gamedata.compendium import compendium
 from gamedata.lookuputils import handle_required_license
-from utils import clustering, config, context
+from utils import accounting, clustering, config, context
 from utils.aldclient import AsyncLaunchDarklyClient
+from utils.executors import shutdown_executors
 from utils.help import help_command
+from utils.loopwatch import LoopWatchdog, activity
 from utils.redisIO import RedisIO
 
 # -----COGS-----
@@ -51,6 +57,11 @@ COGS = (
     "cogsmisc.tutorials",
 )
 
+# the number of guild prefixes to keep in memory per cluster (guilds on the default prefix are cached too)
+PREFIX_CACHE_SIZE = 50000
+# the number of guild ids to look up per query when warming the prefix cache
+PREFIX_WARM_CHUNK_SIZE = 1000
+
 
 async def get_prefix(the_bot, message):
     if not message.guild:
@@ -73,18 +84,29 @@ class Avrae(commands.AutoShardedBot):
         self.state = "init"
 
         # dbs
-        self.mclient = motor.motor_asyncio.AsyncIOMotorClient(config.MONGO_URL)
+        self.mclient = motor.motor_asyncio.AsyncIOMotorClient(
+            config.MONGO_URL, event_listeners=[accounting.install_mongo_hooks()]
+        )
         self.mdb = self.mclient[config.MONGODB_DB_NAME]
         self.rdb = self.loop.run_until_complete(self.setup_rdb())
 
         # misc caches
-        self.prefixes = dict()
+        self.prefixes = cachetools.LRUCache(maxsize=PREFIX_CACHE_SIZE)
+        self._prefixes_invalidated = None  # guilds whose prefix changed while warming the cache, see warm_prefix_cache
         self.muted = set()
         self.cluster_id = 0
 
         # launch concurrency
         self.launch_max_concurrency = 1
 
+        # count discord api calls against the running command
+        self.http.request = accounting.accounted("discord", self.http.request)
+
+        # event loop monitoring
+        self.watchdog = None
+        if config.LOOP_WATCHDOG_THRESHOLD is not None:
+            self.watchdog = LoopWatchdog(self.loop, config.LOOP_WATCHDOG_THRESHOLD)
+
         # sentry
         if config.SENTRY_DSN is not None:
             release = None
@@ -106,12 +128,16 @@ class Avrae(commands.AutoShardedBot):
         self.glclient.init()
 
     async def setup_rdb(self):
-        return RedisIO(await aioredis.create_redis_pool(config.REDIS_URL, db=config.REDIS_DB_NUM))
+        return RedisIO(
+            await aioredis.create_redis_pool(
+                config.REDIS_URL, db=config.REDIS_DB_NUM, commands_factory=accounting.AccountedRedis
+            )
+        )
 
     async def get_guild_prefix(self, guild: discord.Guild) -> str:
         guild_id = str(guild.id)
-        if guild_id in self.prefixes:
-            return self.prefixes.get(guild_id, config.DEFAULT_PREFIX)
+        if (gp := self.prefixes.get(guild_id)) is not None:
+            return gp
         # load from db and cache
         gp_obj = await self.mdb.prefixes.find_one({"guild_id": guild_id})
         if gp_obj is None:
@@ -121,6 +147,31 @@ class Avrae(commands.AutoShardedBot):
         self.prefixes[guild_id] = gp
         return gp
 
+    def invalidate_prefix(self, guild_id: str):
+        """Forgets the cached prefix of a guild, so it is loaded again on the next message."""
+        self.prefixes.pop(guild_id, None)
+        if self._prefixes_invalidated is not None:
+            self._prefixes_invalidated.add(guild_id)
+
+    async def warm_prefix_cache(self):
+        """Loads the prefixes of all guilds this cluster can see that are not yet cached, in bulk."""
+        guild_ids = [str(g.id) for g in self.guilds if str(g.id) not in self.prefixes][:PREFIX_CACHE_SIZE]
+        self._prefixes_invalidated = invalidated = set()
+        try:
+            for i in range(0, len(guild_ids), PREFIX_WARM_CHUNK_SIZE):
+                chunk = guild_ids[i : i + PREFIX_WARM_CHUNK_SIZE]
+                found = {}
+                async for gp_obj in self.mdb.prefixes.find({"guild_id": {"$in": chunk}}, projection={"_id": False}):
+                    found[gp_obj["guild_id"]] = gp_obj.get("prefix", config.DEFAULT_PREFIX)
+                for guild_id in chunk:
+                    # a prefix might have been loaded or changed while we were querying, in which case what we read
+                    # may be stale
+                    if guild_id not in self.prefixes and guild_id not in invalidated:
+                        self.prefixes[guild_id] = found.get(guild_id, config.DEFAULT_PREFIX)
+        finally:
+            self._prefixes_invalidated = None
+        log.info(f"Warmed prefix cache with {len(guild_ids)} guilds.")
+
     @property
     def is_cluster_0(self):
         if self.cluster_id is None:  # we're not running in clustered mode anyway
@@ -173,11 +224,9 @@ class Avrae(commands.AutoShardedBot):
 
         async def pre_lock_check(first=False):
             """
-            Before attempting a lock, CPU utilization should be <75% to prevent a huge spike in CPU when connecting
+            Before queueing for a lock, CPU utilization should be <75% to prevent a huge spike in CPU when connecting
             up to 16 shards at once. This also allows multiple clusters to startup concurrently.
             """
-            if not first:
-                await asyncio.sleep(0.2)
             wait_start = time.monotonic()
             while psutil.cpu_percent() > 75:
                 t = random.uniform(5, 15)
@@ -192,6 +241,16 @@ class Avrae(commands.AutoShardedBot):
     async def get_context(self, *args, **kwargs) -> context.AvraeContext:
         return await super().get_context(*args, cls=context.AvraeContext, **kwargs)
 
+    async def invoke(self, ctx):
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        name = ctx.command.qualified_name
+        try:
+            with activity(f"command: {name}"), accounting.account(name, budget=accounting.get_budget(ctx.command)):
+                await super().invoke(ctx)
+        finally:
+            Combat.release_lock(ctx)
+
     async def close(self):
         # note: when closing the bot 2 errors are emitted:
         #
@@ -200,10 +259,19 @@ class Avrae(commands.AutoShardedBot):
         #
         # These are caused by aioredis streams being GC'ed when discord.py cancels the tasks that create them
         # (because of course d.py decides it wants to cancel *all* tasks on its loop...)
+        await Combat.flush_pending_writes()
+        if (stats := self.get_cog("Stats")) is not None:
+            await stats.flush()
         await super().close()
         await self.ddb.close()
         await self.rdb.close()
         await self.glclient.close()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        await beyond.close_http()
+        if DicecloudClient.instance is not None:
+            await DicecloudClient.instance.close()
+        shutdown_executors()
         self.mclient.close()
         self.ldclient.close()
 
@@ -256,6 +324,7 @@ async def on_ready():
     log.info(bot.user.name)
     log.info(bot.user.id)
     log.info("------")
+    await bot.warm_prefix_cache()
 
 
 @bot.event
@@ -356,7 +425,9 @@ async def on_message(message):
     if ctx.valid:  # builtins first
         await bot.invoke(ctx)
     elif ctx.invoked_with:  # then aliases if there is some word (and not just the prefix)
-        await handle_aliases(ctx)
+        # the alias' own I/O (lookup, evaluation) is accounted separately from the command it invokes
+        with activity(f"alias: {ctx.invoked_with}"), accounting.account(f"alias: {ctx.invoked_with}"):
+            await handle_aliases(ctx)
 
 
 @bot.event
@@ -377,4 +448,6 @@ if __name__ == "__main__":
     faulthandler.enable()  # assumes we log errors to stderr, traces segfaults
     bot.state = "run"
     bot.loop.create_task(compendium.reload_task(bot.mdb))
+    if bot.watchdog is not None:
+        bot.loop.call_soon(bot.watchdog.start)
     bot.run(config.TOKEN)
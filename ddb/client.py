@@ -9,7 +9,8 @@ from aiobotocore.session import get_session
 from cogsmisc.stats import Stats
 from ddb import auth, character, entitlements, waterdeep
 from ddb.errors import AuthException
-from ddb.utils import update_user_map
+from ddb.utils import delete_user_map, update_user_map
+from utils import accounting
 from utils.config import DDB_AUTH_SERVICE_URL as AUTH_BASE_URL, DYNAMO_ENTITLEMENTS_TABLE, DYNAMO_REGION
 
 # dynamo
@@ -25,6 +26,17 @@ ENTITY_ENTITLEMENT_TTL = 15 * 60
 USER_ENTITLEMENT_CACHE = cachetools.TTLCache(128, USER_ENTITLEMENT_TTL)
 ENTITY_ENTITLEMENT_CACHE = cachetools.TTLCache(64, ENTITY_ENTITLEMENT_TTL)
 USER_ENTITLEMENTS_NONE_SENTINEL = object()
+L2_NOT_FETCHED_SENTINEL = object()  # passed when the L2 (redis) cache has not been checked yet; None means a miss
+
+
+# the redis values are written with RedisIO.set_object(); the version in the key changes when their format does
+def user_entitlement_cache_key(user_id):
+    return f"entitlements.v2.user.{user_id}"
+
+
+def entity_entitlement_cache_key(entity_type):
+    return f"entitlements.v2.entity.{entity_type}"
+
 
 log = logging.getLogger(__name__)
 
@@ -51,7 +63,7 @@ class BeyondClient(BeyondClientBase):
     """
 
     def __init__(self, loop):
-        self.http = aiohttp.ClientSession(loop=loop)
+        self.http = aiohttp.ClientSession(loop=loop, trace_configs=[accounting.http_trace_config()])
 
         self.character = character.CharacterServiceClient(self.http)
         self.waterdeep = waterdeep.WaterdeepClient(self.http)
@@ -80,11 +92,18 @@ class BeyondClient(BeyondClientBase):
         :rtype: set[int] or None
         """
         log.debug(f"Getting DDB entitlements for Discord ID {user_id}")
-        user_e10s = await self._get_user_entitlements(ctx, user_id)
+        # if neither set of entitlements is in memory, check redis for both in one round trip
+        l2_user_e10s = l2_entity_e10s = L2_NOT_FETCHED_SENTINEL
+        if user_id not in USER_ENTITLEMENT_CACHE and entity_type not in ENTITY_ENTITLEMENT_CACHE:
+            l2_user_e10s, l2_entity_e10s = await ctx.bot.rdb.mget_objects(
+                user_entitlement_cache_key(user_id), entity_entitlement_cache_key(entity_type)
+            )
+
+        user_e10s = await self._get_user_entitlements(ctx, user_id, l2_user_e10s)
         if user_e10s is None:
             return None
 
-        entity_e10s = await self._get_entity_entitlements(ctx, entity_type)
+        entity_e10s = await self._get_entity_entitlements(ctx, entity_type, l2_entity_e10s)
 
         # calculate visible entities
         accessible = set()
@@ -126,7 +145,7 @@ class BeyondClient(BeyondClientBase):
             # cache unlinked if user is unlinked
             await ctx.bot.rdb.jsetex(user_cache_key, unlinked_sentinel, USER_ENTITLEMENT_TTL)
             # remove any ddb -> discord user mapping
-            await ctx.bot.mdb.ddb_account_map.delete_one({"discord_id": user_id})
+            await delete_user_map(ctx, user_id)
             return None
 
         user = auth.BeyondUser.from_jwt(token)
@@ -140,7 +159,7 @@ class BeyondClient(BeyondClientBase):
         return user
 
     # ==== entitlement helpers ====
-    async def _get_user_entitlements(self, ctx, user_id):
+    async def _get_user_entitlements(self, ctx, user_id, l2_user_entitlements=L2_NOT_FETCHED_SENTINEL):
         """
         Gets a user's entitlements in the current context, from cache or by communicating with DDB.
 
@@ -149,6 +168,8 @@ class BeyondClient(BeyondClientBase):
         :type ctx: discord.ext.commands.Context
         :param user_id: The Discord user ID.
         :type user_id: int
+        :param dict l2_user_entitlements: The user's entitlements from redis (None if they were not there), if they were
+                                     already fetched.
         :rtype: ddb.entitlements.UserEntitlements
         """
         # L1: Memory
@@ -158,8 +179,8 @@ class BeyondClient(BeyondClientBase):
             return l1_user_entitlements if l1_user_entitlements is not USER_ENTITLEMENTS_NONE_SENTINEL else None
 
         # L2: Redis
-        user_entitlement_cache_key = f"entitlements.user.{user_id}"
-        l2_user_entitlements = await ctx.bot.rdb.jget(user_entitlement_cache_key)
+        if l2_user_entitlements is L2_NOT_FETCHED_SENTINEL:
+            l2_user_entitlements = await ctx.bot.rdb.get_object(user_entitlement_cache_key(user_id))
         if l2_user_entitlements is not None:
             log.debug("found user entitlements in l2 (redis) cache")
             return entitlements.UserEntitlements.from_dict(l2_user_entitlements)
@@ -180,15 +201,17 @@ class BeyondClient(BeyondClientBase):
         user_e10s = await self._fetch_user_entitlements(int(user.user_id))
         # cache entitlements
         USER_ENTITLEMENT_CACHE[user_id] = user_e10s
-        await ctx.bot.rdb.jsetex(user_entitlement_cache_key, user_e10s.to_dict(), USER_ENTITLEMENT_TTL)
+        await ctx.bot.rdb.set_object(user_entitlement_cache_key(user_id), user_e10s.to_dict(), ex=USER_ENTITLEMENT_TTL)
         return user_e10s
 
-    async def _get_entity_entitlements(self, ctx, entity_type):
+    async def _get_entity_entitlements(self, ctx, entity_type, l2_entity_entitlements=L2_NOT_FETCHED_SENTINEL):
         """
         Gets the latest entity entitlements, from cache or by communicating with DDB.
 
         :type ctx: discord.ext.commands.Context
         :type entity_type: str
+        :param list l2_entity_entitlements: The entity entitlements from redis (None if they were not there), if they were
+                                       already fetched.
         :rtype: list[ddb.entitlements.EntityEntitlements]
         """
         # L1: Memory
@@ -198,8 +221,8 @@ class BeyondClient(BeyondClientBase):
             return l1_entity_entitlements
 
         # L2: Redis
-        entity_entitlement_cache_key = f"entitlements.entity.{entity_type}"
-        l2_entity_entitlements = await ctx.bot.rdb.jget(entity_entitlement_cache_key)
+        if l2_entity_entitlements is L2_NOT_FETCHED_SENTINEL:
+            l2_entity_entitlements = await ctx.bot.rdb.get_object(entity_entitlement_cache_key(entity_type))
         if l2_entity_entitlements is not None:
             log.debug("found entity entitlements in l2 (redis) cache")
             return [entitlements.EntityEntitlements.from_dict(e) for e in l2_entity_entitlements]
@@ -209,8 +232,8 @@ class BeyondClient(BeyondClientBase):
 
         # cache entitlements
         ENTITY_ENTITLEMENT_CACHE[entity_type] = entity_e10s
-        await ctx.bot.rdb.jsetex(
-            entity_entitlement_cache_key, [e.to_dict() for e in entity_e10s], ENTITY_ENTITLEMENT_TTL
+        await ctx.bot.rdb.set_object(
+            entity_entitlement_cache_key(entity_type), [e.to_dict() for e in entity_e10s], ex=ENTITY_ENTITLEMENT_TTL
         )
         return entity_e10s
 
@@ -10,6 +10,7 @@ import ddb
 from ddb.baseclient import BaseClient
 from ddb.gamelog.constants import AVRAE_EVENT_SOURCE, GAME_LOG_PUBSUB_CHANNEL
 from ddb.gamelog.context import GameLogEventContext
+from ddb.gamelog.dispatcher import GameLogDispatcher
 from ddb.gamelog.errors import CampaignAlreadyLinked, CampaignLinkException, IgnoreEvent, LinkNotAllowed, NoCampaignLink
 from ddb.gamelog.event import GameLogEvent
 from ddb.gamelog.link import CampaignLink
@@ -18,6 +19,10 @@ from utils.config import DDB_GAMELOG_ENDPOINT
 
 log = logging.getLogger(__name__)
 
+# analytics events are buffered and inserted together, when this many are waiting or every ANALYTICS_FLUSH_INTERVAL
+ANALYTICS_BATCH_SIZE = 100
+ANALYTICS_FLUSH_INTERVAL = 10
+
 
 class GameLogClient(BaseClient):
     SERVICE_BASE = DDB_GAMELOG_ENDPOINT
@@ -33,11 +38,17 @@ class GameLogClient(BaseClient):
         self.rdb = bot.rdb
         self.loop = bot.loop
         self._event_handlers = {}
+        self.dispatcher = GameLogDispatcher(self._recv)
+        self._analytics_buffer = []
 
     def init(self):
+        self.dispatcher.start(self.loop)
         self.loop.create_task(self.main_loop())
+        self.loop.create_task(self._analytics_flush_loop())
 
     async def close(self):
+        await self.dispatcher.close()
+        await self.flush_analytics()
         await self.http.close()
 
     # ==== campaign helpers ====
@@ -74,6 +85,7 @@ class GameLogClient(BaseClient):
                 await self.bot.mdb.gamelog_campaigns.replace_one({"campaign_id": campaign_id}, link.to_dict())
             else:
                 raise CampaignAlreadyLinked()
+        await CampaignLink.publish_changed(self.rdb, campaign_id)
         return link
 
     # ==== http ====
@@ -107,13 +119,14 @@ class GameLogClient(BaseClient):
             log.info(f"Connected to pubsub channel: {GAME_LOG_PUBSUB_CHANNEL}.")
             async for msg in channel.iter(encoding="utf-8"):
                 try:
-                    await self._recv(msg)
+                    self._dispatch(msg)
                 except Exception as e:
                     log.error(str(e))
             log.warning("Disconnected from Redis pubsub! Waiting to reconnect...")
             await asyncio.sleep(5)
 
-    async def _recv(self, msg):
+    def _dispatch(self, msg):
+        """Deserializes a message and, if it is an event we might handle, queues it to be handled by _recv."""
         log.debug(f"Received message: {msg}")
         # deserialize message into event
         event = GameLogEvent.from_gamelog_message(msg)
@@ -128,6 +141,19 @@ class GameLogClient(BaseClient):
             log.debug(f"No callback registered for event {event.event_type!r} - discarding event")
             return
 
+        self.dispatcher.dispatch(event.game_id, event)
+
+    async def _recv(self, event):
+        """
+        Handles a game log event. Called by the dispatcher, after any earlier events in the same campaign.
+
+        :type event: GameLogEvent
+        """
+        # check: is the callback still registered?
+        if event.event_type not in self._event_handlers:
+            log.debug(f"No callback registered for event {event.event_type!r} - discarding event")
+            return
+
         # check: is this campaign linked to a channel?
         try:
             campaign = await CampaignLink.from_id(self.bot.mdb, event.game_id)
@@ -175,8 +201,9 @@ class GameLogClient(BaseClient):
         """
         Called for each event that is successfully processed. Logs the event type, ddb user, ddb campaign,
         discord user id, discord guild id, discord channel id, event id, and timestamp.
+        The event is buffered and written with others by flush_analytics().
         """
-        await self.bot.mdb.analytics_gamelog_events.insert_one(
+        self._analytics_buffer.append(
             {
                 "event_type": gctx.event.event_type,
                 "ddb_user": gctx.event.user_id,
@@ -188,6 +215,23 @@ class GameLogClient(BaseClient):
                 "timestamp": datetime.datetime.now(),
             }
         )
+        if len(self._analytics_buffer) >= ANALYTICS_BATCH_SIZE:
+            await self.flush_analytics()
+
+    async def flush_analytics(self):
+        """Writes all buffered analytics events to the database."""
+        if not self._analytics_buffer:
+            return
+        to_write, self._analytics_buffer = self._analytics_buffer, []
+        try:
+            await self.bot.mdb.analytics_gamelog_events.insert_many(to_write, ordered=False)
+        except Exception as e:
+            log.warning(f"Could not write {len(to_write)} gamelog analytics events: {e}")
+
+    async def _analytics_flush_loop(self):
+        while True:
+            await asyncio.sleep(ANALYTICS_FLUSH_INTERVAL)
+            await self.flush_analytics()
 
     # ==== game log callback registration ====
     def register_callback(self, event_type, handler):
@@ -0,0 +1,93 @@
+import asyncio
+import collections
+import logging
+
+log = logging.getLogger(__name__)
+
+# the number of worker tasks handling events concurrently
+DISPATCH_WORKERS = 16
+# the number of events each worker can have waiting before new events for it are dropped
+DISPATCH_QUEUE_SIZE = 100
+# how long a single event can take to be handled before it is abandoned, in seconds
+DISPATCH_HANDLER_TIMEOUT = 30
+
+
+class GameLogDispatcher:
+    """
+    Fans game log events out to a fixed set of worker tasks, so one slow event doesn't hold up every campaign.
+
+    Events are partitioned by campaign: all events of one campaign go to the same worker and are handled in the order
+    they were received. Each worker's queue is bounded; when it is full, new events for it are dropped rather than
+    blocking the reader.
+    """
+
+    def __init__(
+        self,
+        handler,
+        num_workers=DISPATCH_WORKERS,
+        queue_size=DISPATCH_QUEUE_SIZE,
+        timeout=DISPATCH_HANDLER_TIMEOUT,
+    ):
+        """
+        :param handler: The coroutine function to call with each event.
+        """
+        self.handler = handler
+        self.timeout = timeout
+        self.stats = collections.Counter()  # dispatched, dropped, handled, timed_out, errored
+        self._queues = [asyncio.Queue(maxsize=queue_size) for _ in range(num_workers)]
+        self._workers = []
+
+    def start(self, loop=None):
+        """
+        Starts the workers on the given loop (the current event loop by default). The loop does not need to be running
+        yet, so the dispatcher can be started before the bot is.
+        """
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        if not self._workers:
+            self._workers = [loop.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def dispatch(self, campaign_id, event):
+        """
+        Queues an event to be handled after any earlier events of the same campaign.
+
+        :returns: Whether the event was queued (False if it was dropped).
+        """
+        queue = self._queues[hash(campaign_id) % len(self._queues)]
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            log.warning(f"Game log queue is full - dropping event for campaign {campaign_id}")
+            return False
+        self.stats["dispatched"] += 1
+        return True
+
+    def queue_sizes(self):
+        """Returns the number of events waiting for each worker."""
+        return [queue.qsize() for queue in self._queues]
+
+    async def join(self):
+        """Waits until every queued event has been handled."""
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
+    async def _worker(self, queue):
+        while True:
+            event = await queue.get()
+            try:
+                await asyncio.wait_for(self.handler(event), timeout=self.timeout)
+                self.stats["handled"] += 1
+            except asyncio.TimeoutError:
+                self.stats["timed_out"] += 1
+                log.warning(f"Game log event took longer than {self.timeout}s to handle - abandoning it")
+            except Exception as e:
+                self.stats["errored"] += 1
+                log.error(str(e))
+            finally:
+                queue.task_done()
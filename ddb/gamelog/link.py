@@ -1,7 +1,14 @@
+import cachetools
+
 from ddb.gamelog import errors
+from utils.redisIO import publish_command
 
 
 class CampaignLink:
+    # map: campaign id -> CampaignLink or None if the campaign is not linked
+    # invalidated on all clusters when a link changes
+    _cache = cachetools.TTLCache(maxsize=10000, ttl=3600)
+
     def __init__(
         self, campaign_id: str, campaign_name: str, channel_id: int, guild_id: int, campaign_connector: int, **_
     ):
@@ -14,10 +21,15 @@ class CampaignLink:
     # ==== constructors ====
     @classmethod
     async def from_id(cls, mdb, the_id):
-        campaign_dict = await mdb.gamelog_campaigns.find_one({"campaign_id": the_id})
-        if campaign_dict is None:
+        try:
+            link = cls._cache[the_id]
+        except KeyError:
+            campaign_dict = await mdb.gamelog_campaigns.find_one({"campaign_id": the_id})
+            link = cls.from_dict(campaign_dict) if campaign_dict is not None else None
+            cls._cache[the_id] = link
+        if link is None:
             raise errors.NoCampaignLink()
-        return cls.from_dict(campaign_dict)
+        return link
 
     @classmethod
     def from_dict(cls, d):
@@ -39,5 +51,21 @@ class CampaignLink:
             cls.from_dict(link) async for link in ctx.bot.mdb.gamelog_campaigns.find({"channel_id": ctx.channel.id})
         ]
 
-    async def delete(self, mdb):
+    async def delete(self, mdb, rdb=None):
         await mdb.gamelog_campaigns.delete_one({"campaign_id": self.campaign_id, "channel_id": self.channel_id})
+        if rdb is not None:
+            await self.publish_changed(rdb, self.campaign_id)
+        else:
+            self.invalidate(self.campaign_id)
+
+    # ==== cache ====
+    @classmethod
+    def invalidate(cls, campaign_id: str):
+        """Forgets the cached link of a campaign in this process."""
+        cls._cache.pop(campaign_id, None)
+
+    @classmethod
+    async def publish_changed(cls, rdb, campaign_id: str):
+        """Forgets the cached link of a campaign on all clusters."""
+        cls.invalidate(campaign_id)
+        await publish_command(rdb, "invalidate_campaign_link", [campaign_id])
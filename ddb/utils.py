@@ -1,6 +1,11 @@
+import cachetools
 from pydantic import BaseModel
 
 from utils.functions import get_guild_member, user_from_id
+from utils.redisIO import publish_command
+
+# map: ddb user id -> discord user id or None; invalidated on all clusters when the mapping changes
+_user_map_cache = cachetools.TTLCache(maxsize=50000, ttl=3600)
 
 
 async def update_user_map(ctx, ddb_id, discord_id):
@@ -15,11 +20,34 @@ async def update_user_map(ctx, ddb_id, discord_id):
         await ctx.bot.mdb.ddb_account_map.update_one(
             {"ddb_id": ddb_id}, {"$set": {"discord_id": discord_id}}, upsert=True
         )
+        await publish_user_map_changed(ctx.bot.rdb, ddb_id)
     elif existing_mapping["ddb_id"] != ddb_id:
         await ctx.bot.mdb.ddb_account_map.delete_one({"discord_id": discord_id})
         await ctx.bot.mdb.ddb_account_map.update_one(
             {"ddb_id": ddb_id}, {"$set": {"discord_id": discord_id}}, upsert=True
         )
+        await publish_user_map_changed(ctx.bot.rdb, existing_mapping["ddb_id"], ddb_id)
+
+
+async def delete_user_map(ctx, discord_id):
+    """
+    Removes the mapping of a Discord user ID to a DDB user ID, if there is one.
+    """
+    existing_mapping = await ctx.bot.mdb.ddb_account_map.find_one_and_delete({"discord_id": discord_id})
+    if existing_mapping is not None:
+        await publish_user_map_changed(ctx.bot.rdb, existing_mapping["ddb_id"])
+
+
+def invalidate_user_map(*ddb_ids):
+    """Forgets the cached Discord user IDs of the given DDB users in this process."""
+    for ddb_id in ddb_ids:
+        _user_map_cache.pop(ddb_id, None)
+
+
+async def publish_user_map_changed(rdb, *ddb_ids):
+    """Forgets the cached Discord user IDs of the given DDB users on all clusters."""
+    invalidate_user_map(*ddb_ids)
+    await publish_command(rdb, "invalidate_ddb_user_map", list(ddb_ids))
 
 
 async def ddb_id_to_discord_id(mdb, ddb_user_id):
@@ -29,10 +57,15 @@ async def ddb_id_to_discord_id(mdb, ddb_user_id):
     :rtype: int or None
     """
     # this mapping is updated in ddb.client.get_ddb_user()
+    try:
+        return _user_map_cache[ddb_user_id]
+    except KeyError:
+        pass
+
     result = await mdb.ddb_account_map.find_one({"ddb_id": ddb_user_id})
-    if result is not None:
-        return result["discord_id"]
-    return None
+    discord_id = result["discord_id"] if result is not None else None
+    _user_map_cache[ddb_user_id] = discord_id
+    return discord_id
 
 
 async def ddb_id_to_discord_user(ctx, ddb_user_id, guild=None):
@@ -1,6 +1,7 @@
 import asyncio
 import collections
 import copy
+import hashlib
 import json
 import logging
 import os
@@ -18,6 +19,7 @@ from gamedata.monster import Monster
 from gamedata.race import Race, RaceFeature, SubRace
 from gamedata.shared import Sourced
 from utils import config
+from utils.executors import run_in_executor
 
 log = logging.getLogger(__name__)
 T = TypeVar("T")
@@ -70,6 +72,8 @@ class Compendium:
         self._actions_by_uid = {}  # {uuid: Action}
         self._actions_by_eid = collections.defaultdict(lambda: [])  # {(tid, eid): [Action]}
         self._epoch = 0
+        self._reload_seq = 0  # odd while load_common() is rebuilding the gamedata, see reload_seq
+        self._content_hash = None
 
         self._base_path = os.path.relpath("res")
 
@@ -85,14 +89,12 @@ class Compendium:
     async def reload(self, mdb=None):
         log.info("Reloading data")
 
-        loop = asyncio.get_event_loop()
-
         if mdb is None:
-            await loop.run_in_executor(None, self.load_all_json)
+            await run_in_executor("compendium", self.load_all_json)
         else:
             await self.load_all_mongodb(mdb)
 
-        await loop.run_in_executor(None, self.load_common)
+        await run_in_executor("compendium", self.load_common)
         log.info(f"Done loading data - {len(self._entity_lookup)} lookups registered")
 
     def load_all_json(self, base_path=None):
@@ -132,6 +134,13 @@ class Compendium:
 
     # noinspection DuplicatedCode
     def load_common(self):
+        self._reload_seq += 1
+        try:
+            self._load_common()
+        finally:
+            self._reload_seq += 1
+
+    def _load_common(self):
         self._entity_lookup = {}
         self._book_lookup = {}
 
@@ -156,6 +165,27 @@ class Compendium:
 
         # increase epoch for any dependents
         self._epoch += 1
+        self._content_hash = self._get_content_hash()
+
+    def _get_content_hash(self):
+        """
+        Returns a hash of the gamedata that characters are matched against when they are imported. Unlike the epoch,
+        it is the same across processes and only changes when the data does.
+        """
+        h = hashlib.sha256()
+        # monsters, names, and rule references are never used by a character
+        for raw in (
+            self.raw_backgrounds,
+            self.raw_classes,
+            self.raw_feats,
+            self.raw_items,
+            self.raw_races,
+            self.raw_subraces,
+            self.raw_spells,
+            self.raw_actions,
+        ):
+            h.update(json.dumps(raw, sort_keys=True, default=str).encode())
+        return h.hexdigest()
 
     def _load_subclasses(self):
         self.subclasses = []
@@ -339,5 +369,22 @@ class Compendium:
         """
         return self._epoch
 
+    @property
+    def reload_seq(self):
+        """
+        Returns an integer that is odd while the gamedata is being rebuilt, and changes every time it is. Code that reads
+        the gamedata from another thread than the one reloading it can use this to tell whether it read a consistent
+        copy (see cogs5e.sheets.utils.ParseScheduler).
+        """
+        return self._reload_seq
+
+    @property
+    def content_hash(self):
+        """
+        Returns a hash of the gamedata characters are imported against (see :meth:`_get_content_hash`), or None if the
+        gamedata has not been loaded.
+        """
+        return self._content_hash
+
 
 compendium = Compendium()
@@ -0,0 +1,42 @@
+"""
+Benchmarks the inline rolling pipeline (expression extraction, parsing, and rolling) in messages per second.
+Does not touch the network or databases, so character-aware (c:/s:) expressions are not benchmarked.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# path hack to import from parent folder
+sys.path.insert(1, os.path.join(sys.path[0], ".."))
+
+from cogs5e.dice.inline import InlineRoller  # noqa: E402
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-n", type=int, default=20000, help="The number of messages to roll.")
+
+MESSAGES = [
+    "I attack the goblin with my shortsword [[1d20 + 6]] for a total of [[1d6 + 3]] piercing damage.",
+    "[[1d20]]",
+    "Sneak attack! [[1d20+7 adv]] to hit, [[1d6+4 + 3d6]] damage [[1d4 extra fire]]",
+    "The party makes their way down the corridor, torches flickering. Perception: [[1d20+3]], Stealth: [[1d20-1 dis]]",
+    "Fireball! Everyone make a save. [[8d6]] fire damage, half on a success.",
+]
+
+
+async def main(n):
+    roller = InlineRoller(bot=None)
+    messages = [SimpleNamespace(content=content, guild=None, author=None) for content in MESSAGES]
+
+    start = time.perf_counter()
+    for i in range(n):
+        await roller.roll_message(messages[i % len(messages)])
+    elapsed = time.perf_counter() - start
+    print(f"Rolled {n} messages in {elapsed:.2f}s ({n / elapsed:.0f} messages/s)")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    asyncio.run(main(args.n))
@@ -0,0 +1,48 @@
+import math
+import random
+
+import d20
+import pytest
+
+from cogs5e.exploration.encounter import Encounter
+from cogs5e.exploration.explore import Explore
+
+
+def advance_stepwise(enctimer, encthreshold, num_rounds):
+    """Advances an encounter timer one round at a time, the way skipping rounds used to."""
+    checks = 0
+    for _ in range(num_rounds):
+        enctimer -= 1
+        if enctimer <= 0:
+            checks += 1
+            enctimer = encthreshold
+    return enctimer, checks
+
+
+@pytest.mark.parametrize("encthreshold", [1, 2, 3, 10, 60])
+@pytest.mark.parametrize("enctimer", [1, 2, 7, 10])
+@pytest.mark.parametrize("num_rounds", [0, 1, 5, 9, 10, 11, 600, 4800])
+def test_advance_enctimer(enctimer, encthreshold, num_rounds):
+    exploration = Explore("1", 0, "1", {}, None, enctimer=enctimer, encthreshold=encthreshold)
+    checks = exploration._advance_enctimer(num_rounds)
+    assert (exploration._enctimer, checks) == advance_stepwise(enctimer, encthreshold, num_rounds)
+
+
+def test_roll_encounters_distribution():
+    random.seed(123)
+    encounter = Encounter(
+        "1", "test", True, name="Test", num_appear=[None] * 4, encounter_values=list("abcd"), dice_expression="1d4"
+    )
+    number, chance = 10000, 30
+    # each check succeeds on a d100 roll under the chance
+    p = (chance - 1) / 100
+    expected, tolerance = number * p, 5 * math.sqrt(number * p * (1 - p))
+
+    rolled = encounter.roll_encounters(number, chance)
+    # the encounter checks used to be rolled one at a time
+    rolled_per_check = sum(1 for _ in range(number) if d20.roll("1d100").total < chance)
+
+    assert abs(len(rolled) - expected) < tolerance
+    assert abs(rolled_per_check - expected) < tolerance
+    assert {value for value, _, _ in rolled} == set("abcd")
+    assert all(value == "abcd"[index - 1] for value, _, index in rolled)
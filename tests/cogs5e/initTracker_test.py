@@ -1,6 +1,10 @@
+import asyncio
+from types import SimpleNamespace
+
 import discord
 import pytest
 
+from cogs5e.initiative import Combat, CombatBusy, CombatVersionConflict
 from cogs5e.models.sheet.resistance import Resistance
 from gamedata.compendium import compendium
 from tests.conftest import end_init, start_init
@@ -321,6 +325,45 @@ async def test_assign_groups(avrae, dhttp):
         await dhttp.drain()
 
 
+@pytest.mark.usefixtures("init_fixture")
+async def test_combat_version_conflict(avrae, dhttp):
+    await start_init(avrae, dhttp)
+    combat = await active_combat(avrae)
+    # simulate another process writing to the combat
+    await avrae.mdb.combats.update_one({"channel": combat.channel}, {"$inc": {"version": 1}})
+    with pytest.raises(CombatVersionConflict):
+        await combat.commit()
+    # the stale combat should be dropped from memory and reloaded from the db
+    assert (await active_combat(avrae)) is not combat
+    await end_init(avrae, dhttp)
+
+
+@pytest.mark.usefixtures("init_fixture")
+async def test_debounced_summary_update(avrae, dhttp, monkeypatch, caplog):
+    monkeypatch.setattr("cogs5e.initiative.combat.SUMMARY_EDIT_DEBOUNCE", 0.05)
+    await start_init(avrae, dhttp)
+    combat = await active_combat(avrae)
+
+    # updates in quick succession are coalesced into a single edit
+    await combat.update_summary()
+    await combat.update_summary()
+    await dhttp.receive_edit(r"```md\nCurrent initiative: 0 \(round 0\)[\s\S]*```")
+    await asyncio.sleep(0.1)
+    assert dhttp.queue_empty()
+
+    # errors in the background edit are logged rather than lost
+    def get_summary_msg():
+        raise ValueError("oops")
+
+    monkeypatch.setattr(combat, "get_summary_msg", get_summary_msg)
+    await combat.update_summary()
+    await asyncio.sleep(0.1)
+    assert "Failed to update summary" in caplog.text
+
+    monkeypatch.undo()
+    await end_init(avrae, dhttp)
+
+
 @pytest.mark.usefixtures("init_fixture")
 async def test_commands_nlp_recording(avrae, dhttp):
     async with server_settings(avrae, upenn_nlp_opt_in=True):
@@ -328,3 +371,19 @@ async def test_commands_nlp_recording(avrae, dhttp):
             avrae.message(command)
             await dhttp.drain()
         await end_init(avrae, dhttp)
+
+
+async def test_combat_lock_timeout():
+    channel = SimpleNamespace(id=12345)
+    holder = SimpleNamespace(channel=channel, combat_lock=None)
+    waiter = SimpleNamespace(channel=channel, combat_lock=None)
+    assert await Combat.acquire_lock(holder)
+    try:
+        # scripts give up instead of waiting for as long as the other command holds the combat
+        with pytest.raises(CombatBusy):
+            await Combat.acquire_lock(waiter, timeout=0.05)
+        assert waiter.combat_lock is None
+    finally:
+        Combat.release_lock(holder)
+    assert await Combat.acquire_lock(waiter, timeout=0.05)
+    Combat.release_lock(waiter)
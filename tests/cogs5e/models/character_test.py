@@ -0,0 +1,34 @@
+from cogs5e.models.character import _diff_paths
+
+
+def test_diff_paths_equal():
+    assert _diff_paths({"a": [1, {"b": 2}]}, {"a": [1, {"b": 2}]}, "cvars") == {}
+
+
+def test_diff_paths_nested_dict():
+    old = {"a": 1, "b": {"c": 2, "d": 3}}
+    new = {"a": 1, "b": {"c": 2, "d": 4}}
+    assert _diff_paths(old, new, "cvars") == {"cvars.b.d": 4}
+
+
+def test_diff_paths_same_length_list():
+    old = [{"value": 1}, {"value": 2}, {"value": 3}]
+    new = [{"value": 1}, {"value": 5}, {"value": 3}]
+    assert _diff_paths(old, new, "consumables") == {"consumables.1.value": 5}
+
+
+def test_diff_paths_replaced_wholesale():
+    # lists of a different length
+    assert _diff_paths([1, 2], [1, 2, 3], "consumables") == {"consumables": [1, 2, 3]}
+    # dicts with different keys
+    assert _diff_paths({"a": 1}, {"a": 1, "b": 2}, "cvars") == {"cvars": {"a": 1, "b": 2}}
+    # values of a different type
+    assert _diff_paths(None, {"a": 1}, "death_saves") == {"death_saves": {"a": 1}}
+    assert _diff_paths({"x": [1]}, {"x": 1}, "coinpurse") == {"coinpurse.x": 1}
+
+
+def test_diff_paths_invalid_keys():
+    # keys that can't be used in a dotted path are written as part of their parent
+    assert _diff_paths({"a.b": 1, "c": 1}, {"a.b": 2, "c": 1}, "cvars") == {"cvars": {"a.b": 2, "c": 1}}
+    assert _diff_paths({"$a": 1}, {"$a": 2}, "cvars") == {"cvars": {"$a": 2}}
+    assert _diff_paths({"x": {"": 1}}, {"x": {"": 2}}, "cvars") == {"cvars.x": {"": 2}}
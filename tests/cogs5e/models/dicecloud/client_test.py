@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+
+from cogs5e.models.dicecloud.client import DicecloudClient
+from cogs5e.models.dicecloud.errors import LoginFailure
+
+pytestmark = pytest.mark.asyncio
+
+FAKE_USER_ID = "fakeuserid"
+
+
+class FakeDDPServer:
+    """A tiny local DDP server that accepts connections and logs in one user."""
+
+    def __init__(self, username="avrae", login_delay=0):
+        self.username = username
+        self.login_delay = login_delay
+        self.num_connections = 0
+        self.num_logins = 0
+        self._runner = None
+        self.url = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/websocket", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"ws://127.0.0.1:{port}/websocket"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.num_connections += 1
+        async for msg in ws:
+            data = json.loads(msg.data)
+            if data["msg"] == "connect":
+                await ws.send_str(json.dumps({"msg": "connected", "session": "fakesession"}))
+            elif data["msg"] == "ping":
+                await ws.send_str(json.dumps({"msg": "pong", "id": data.get("id")}))
+            elif data["msg"] == "method" and data["method"] == "login":
+                await asyncio.sleep(self.login_delay)
+                if data["params"][0]["user"]["username"] == self.username:
+                    self.num_logins += 1
+                    result = {"msg": "result", "id": data["id"], "result": {"id": FAKE_USER_ID, "token": "faketoken"}}
+                else:
+                    result = {"msg": "result", "id": data["id"], "error": {"error": 403, "reason": "User not found"}}
+                await ws.send_str(json.dumps(result))
+                await ws.send_str(json.dumps({"msg": "updated", "methods": [data["id"]]}))
+        return ws
+
+
+@pytest.fixture
+async def ddp_server():
+    server = FakeDDPServer(login_delay=0.2)
+    await server.start()
+    yield server
+    await server.stop()
+
+
+async def test_client_ready_without_blocking(ddp_server):
+    client = DicecloudClient(socket_base=ddp_server.url, username="avrae", password=b"password")
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker_task = asyncio.create_task(ticker())
+    try:
+        await client.ensure_connected()
+    finally:
+        ticker_task.cancel()
+        client.meteor_client.close()
+
+    assert client.logged_in
+    assert client.user_id == FAKE_USER_ID
+    assert ticks > 5  # the event loop kept running while we logged in
+
+
+async def test_client_connection_reused(ddp_server):
+    client = DicecloudClient(socket_base=ddp_server.url, username="avrae", password=b"password")
+    try:
+        await asyncio.gather(*(client.ensure_connected() for _ in range(5)))
+        await client.ensure_connected()
+    finally:
+        client.meteor_client.close()
+
+    assert ddp_server.num_connections == 1
+    assert ddp_server.num_logins == 1
+
+
+async def test_client_login_failure(ddp_server):
+    client = DicecloudClient(socket_base=ddp_server.url, username="someone else", password=b"password")
+    try:
+        with pytest.raises(LoginFailure):
+            await client.ensure_connected()
+    finally:
+        client.meteor_client.close()
+
+    assert not client.logged_in
+
+
+async def test_client_connection_failure():
+    # nothing is listening on this port
+    client = DicecloudClient(socket_base="ws://127.0.0.1:1/websocket", username="avrae", password=b"password")
+    try:
+        with pytest.raises(LoginFailure):
+            await client.ensure_connected()
+    finally:
+        await client.close()
+
+    assert not client.logged_in
+    assert not client._ready_waiters
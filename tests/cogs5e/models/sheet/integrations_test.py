@@ -0,0 +1,127 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from cogs5e.models.sheet import integrations
+from cogs5e.models.sheet.integrations import LiveIntegration
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeCharacterService:
+    """Records the resources synced to it, and fails the first *failures* requests."""
+
+    def __init__(self, failures=0):
+        self.requests = []
+        self.failures = failures
+
+    async def put(self, resource, value):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("character service unavailable")
+        self.requests.append((resource, value))
+
+
+class FakeIntegration(LiveIntegration):
+    def __init__(self, character, service):
+        super().__init__(character)
+        self.service = service
+
+    async def _do_sync_hp(self):
+        await self.service.put("hp", self.character.hp)
+
+    async def _do_sync_coins(self):
+        await self.service.put("coins", self.character.gp)
+
+    async def _do_sync_slots(self):
+        await self.service.put("slots", self.character.slots)
+
+    async def _do_sync_consumable(self, consumable):
+        await self.service.put(consumable.live_id, consumable.value)
+
+    async def _do_sync_death_saves(self):
+        await self.service.put("death_saves", 0)
+
+
+@pytest.fixture(autouse=True)
+def fast_sync(monkeypatch):
+    monkeypatch.setattr(integrations, "SYNC_DEBOUNCE", 0.05)
+    monkeypatch.setattr(integrations, "SYNC_MIN_INTERVAL", 0.2)
+    monkeypatch.setattr(integrations, "SYNC_RETRY_BACKOFF", 0.01)
+    LiveIntegration._last_synced.clear()
+
+
+def make_character(upstream="fake-1"):
+    cc = SimpleNamespace(live_id="cc-1", value=3)
+    return SimpleNamespace(upstream=upstream, hp=10, gp=0, slots=2, consumables=[cc])
+
+
+async def wait_for_sync(key):
+    while (queue := LiveIntegration._sync_queues.get(key)) is not None:
+        await queue._task
+
+
+async def test_sync_coalesces_changes():
+    service = FakeCharacterService()
+    character = make_character()
+    integration = FakeIntegration(character, service)
+
+    for hp in (9, 8, 7):
+        character.hp = hp
+        integration.sync_hp()
+        integration.commit_soon(None)
+    character.consumables[0].value = 2
+    integration.sync_consumable(character.consumables[0])
+    integration.commit_soon(None)
+    await wait_for_sync(character.upstream)
+
+    assert sorted(service.requests) == [("cc-1", 2), ("hp", 7)]
+
+
+async def test_sync_uses_latest_character():
+    service = FakeCharacterService()
+    old_character = make_character()
+    old_integration = FakeIntegration(old_character, service)
+    old_integration.sync_slots()
+    old_integration.commit_soon(None)
+
+    # the character is reloaded before the sync goes out
+    new_character = make_character()
+    new_character.slots = 0
+    new_integration = FakeIntegration(new_character, service)
+    new_integration.sync_hp()
+    new_integration.commit_soon(None)
+    await wait_for_sync(new_character.upstream)
+
+    assert sorted(service.requests) == [("hp", 10), ("slots", 0)]
+
+
+async def test_sync_rate_limit():
+    service = FakeCharacterService()
+    character = make_character()
+    integration = FakeIntegration(character, service)
+
+    integration.sync_hp()
+    integration.commit_soon(None)
+    await wait_for_sync(character.upstream)
+
+    start = asyncio.get_running_loop().time()
+    integration.sync_hp()
+    integration.commit_soon(None)
+    await wait_for_sync(character.upstream)
+
+    assert asyncio.get_running_loop().time() - start >= integrations.SYNC_MIN_INTERVAL - 0.05
+    assert service.requests == [("hp", 10), ("hp", 10)]
+
+
+async def test_sync_retries():
+    service = FakeCharacterService(failures=2)
+    character = make_character()
+    integration = FakeIntegration(character, service)
+
+    integration.sync_hp()
+    integration.commit_soon(None)
+    await wait_for_sync(character.upstream)
+
+    assert service.requests == [("hp", 10)]
@@ -0,0 +1,27 @@
+from cogs5e.sheets.beyond import BeyondSheetParser
+from gamedata.compendium import compendium
+from utils.argparser import argparse
+
+
+def import_hash(args="", is_live=False, raw_character=b'{"id": 1}'):
+    parser = BeyondSheetParser("1")
+    parser.args = argparse(args)
+    parser._is_live = is_live
+    return parser._get_import_hash(raw_character)
+
+
+def test_import_hash():
+    base = import_hash()
+    assert import_hash() == base
+    # anything that changes the parsed character changes the hash
+    assert import_hash(raw_character=b'{"id": 2}') != base
+    assert import_hash(is_live=True) != base
+    assert import_hash("-nocc") != base
+    assert import_hash("-noprep") != base
+    assert import_hash("-nocc -noprep") not in (base, import_hash("-nocc"), import_hash("-noprep"))
+
+
+def test_import_hash_compendium(monkeypatch):
+    base = import_hash()
+    monkeypatch.setattr(compendium, "_content_hash", "something else")
+    assert import_hash() != base
@@ -0,0 +1,130 @@
+import pytest
+
+from cogs5e.models.character import Character
+from cogs5e.models.errors import ExternalImportError
+from cogs5e.sheets.abc import SheetLoaderABC
+from cogs5e.sheets.refresh import CharacterRefreshJob
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeLoader(SheetLoaderABC):
+    """Re-imports a character as a copy of itself with some changes, instead of loading it from upstream."""
+
+    def __init__(self, character, changes):
+        super().__init__(character.upstream)
+        self.character = character
+        self.changes = changes
+
+    async def load_character(self, ctx, args):
+        data = self.character.to_dict()
+        data.update(self.changes)
+        return Character.from_dict(data)
+
+
+@pytest.fixture
+async def clean_refresh(avrae):
+    sheet_type = "dicecloud"
+    keys = (
+        CharacterRefreshJob.progress_key(sheet_type),
+        CharacterRefreshJob.paused_key(sheet_type),
+        CharacterRefreshJob.lock_key(sheet_type),
+    )
+    await avrae.rdb.delete(*keys)
+    yield
+    await avrae.rdb.delete(*keys)
+
+
+@pytest.mark.usefixtures("character", "clean_refresh")
+class TestCharacterRefresh:
+    async def test_refresh_changed(self, avrae):
+        char = self.character
+        job = CharacterRefreshJob(avrae, char.sheet_type, loader=lambda c: FakeLoader(c, {"name": "Refreshed"}))
+        progress = await job.run()
+        assert progress["state"] == "done"
+        assert progress["refreshed"] == 1
+        assert progress["unchanged"] == 0
+
+        doc = await avrae.mdb.characters.find_one({"owner": char.owner, "upstream": char.upstream})
+        assert doc["name"] == "Refreshed"
+        assert doc["version"] == 1
+
+        # a refresh that changes nothing writes nothing
+        progress = await job.run()
+        assert progress["refreshed"] == 0
+        assert progress["unchanged"] == 1
+        doc = await avrae.mdb.characters.find_one({"owner": char.owner, "upstream": char.upstream})
+        assert doc["version"] == 1
+
+    async def test_refresh_failed(self, avrae):
+        class FailingLoader(FakeLoader):
+            async def load_character(self, ctx, args):
+                raise Exception("upstream is down")
+
+        job = CharacterRefreshJob(avrae, self.character.sheet_type, loader=lambda c: FailingLoader(c, {}))
+        progress = await job.run(restart=True)
+        assert progress["state"] == "done"
+        assert progress["failed"] == 1
+
+    async def test_refresh_pause_resume(self, avrae):
+        char = self.character
+
+        class PausingLoader(FakeLoader):
+            async def load_character(self, ctx, args):
+                await CharacterRefreshJob.pause(ctx.bot.rdb, self.character.sheet_type)
+                return await super().load_character(ctx, args)
+
+        job = CharacterRefreshJob(avrae, char.sheet_type, batch_size=1, loader=lambda c: PausingLoader(c, {}))
+        progress = await job.run(restart=True)
+        assert progress["state"] == "paused"
+        assert progress["seen"] == 1
+        assert (await CharacterRefreshJob.get_progress(avrae.rdb, char.sheet_type))["state"] == "paused"
+
+        # resuming picks up after the last character seen
+        progress = await job.run()
+        assert progress["state"] == "done"
+        assert progress["seen"] == 1
+
+    async def test_refresh_conflict(self, avrae):
+        char = self.character
+
+        class CommittingLoader(FakeLoader):
+            async def load_character(self, ctx, args):
+                # the character is committed elsewhere while we load it
+                await ctx.bot.mdb.characters.update_one(
+                    {"owner": char.owner, "upstream": char.upstream}, {"$inc": {"version": 1}}
+                )
+                return await super().load_character(ctx, args)
+
+        cached = Character.from_dict(char.to_dict())
+        Character._cache[(char.owner, char.upstream)] = cached
+        try:
+            job = CharacterRefreshJob(
+                avrae, char.sheet_type, loader=lambda c: CommittingLoader(c, {"name": "Refreshed"})
+            )
+            progress = await job.run(restart=True)
+            assert progress["refreshed"] == 0
+            assert progress["conflicted"] == 1
+            # the character we did not write is left alone
+            assert Character._cache.get((char.owner, char.upstream)) is cached
+            doc = await avrae.mdb.characters.find_one({"owner": char.owner, "upstream": char.upstream})
+            assert doc["name"] != "Refreshed"
+        finally:
+            Character._cache.pop((char.owner, char.upstream), None)
+
+    async def test_refresh_lock_taken_over(self, avrae):
+        char = self.character
+        lock_key = CharacterRefreshJob.lock_key(char.sheet_type)
+
+        class SlowLoader(FakeLoader):
+            async def load_character(self, ctx, args):
+                # our lock expires and another job takes it while we load the character
+                await ctx.bot.rdb.set(lock_key, "other job")
+                return await super().load_character(ctx, args)
+
+        job = CharacterRefreshJob(avrae, char.sheet_type, loader=lambda c: SlowLoader(c, {}))
+        with pytest.raises(ExternalImportError):
+            await job.run(restart=True)
+        # the other job keeps its lock and its progress
+        assert await avrae.rdb.get(lock_key) == "other job"
+        assert (await CharacterRefreshJob.get_progress(avrae.rdb, char.sheet_type))["seen"] == 0
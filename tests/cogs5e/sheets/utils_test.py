@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+import pytest
+
+from cogs5e.models.errors import ExternalImportError
+from cogs5e.sheets.utils import MAX_QUEUED_PER_USER, ParseScheduler
+from gamedata.compendium import compendium
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_parse_scheduler_runs_off_loop():
+    scheduler = ParseScheduler()
+    thread = await scheduler.run("1", threading.get_ident)
+    assert thread != threading.get_ident()
+
+
+async def test_parse_scheduler_raises():
+    def parse():
+        raise ExternalImportError("bad sheet")
+
+    scheduler = ParseScheduler()
+    with pytest.raises(ExternalImportError):
+        await scheduler.run("1", parse)
+    # the worker is freed after an error
+    assert await scheduler.run("1", lambda: 1) == 1
+
+
+async def test_parse_scheduler_fairness():
+    scheduler = ParseScheduler(max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def parse(name):
+        order.append(name)
+        if name == "a1":
+            started.set()
+            release.wait()
+
+    tasks = [asyncio.ensure_future(scheduler.run("a", parse, "a1"))]
+    await asyncio.get_event_loop().run_in_executor(None, started.wait)
+    tasks.append(asyncio.ensure_future(scheduler.run("a", parse, "a2")))
+    tasks.append(asyncio.ensure_future(scheduler.run("a", parse, "a3")))
+    tasks.append(asyncio.ensure_future(scheduler.run("b", parse, "b1")))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*tasks)
+    # b does not have to wait for all of a's parses
+    assert order == ["a1", "a2", "b1", "a3"]
+
+
+async def test_parse_scheduler_user_limit():
+    scheduler = ParseScheduler(max_workers=1)
+    release = threading.Event()
+
+    tasks = [asyncio.ensure_future(scheduler.run("a", release.wait))]
+    await asyncio.sleep(0)
+    tasks.extend(asyncio.ensure_future(scheduler.run("a", lambda: None)) for _ in range(MAX_QUEUED_PER_USER))
+    await asyncio.sleep(0)
+    with pytest.raises(ExternalImportError):
+        await scheduler.run("a", lambda: None)
+    # other users are unaffected
+    tasks.append(asyncio.ensure_future(scheduler.run("b", lambda: None)))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*tasks)
+
+
+async def test_parse_scheduler_reruns_during_reload(monkeypatch):
+    monkeypatch.setattr(compendium, "_reload_seq", 0)
+    calls = []
+
+    def parse():
+        calls.append(compendium.reload_seq)
+        if len(calls) == 1:  # the compendium is reloaded while the first parse runs
+            compendium._reload_seq += 2
+            raise KeyError("half-loaded lookup")
+        return len(calls)
+
+    scheduler = ParseScheduler()
+    assert await scheduler.run("1", parse) == 2
+    assert calls == [0, 2]
@@ -0,0 +1,119 @@
+import copy
+import json
+
+import pytest
+
+from cogs5e.initiative.upenn_nlp import FileSink, NLPRecorder, RecordedEvent, json_diff
+
+
+class FakeCombat:
+    def __init__(self, combat_id):
+        self.nlp_record_session_id = combat_id
+        self.state = {"round": 0, "combatants": [{"name": "foo", "hp": 10}], "metadata": {}}
+
+    def to_dict(self):
+        return copy.deepcopy(self.state)
+
+    def get_summary(self, private=False):
+        return f"round {self.state['round']}"
+
+
+class FailingSink:
+    def __init__(self):
+        self.fail = True
+        self.received = []
+
+    async def put(self, events):
+        if self.fail:
+            return list(events)
+        self.received.extend(events)
+        return []
+
+
+def apply_patch(doc, patch):
+    """Applies the subset of RFC 6902 that json_diff emits."""
+    doc = copy.deepcopy(doc)
+    for op in patch:
+        *parents, last = [p.replace("~1", "/").replace("~0", "~") for p in op["path"].split("/")[1:]] or [None]
+        if last is None:  # the whole document
+            doc = op["value"]
+            continue
+        target = doc
+        for key in parents:
+            target = target[int(key) if isinstance(target, list) else key]
+        if isinstance(target, list):
+            last = int(last)
+        if op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = op["value"]
+    return doc
+
+
+@pytest.fixture()
+def recorder(avrae, mock_ldclient):
+    NLPRecorder._last_combat_state.clear()
+    with mock_ldclient.flags({"cog.initiative.upenn_nlp.enabled": True}):
+        yield NLPRecorder(avrae)
+    NLPRecorder._last_combat_state.clear()
+
+
+def test_json_diff():
+    old = {"a": 1, "b/c": [1, 2, 3], "d": {"e": "f"}, "g": [1]}
+    new = {"a": 2, "b/c": [1, 5, 3], "d": {}, "g": [1, 2], "h": None}
+    assert apply_patch(old, json_diff(old, new)) == new
+    assert json_diff(new, new) == []
+    assert apply_patch(old, json_diff(old, [1])) == [1]
+
+
+@pytest.mark.asyncio
+async def test_file_sink(recorder, tmp_path):
+    path = tmp_path / "nlp.jsonl"
+    recorder._sink = FileSink(str(path))
+    combat = FakeCombat("combat1")
+
+    await recorder._record_event(RecordedEvent(combat_id="combat1", event_type="combat_start"))
+    await recorder._record_event(recorder._combat_state_event(combat))
+    combat.state["round"] = 1
+    combat.state["combatants"][0]["hp"] = 5
+    await recorder._record_event(recorder._combat_state_event(combat))
+    await recorder.flush()
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [e["event_type"] for e in events] == ["combat_start", "combat_state_update", "combat_state_diff"]
+    # the consumer can rebuild the latest state from the snapshot and diffs
+    assert apply_patch(events[1]["data"], events[2]["patch"]) == combat.state
+    assert events[2]["human_readable"] == "round 1"
+
+
+@pytest.mark.asyncio
+async def test_snapshot_after_failed_delivery(recorder):
+    sink = recorder._sink = FailingSink()
+    combat = FakeCombat("combat1")
+
+    await recorder._record_event(recorder._combat_state_event(combat))
+    await recorder.flush()  # the snapshot is not delivered
+
+    sink.fail = False
+    combat.state["round"] = 1
+    await recorder._record_event(recorder._combat_state_event(combat))
+    await recorder.flush()
+    # so the next state is a full snapshot, not a diff against the state that was lost
+    assert [e.event_type for e in sink.received] == ["combat_state_update"]
+    assert sink.received[0].data == combat.state
+
+
+@pytest.mark.asyncio
+async def test_snapshot_after_flag_disabled(recorder, mock_ldclient):
+    sink = recorder._sink = FailingSink()
+    sink.fail = False
+    combat = FakeCombat("combat1")
+
+    with mock_ldclient.flags({"cog.initiative.upenn_nlp.enabled": False}):
+        await recorder._record_event(recorder._combat_state_event(combat))
+        await recorder.flush()  # dropped
+    assert sink.received == []
+
+    await recorder._record_event(recorder._combat_state_event(combat))
+    await recorder.flush()
+    assert [e.event_type for e in sink.received] == ["combat_state_update"]
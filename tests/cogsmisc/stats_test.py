@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from cogsmisc.stats import StatsAggregator
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.written = []
+        self.fail_indices = None  # None: succeed; empty: fail every write; otherwise fail only these writes
+
+    def _maybe_fail(self, items):
+        if self.fail_indices is None:
+            self.written.extend(items)
+            return
+        if not self.fail_indices:
+            raise ConnectionError("db is down")
+        self.written.extend(item for i, item in enumerate(items) if i not in self.fail_indices)
+        raise BulkWriteError({"writeErrors": [{"index": i, "errmsg": "oops"} for i in self.fail_indices]})
+
+    async def bulk_write(self, ops, ordered=True):
+        self._maybe_fail(ops)
+
+    async def insert_many(self, documents, ordered=True):
+        self._maybe_fail(documents)
+
+
+class FakeMdb:
+    def __init__(self):
+        self.collections = {}
+
+    def __getattr__(self, item):
+        if item not in self.collections:
+            self.collections[item] = FakeCollection(item)
+        return self.collections[item]
+
+
+def fake_ctx(user_id, command_name="roll"):
+    return SimpleNamespace(
+        command=SimpleNamespace(qualified_name=command_name), guild=None, author=SimpleNamespace(id=user_id)
+    )
+
+
+async def test_flush():
+    mdb = FakeMdb()
+    aggregator = StatsAggregator(mdb)
+    aggregator.record_command(fake_ctx(1))
+    aggregator.record_command(fake_ctx(1))
+    aggregator.record_command(fake_ctx(2, "attack"))
+    await aggregator.flush()
+
+    assert len(mdb.analytics_user_activity.written) == 2
+    assert len(mdb.analytics_command_activity.written) == 2
+    assert len(mdb.analytics_command_events.written) == 3
+    assert aggregator.num_buffered_events == 0 and not aggregator.user_activity
+
+
+async def test_failed_flush_keeps_buffers():
+    mdb = FakeMdb()
+    aggregator = StatsAggregator(mdb)
+    aggregator.record_command(fake_ctx(1))
+    aggregator.record_command(fake_ctx(2))
+
+    # the whole write fails
+    mdb.analytics_command_events.fail_indices = set()
+    mdb.random_stats.fail_indices = set()
+    # only the write for user 2 fails
+    mdb.analytics_user_activity.fail_indices = {1}
+    await aggregator.flush()
+
+    assert aggregator.user_activity == {2: 1}
+    assert 2 in aggregator.user_last_command
+    assert aggregator.random_stats["commands_used_life"] == 2
+    assert aggregator.num_buffered_events == 2
+    assert not aggregator.command_activity  # that write went through
+
+    # commands recorded since are merged with what failed, and the next flush writes everything
+    aggregator.record_command(fake_ctx(2))
+    for collection in mdb.collections.values():
+        collection.fail_indices = None
+    await aggregator.flush()
+    assert aggregator.num_buffered_events == 0 and not aggregator.user_activity
+    assert len(mdb.analytics_command_events.written) == 3
+    assert mdb.analytics_user_activity.written[-1]._doc["$inc"] == {"commands_called": 2}
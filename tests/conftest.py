@@ -409,11 +409,13 @@ def character(request, avrae):
     avrae.mdb.characters.delegate.update_one(
         {"owner": char.owner, "upstream": char.upstream}, {"$set": char.to_dict()}, upsert=True
     )
+    Character.invalidate_active(str(char.owner))
     if request.cls is not None:
         request.cls.character = char
     yield char
     avrae.mdb.characters.delegate.delete_one({"owner": char.owner, "upstream": char.upstream})
     Character._cache.clear()
+    Character._active_cache.clear()
 
 
 # ===== Init Fixture/Utils =====
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+import pytest
+
+from ddb.client import BeyondClient
+
+pytestmark = pytest.mark.asyncio
+
+
+class CountingRedis:
+    """Misses every key, and records the commands it is sent."""
+
+    def __init__(self):
+        self.commands = []
+
+    async def mget_objects(self, *keys, default=None):
+        self.commands.append(("mget", keys))
+        return [default] * len(keys)
+
+    async def get_object(self, key, default=None):
+        self.commands.append(("get", key))
+        return default
+
+    async def set_object(self, key, obj, *, ex=0):
+        self.commands.append(("set", key))
+
+
+async def test_entitlements_cold_cache_round_trips():
+    rdb = CountingRedis()
+    ctx = SimpleNamespace(bot=SimpleNamespace(rdb=rdb))
+    client = BeyondClient.__new__(BeyondClient)  # without connecting to anything
+
+    async def get_ddb_user(ctx, user_id=None):
+        return None  # the user has no DDB link
+
+    client.get_ddb_user = get_ddb_user
+    assert await client.get_accessible_entities(ctx, 1234, "test-entity") is None
+    # a miss in the one MGET is not looked up again
+    assert [command for command, _ in rdb.commands] == ["mget"]
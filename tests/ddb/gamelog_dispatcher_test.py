@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from ddb.gamelog.dispatcher import GameLogDispatcher
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_per_campaign_order():
+    handled = []
+
+    async def handler(event):
+        campaign, i = event
+        # later events of a campaign finish faster, so they would overtake earlier ones if run concurrently
+        await asyncio.sleep(0.01 * (3 - i))
+        handled.append(event)
+
+    dispatcher = GameLogDispatcher(handler, num_workers=4)
+    dispatcher.start()
+    try:
+        for i in range(3):
+            for campaign in ("a", "b", "c"):
+                assert dispatcher.dispatch(campaign, (campaign, i))
+        await asyncio.wait_for(dispatcher.join(), 5)
+    finally:
+        await dispatcher.close()
+
+    for campaign in ("a", "b", "c"):
+        assert [i for c, i in handled if c == campaign] == [0, 1, 2]
+    assert dispatcher.stats["handled"] == 9
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_slow_campaign_does_not_block_others():
+    slow_started = asyncio.Event()
+    release = asyncio.Event()
+    handled = []
+
+    async def handler(event):
+        if event == "slow":
+            slow_started.set()
+            await release.wait()
+        handled.append(event)
+
+    dispatcher = GameLogDispatcher(handler, num_workers=2)
+    dispatcher.start()
+    try:
+        # find a campaign that lands on a different worker than the slow one
+        other = next(c for c in map(str, range(100)) if hash(c) % 2 != hash("slow") % 2)
+        dispatcher.dispatch("slow", "slow")
+        await asyncio.wait_for(slow_started.wait(), 5)
+        dispatcher.dispatch(other, "fast")
+        await asyncio.sleep(0.05)
+        assert handled == ["fast"]
+        release.set()
+        await asyncio.wait_for(dispatcher.join(), 5)
+    finally:
+        await dispatcher.close()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_bounded_queue():
+    release = asyncio.Event()
+
+    async def handler(_):
+        await release.wait()
+
+    dispatcher = GameLogDispatcher(handler, num_workers=1, queue_size=2)
+    dispatcher.start()
+    try:
+        assert dispatcher.dispatch("a", 1)
+        await asyncio.sleep(0)  # the worker takes the first event
+        assert dispatcher.dispatch("a", 2)
+        assert dispatcher.dispatch("a", 3)
+        assert not dispatcher.dispatch("a", 4)
+        assert dispatcher.stats["dropped"] == 1
+        assert dispatcher.queue_sizes() == [2]
+        release.set()
+        await asyncio.wait_for(dispatcher.join(), 5)
+    finally:
+        await dispatcher.close()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_timeout_and_errors():
+    async def handler(event):
+        if event == "hang":
+            await asyncio.sleep(10)
+        raise ValueError("oops")
+
+    dispatcher = GameLogDispatcher(handler, num_workers=1, timeout=0.05)
+    dispatcher.start()
+    try:
+        dispatcher.dispatch("a", "hang")
+        dispatcher.dispatch("a", "error")
+        await asyncio.wait_for(dispatcher.join(), 5)
+    finally:
+        await dispatcher.close()
+
+    assert dispatcher.stats["timed_out"] == 1
+    assert dispatcher.stats["errored"] == 1
+
+
+def test_dispatcher_start_before_loop_runs():
+    # the bot starts the dispatcher while it is being constructed, before its loop runs
+    loop = asyncio.new_event_loop()
+    handled = []
+
+    async def handler(event):
+        handled.append(event)
+
+    dispatcher = GameLogDispatcher(handler, num_workers=2)
+    dispatcher.start(loop)
+    try:
+        dispatcher.dispatch("a", 1)
+        loop.run_until_complete(asyncio.wait_for(dispatcher.join(), 5))
+        loop.run_until_complete(dispatcher.close())
+    finally:
+        loop.close()
+    assert handled == [1]
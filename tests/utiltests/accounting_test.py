@@ -0,0 +1,109 @@
+import asyncio
+
+import fakeredis.aioredis
+import pytest
+
+from utils import accounting
+from utils.executors import BoundedExecutor
+from utils.redisIO import RedisIO
+
+
+@pytest.fixture
+async def rdb():
+    redis = await fakeredis.aioredis.create_redis_pool(commands_factory=accounting.AccountedRedis)
+    yield RedisIO(redis)
+    redis.close()
+    await redis.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_redis_round_trips(rdb):
+    await rdb.set("a", "1")  # outside of a command: not counted anywhere
+    with accounting.account("test") as io_account:
+        await rdb.get("a")
+        await rdb.mget("a", "b")
+        async with rdb.pipeline() as pipe:
+            pipe.get("a")
+            pipe.get("b")
+            pipe.exists("c")
+    # the pipeline is one round trip
+    assert io_account.counts["redis"] == 3
+    assert accounting.current_account() is None
+
+
+@pytest.mark.asyncio
+async def test_accounts_are_per_task(rdb):
+    async def command(name, n):
+        with accounting.account(name) as io_account:
+            for _ in range(n):
+                await rdb.get("a")
+                await asyncio.sleep(0)
+        return io_account
+
+    first, second = await asyncio.gather(command("first", 2), command("second", 5))
+    assert first.counts["redis"] == 2
+    assert second.counts["redis"] == 5
+
+
+@pytest.mark.asyncio
+async def test_executor_hops():
+    executor = BoundedExecutor("test", 1)
+    try:
+        with accounting.account("test") as io_account:
+            await asyncio.get_event_loop().run_in_executor(executor, lambda: 1)
+            await asyncio.get_event_loop().run_in_executor(executor, lambda: 2)
+        assert io_account.counts["executor"] == 2
+        assert io_account.seconds["executor"] > 0
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_accounted():
+    async def api_call():
+        await asyncio.sleep(0)
+
+    api_call = accounting.accounted("discord", api_call)
+    await api_call()
+    with accounting.account("test") as io_account:
+        await api_call()
+        await api_call()
+    assert io_account.counts["discord"] == 2
+    assert "discord=2" in io_account.summary()
+
+
+@pytest.mark.asyncio
+async def test_budget(caplog):
+    @accounting.io_budget(redis=1, mongo=5)
+    async def callback():
+        pass
+
+    command = type("Command", (), {"callback": callback})
+    budget = accounting.get_budget(command)
+    assert budget == {"redis": 1, "mongo": 5}
+
+    with accounting.account("test", budget=budget) as io_account:
+        accounting.record("redis", 0.01, count=3)
+        accounting.record("mongo", 0.01)
+    assert io_account.over_budget(budget) == [("redis", 3, 1)]
+    assert "went over its I/O budget (redis 3/1)" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_nested_accounts():
+    # an alias accounts for its own I/O, and the command it invokes for the command's
+    with accounting.account("alias: foo") as alias_account:
+        accounting.record("mongo", 0.01)
+        with accounting.account("roll") as command_account:
+            accounting.record("mongo", 0.01, count=2)
+        accounting.record("redis", 0.01)
+    assert alias_account.counts == {"mongo": 1, "redis": 1}
+    assert command_account.counts == {"mongo": 2}
+
+
+def test_num_reply_documents():
+    assert accounting._num_reply_documents({"cursor": {"firstBatch": [{}, {}], "id": 0}, "ok": 1}) == 2
+    assert accounting._num_reply_documents({"cursor": {"nextBatch": [{}], "id": 0}, "ok": 1}) == 1
+    assert accounting._num_reply_documents({"value": {"version": 2}, "ok": 1}) == 1
+    assert accounting._num_reply_documents({"value": None, "ok": 1}) == 0
+    assert accounting._num_reply_documents({"n": 3, "ok": 1}) == 0
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from utils.aldclient import AsyncLaunchDarklyClient
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_local_variation():
+    client = AsyncLaunchDarklyClient.local(asyncio.get_running_loop(), {"foo": True, "bar": "baz"})
+    try:
+        assert await client.variation("foo", {"key": "1"}, False) is True
+        assert await client.variation("bar", {"key": "1"}, "default") == "baz"
+        assert await client.variation("missing", {"key": "1"}, 5) == 5
+    finally:
+        client.close()
+
+
+async def test_variation_memo_invalidated_on_change():
+    client = AsyncLaunchDarklyClient.local(asyncio.get_running_loop(), {"foo": True})
+    try:
+        assert await client.variation("foo", {"key": "1"}, False) is True
+        assert ("foo", "1", False) in client._memo
+        client.set_local_flags({"foo": False})
+        assert ("foo", "1", False) not in client._memo
+        assert await client.variation("foo", {"key": "1"}, True) is False
+    finally:
+        client.close()
+
+
+async def test_variation_memo_keyed_on_default():
+    client = AsyncLaunchDarklyClient.local(asyncio.get_running_loop(), {})
+    try:
+        assert await client.variation("missing", {"key": "1"}, 1) == 1
+        assert await client.variation("missing", {"key": "1"}, 2) == 2
+        assert await client.variation("missing", {"key": "1"}, {"unhashable": True}) == {"unhashable": True}
+    finally:
+        client.close()
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import fakeredis.aioredis
+import pytest
+
+from utils import clustering
+from utils.redisIO import RedisIO
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+async def rdb():
+    redis = await fakeredis.aioredis.create_redis_pool()
+    yield RedisIO(redis)
+    redis.close()
+    await redis.wait_closed()
+
+
+async def test_coordination_lock_expires(rdb, monkeypatch):
+    monkeypatch.setattr(clustering, "COORDINATION_LOCK_TTL", 1)
+    # a holder that died without releasing the lock
+    lock_key = f"clusters.{clustering.config.GIT_COMMIT_SHA}.lock:{clustering.config.NUM_CLUSTERS}"
+    await rdb.set(lock_key, "dead", ex=1)
+
+    async with clustering.coordination_lock(rdb):
+        assert await rdb.get(lock_key) != "dead"
+
+
+async def test_bucket_waiters_in_order(rdb, monkeypatch):
+    monkeypatch.setattr(clustering, "IDENTIFY_LEASE_TTL", 1)
+    launched = []
+    hook_calls = []
+
+    async def launch(shard_id):
+        async def hook(first=False):
+            hook_calls.append((shard_id, first))
+            # the hook runs before we join the queue
+            assert not await rdb.exists(f"shards.{clustering.config.GIT_COMMIT_SHA}.queue:0")
+
+        await clustering.wait_bucket_available(shard_id, 0, rdb, pre_lock_hook=hook)
+        launched.append((shard_id, time.monotonic()))
+
+    await asyncio.gather(*(launch(shard_id) for shard_id in range(3)))
+    assert [shard_id for shard_id, _ in launched] == [0, 1, 2]
+    # each shard waits for the previous shard's reservation to run out
+    assert launched[1][1] - launched[0][1] >= 0.9
+    assert launched[2][1] - launched[1][1] >= 0.9
+    assert sorted(hook_calls) == [(0, True), (1, True), (2, True)]
+    # waiters clean up their place in the queue
+    assert not await rdb.exists(f"shards.{clustering.config.GIT_COMMIT_SHA}.queue:0")
+
+
+async def test_bucket_skips_dead_waiter(rdb):
+    queue_key = f"shards.{clustering.config.GIT_COMMIT_SHA}.queue:1"
+    seen_key = f"shards.{clustering.config.GIT_COMMIT_SHA}.queue-seen:1"
+    # a process that joined the queue first, then died
+    async with rdb.pipeline() as pipe:
+        pipe.zadd(queue_key, 1, "dead")
+        pipe.zadd(seen_key, 1, "dead")
+
+    await asyncio.wait_for(clustering.wait_bucket_available(0, 1, rdb), timeout=5)
+    assert await rdb.get(f"shards.{clustering.config.GIT_COMMIT_SHA}.lock:1") == "0"
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from utils import executors
+
+
+@pytest.fixture
+def executor():
+    executor = executors.BoundedExecutor("test", 1)
+    yield executor
+    executor.shutdown()
+
+
+def test_get_executor():
+    try:
+        assert executors.get_executor("image") is executors.get_executor("image")
+        assert executors.get_executor("image") is not executors.get_executor("compendium")
+        assert executors.get_executor("image")._max_workers == executors.EXECUTOR_SIZES["image"]
+        with pytest.raises(KeyError):
+            executors.get_executor("not-an-executor")
+    finally:
+        executors.shutdown_executors()
+
+
+def test_executor_stats(executor):
+    release = threading.Event()
+    blocking = executor.submit(release.wait)
+    waiting = executor.submit(lambda: 1)
+    assert executor.summary()["queued"] >= 1  # the second call can't start until the first is done
+    time.sleep(0.01)
+    release.set()
+    assert blocking.result() and waiting.result() == 1
+
+    def fail():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        executor.submit(fail).result()
+
+    summary = executor.summary()
+    assert summary["queued"] == summary["running"] == 0
+    assert summary["submitted"] == summary["completed"] == 3
+    assert summary["errored"] == 1
+    assert summary["max_queue_time"] > 0
+
+
+@pytest.mark.asyncio
+async def test_run_in_executor():
+    try:
+        thread = await executors.run_in_executor("draconic", threading.get_ident)
+        assert thread != threading.get_ident()
+        assert "draconic" in executors.executor_stats()
+    finally:
+        executors.shutdown_executors()
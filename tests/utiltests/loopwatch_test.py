@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.loopwatch import LoopWatchdog, activity
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+async def watchdog():
+    watchdog = LoopWatchdog(asyncio.get_event_loop(), threshold=0.1, interval=0.01)
+    watchdog.start()
+    await asyncio.sleep(0.05)
+    yield watchdog
+    watchdog.stop()
+
+
+def blocking_call():
+    time.sleep(0.3)
+
+
+async def test_attributes_block_to_activity(watchdog):
+    with activity("command: test"):
+        with activity("automation"):
+            blocking_call()
+    await asyncio.sleep(0.05)
+
+    assert watchdog.stats["blocked"] == 1
+    assert watchdog.offenders["command: test > automation"] == 1
+    assert watchdog.blocked_time["command: test > automation"] >= 0.2
+    assert "blocking_call" in watchdog.stacks["command: test > automation"]
+    assert watchdog.top_offenders()[0][0] == "command: test > automation"
+
+
+async def test_unlabelled_task(watchdog):
+    async def unlabelled():
+        blocking_call()
+
+    await asyncio.create_task(unlabelled())
+    await asyncio.sleep(0.05)
+
+    assert watchdog.offenders["task: test_unlabelled_task.<locals>.unlabelled"] == 1
+
+
+async def test_no_block(watchdog):
+    with activity("command: test"):
+        await asyncio.sleep(0.2)
+    assert watchdog.stats["blocked"] == 0
+    assert watchdog.stats["beats"] > 0
+
+
+async def test_activity_outside_task():
+    # no running loop: nothing to attribute to, but the block still runs
+    def run():
+        with activity("command: test"):
+            return 1
+
+    assert await asyncio.get_event_loop().run_in_executor(None, run) == 1
@@ -0,0 +1,102 @@
+import json
+
+import fakeredis.aioredis
+import pytest
+
+from utils.redisIO import JSONSerializer, ORJSONSerializer, RedisIO, decode_object, encode_object
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+async def rdb():
+    redis = await fakeredis.aioredis.create_redis_pool()
+    yield RedisIO(redis)
+    redis.close()
+    await redis.wait_closed()
+
+
+async def test_mget_mset(rdb):
+    await rdb.mset({"a": "1", "b": "2"})
+    assert await rdb.mget("a", "missing", "b") == ["1", None, "2"]
+    assert await rdb.mget("missing", default="x") == ["x"]
+    assert await rdb.mget() == []
+
+
+async def test_mset_expiry(rdb):
+    await rdb.mset({"a": "1", "b": "2"}, ex=100)
+    assert await rdb.mget("a", "b") == ["1", "2"]
+    assert 0 < await rdb.ttl("a") <= 100
+    assert 0 < await rdb.ttl("b") <= 100
+
+
+async def test_hmget(rdb):
+    await rdb.set_dict("h", {"a": "1", "b": "2"})
+    assert await rdb.hmget("h", "b", "missing", "a") == ["2", None, "1"]
+
+
+@pytest.mark.parametrize("serializer", [JSONSerializer(), ORJSONSerializer()])
+async def test_objects(serializer):
+    redis = await fakeredis.aioredis.create_redis_pool()
+    rdb = RedisIO(redis, serializer=serializer)
+    try:
+        obj = {"foo": [1, 2.5, None, "bar"], "baz": True}
+        await rdb.set_object("o", obj, ex=100)
+        assert await rdb.get_object("o") == obj
+        assert await rdb.get_object("missing", default={}) == {}
+        assert 0 < await rdb.ttl("o") <= 100
+
+        await rdb.mset_objects({"a": [1], "b": {"c": "d"}})
+        assert await rdb.mget_objects("a", "missing", "b") == [[1], None, {"c": "d"}]
+    finally:
+        redis.close()
+        await redis.wait_closed()
+
+
+async def test_objects_read_plain_json(rdb):
+    # values written by jset() before framing existed can still be read
+    await rdb.jset("legacy", {"a": 1})
+    assert await rdb.get_object("legacy") == {"a": 1}
+    assert await rdb.mget_objects("legacy") == [{"a": 1}]
+
+
+async def test_frames():
+    obj = {"a": [1, 2]}
+    json_data = encode_object(obj, JSONSerializer())
+    orjson_data = encode_object(obj, ORJSONSerializer())
+    assert json_data != orjson_data
+    assert decode_object(json_data) == decode_object(orjson_data) == obj
+    assert decode_object(json.dumps(obj).encode()) == obj
+    with pytest.raises(ValueError):
+        decode_object(b"\x00\xffgarbage")
+
+
+async def test_pipeline(rdb):
+    await rdb.set("a", "1")
+    await rdb.jset("j", {"x": 1})
+    async with rdb.pipeline() as pipe:
+        a = pipe.get("a")
+        missing = pipe.get("missing", default="default")
+        j = pipe.jget("j")
+        pipe.set("b", "2", ex=100)
+        pipe.hset("h", "f", "v")
+        incr = pipe.incr("counter")
+    assert a.result() == "1"
+    assert missing.result() == "default"
+    assert j.result() == {"x": 1}
+    assert incr.result() == 1
+    assert await rdb.get("b") == "2"
+    assert await rdb.hget("h", "f") == "v"
+
+
+async def test_transaction(rdb):
+    async with rdb.transaction() as tr:
+        tr.set("a", "1")
+        tr.hset("h", "f", "v")
+        exists = tr.exists("a")
+        hexists = tr.hexists("h", "f")
+        hlen = tr.hlen("h")
+    assert exists.result() == 1
+    assert hexists.result() is True
+    assert hlen.result() == 1
+    assert await rdb.get("a") == "1"
@@ -37,7 +37,7 @@ class CharacterSettingsMenuBase(MenuBase, abc.ABC):
         This is significantly more efficient than using Character.commit().
         """
         self.character.options = self.settings
-        await self.settings.commit(self.bot.mdb, self.character)
+        await self.settings.commit(self.bot.mdb, self.character, self.bot.rdb)
 
     async def can_do_character_sync(self):
         """Returns a pair of bools (outbound_possible, inbound_possible)."""
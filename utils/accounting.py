@@ -0,0 +1,231 @@
+"""
+Per-command I/O accounting.
+
+Each command invocation (and each alias, for the I/O it does before invoking its command) runs with an IOAccount in a
+contextvar, which the I/O layers add to as the command runs: Mongo
+commands (through a pymongo command listener), Redis round trips, HTTP requests (through an aiohttp trace config),
+executor hops and Discord API calls. When the command finishes, its account is logged, reported to Datadog, and checked
+against the command's I/O budget, if it has one (see :func:`io_budget`).
+"""
+import asyncio
+import collections
+import contextlib
+import contextvars
+import functools
+import logging
+import threading
+import time
+
+import aiohttp
+import aioredis
+from aioredis.commands.transaction import _RedisBuffer
+
+from utils import config
+
+log = logging.getLogger(__name__)
+
+IO_KINDS = ("mongo", "redis", "http", "executor", "discord")
+
+_account = contextvars.ContextVar("io_account", default=None)
+
+
+class IOAccount:
+    """The I/O done by one command invocation."""
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = collections.Counter()  # map: kind -> number of operations
+        self.seconds = collections.Counter()  # map: kind -> time spent waiting on operations
+        self.mongo_docs = 0  # the number of documents mongo replied with
+        self.start = time.monotonic()
+        self.end = None
+        self._lock = threading.Lock()  # mongo and executor work is recorded from other threads
+
+    def record(self, kind, seconds, count=1):
+        with self._lock:
+            self.counts[kind] += count
+            self.seconds[kind] += seconds
+
+    def record_mongo_docs(self, num_docs):
+        with self._lock:
+            self.mongo_docs += num_docs
+
+    @property
+    def elapsed(self):
+        return (self.end or time.monotonic()) - self.start
+
+    def over_budget(self, budget):
+        """
+        Returns a list of (kind, used, limit) for each limit of the budget this account went over.
+
+        :param budget: A map of kind -> the most operations of that kind the command should do, plus "mongo_docs" and
+                       "seconds" for the most documents Mongo should return and the longest the command should take.
+        """
+        used = {**self.counts, "mongo_docs": self.mongo_docs, "seconds": self.elapsed}
+        return [(kind, used.get(kind, 0), limit) for kind, limit in budget.items() if used.get(kind, 0) > limit]
+
+    def summary(self):
+        parts = []
+        for kind in IO_KINDS:
+            if not self.counts[kind]:
+                continue
+            part = f"{kind}={self.counts[kind]} ({self.seconds[kind] * 1000:.0f}ms"
+            if kind == "mongo":
+                part += f", {self.mongo_docs} docs"
+            parts.append(part + ")")
+        return f"{self.name}: {self.elapsed * 1000:.0f}ms total; {' '.join(parts) or 'no I/O'}"
+
+
+def current_account():
+    """Returns the account of the running command, or None if we are not in a command."""
+    return _account.get()
+
+
+def record(kind, seconds, count=1):
+    """Adds an operation to the running command's account, if there is one."""
+    if (io_account := _account.get()) is not None:
+        io_account.record(kind, seconds, count)
+
+
+@contextlib.contextmanager
+def account(name, budget=None):
+    """Accounts for all I/O done in this block as the I/O of the command *name*, then reports it."""
+    io_account = IOAccount(name)
+    token = _account.set(io_account)
+    try:
+        yield io_account
+    finally:
+        _account.reset(token)
+        io_account.end = time.monotonic()
+        _report(io_account, budget)
+
+
+def _report(io_account, budget):
+    log.debug(f"I/O: {io_account.summary()}")
+    if budget and (over := io_account.over_budget(budget)):
+        over_str = ", ".join(f"{kind} {used:.0f}/{limit}" for kind, used, limit in over)
+        log.warning(f"Command {io_account.name} went over its I/O budget ({over_str}): {io_account.summary()}")
+    if config.DD_SERVICE is not None:
+        from utils import datadog
+
+        datadog.report_command_io(io_account)
+
+
+def io_budget(**limits):
+    """
+    Decorator for command callbacks that sets the most I/O an invocation of the command should do; invocations that go
+    over are logged. Takes the same keys as :meth:`IOAccount.over_budget`.
+
+    .. code-block:: python
+
+        @commands.command()
+        @io_budget(mongo=4, redis=10, seconds=2)
+        async def my_command(self, ctx): ...
+    """
+
+    def decorator(func):
+        func.__io_budget__ = limits
+        return func
+
+    return decorator
+
+
+def get_budget(command):
+    """Returns the I/O budget of a command, or None if it has none."""
+    return getattr(command.callback, "__io_budget__", None)
+
+
+# ==== hooks ====
+def accounted(kind, func):
+    """Wraps a coroutine function so each call to it is added to the running command's account as a *kind* call."""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _account.get() is None:
+            return await func(*args, **kwargs)
+        start = time.monotonic()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            record(kind, time.monotonic() - start)
+
+    return wrapper
+
+
+class AccountedRedis(aioredis.Redis):
+    """A Redis client that adds each command it sends to the running command's account as a round trip."""
+
+    def execute(self, command, *args, **kwargs):
+        result = super().execute(command, *args, **kwargs)
+        io_account = _account.get()
+        # commands buffered in a pipeline are sent together, so the pipeline counts them itself
+        if io_account is None or isinstance(self._pool_or_conn, _RedisBuffer):
+            return result
+
+        start = time.monotonic()
+        # a future, or a coroutine if the command is waiting for a free connection
+        result = asyncio.ensure_future(result)
+        result.add_done_callback(lambda _: io_account.record("redis", time.monotonic() - start))
+        return result
+
+
+def http_trace_config():
+    """Returns an aiohttp trace config that adds each request of a session to the running command's account."""
+
+    async def on_request_start(session, trace_config_ctx, params):
+        trace_config_ctx.io_account = _account.get()
+        trace_config_ctx.start = time.monotonic()
+
+    async def on_request_end(session, trace_config_ctx, params):
+        if trace_config_ctx.io_account is not None:
+            trace_config_ctx.io_account.record("http", time.monotonic() - trace_config_ctx.start)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_end)
+    return trace_config
+
+
+def install_mongo_hooks():
+    """
+    Makes motor carry the running command's account into the threads it runs pymongo on, and returns a pymongo command
+    listener (to pass to the client as an event listener) that adds each Mongo command to the account.
+    """
+    import motor.frameworks.asyncio
+    import pymongo.monitoring
+
+    real_run_on_executor = motor.frameworks.asyncio.run_on_executor
+
+    def run_on_executor(loop, fn, *args, **kwargs):
+        return real_run_on_executor(loop, contextvars.copy_context().run, fn, *args, **kwargs)
+
+    motor.frameworks.asyncio.run_on_executor = run_on_executor
+
+    class MongoCommandListener(pymongo.monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            if (io_account := _account.get()) is None:
+                return
+            io_account.record("mongo", event.duration_micros / 1_000_000)
+            io_account.record_mongo_docs(_num_reply_documents(event.reply))
+
+        def failed(self, event):
+            if (io_account := _account.get()) is not None:
+                io_account.record("mongo", event.duration_micros / 1_000_000)
+
+    return MongoCommandListener()
+
+
+def _num_reply_documents(reply):
+    """
+    Returns the number of documents in a Mongo command reply: the batch of a cursor (find, aggregate, getMore) or the
+    document of a findAndModify. This is a cheap stand-in for the size of the reply, which would mean encoding it again.
+    """
+    if (cursor := reply.get("cursor")) is not None:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if reply.get("value") is not None:
+        return 1
+    return 0
@@ -1,19 +1,142 @@
 """
 Asyncio wrapper for launchdarkly client to ensure flag evaluation is not a blocking call.
 """
+import threading
+
+import cachetools
 import ldclient
+from ldclient.feature_store import InMemoryFeatureStore
+from ldclient.interfaces import FeatureStore
+from ldclient.versioned_data_kind import FEATURES
+
+from utils.executors import get_executor
+
+# how long to remember the result of a flag evaluation for a given user, in seconds
+FLAG_MEMO_TTL = 30
+FLAG_MEMO_SIZE = 50000
+
+_MISSING = object()
 
 
 class AsyncLaunchDarklyClient(ldclient.LDClient):
-    """Works exactly like a normal LDClient, except certain blocking methods run in a separate thread."""
+    """
+    Works exactly like a normal LDClient, except certain blocking methods run in a separate thread.
+
+    Flag evaluations are memoized per (flag key, user key, default) for a short time, and the memo is cleared whenever
+    the flag store receives new flag data.
+    """
 
-    def __init__(self, loop, sdk_key, *args, **kwargs):
-        config = ldclient.Config(sdk_key=sdk_key, *args, **kwargs)
+    def __init__(self, loop, sdk_key, *args, feature_store=None, **kwargs):
+        if feature_store is None:
+            feature_store = InMemoryFeatureStore()
+        self._memo = cachetools.TTLCache(maxsize=FLAG_MEMO_SIZE, ttl=FLAG_MEMO_TTL)
+        # the flag store is updated from the LaunchDarkly streaming thread, while the memo is used on the loop
+        self._memo_lock = threading.Lock()
+        self._memo_generation = 0  # bumped each time the flags change
+        feature_store = _InvalidatingFeatureStore(feature_store, on_change=self._on_flags_changed)
+        config = ldclient.Config(sdk_key=sdk_key, *args, feature_store=feature_store, **kwargs)
         super().__init__(config=config)
         self.loop = loop
 
-    async def variation(self, key, user, default):  # run variation evaluation in a separate thread
-        return await self.loop.run_in_executor(None, super().variation, key, user, default)
+    @classmethod
+    def local(cls, loop, flags: dict):
+        """
+        Returns a client that evaluates flags from a local store, without connecting to LaunchDarkly.
+        Each flag is served to every user with the given value; use :meth:`set_local_flags` to change them.
+        """
+        store = InMemoryFeatureStore()
+        store.init({FEATURES: {}})
+        inst = cls(loop, "local", feature_store=store, use_ldd=True, send_events=False, diagnostic_opt_out=True)
+        inst.set_local_flags(flags)
+        return inst
+
+    def set_local_flags(self, flags: dict):
+        """Sets the value of flags served by a local client (see :meth:`local`)."""
+        store = self.get_feature_store()
+        for key, value in flags.items():
+            existing = store.get(FEATURES, key, lambda x: x)
+            version = existing["version"] + 1 if existing else 1
+            store.upsert(FEATURES, _static_flag(key, value, version))
+
+    def get_feature_store(self):
+        """Returns the underlying flag store."""
+        return self._config.feature_store
+
+    def _on_flags_changed(self):
+        with self._memo_lock:
+            self._memo_generation += 1
+            self._memo.clear()
+
+    async def variation(self, key, user, default):
+        memo_key = (key, (user or {}).get("key"), default)
+        try:
+            with self._memo_lock:
+                value = self._memo.get(memo_key, _MISSING)
+                generation = self._memo_generation
+        except TypeError:  # unhashable default, don't memoize
+            memo_key = None
+            value = _MISSING
+        if value is not _MISSING:
+            return value
+
+        # if the flags are in memory, evaluation is cheap and we don't need another thread
+        if self.get_feature_store().initialized:
+            value = super().variation(key, user, default)
+            if memo_key is not None:
+                with self._memo_lock:
+                    # don't remember a value from flags that changed while we were evaluating
+                    if generation == self._memo_generation:
+                        self._memo[memo_key] = value
+            return value
+
+        # run variation evaluation in a separate thread
+        return await self.loop.run_in_executor(get_executor("launchdarkly"), super().variation, key, user, default)
+
+
+class _InvalidatingFeatureStore(FeatureStore):
+    """Wraps a feature store, calling *on_change* whenever the flag data it holds changes."""
+
+    def __init__(self, store: FeatureStore, on_change):
+        self._store = store
+        self._on_change = on_change
+
+    def get(self, kind, key, callback=lambda x: x):
+        return self._store.get(kind, key, callback)
+
+    def all(self, kind, callback=lambda x: x):
+        return self._store.all(kind, callback)
+
+    def init(self, all_data):
+        self._store.init(all_data)
+        self._on_change()
+
+    def delete(self, kind, key, version):
+        self._store.delete(kind, key, version)
+        self._on_change()
+
+    def upsert(self, kind, item):
+        self._store.upsert(kind, item)
+        self._on_change()
+
+    @property
+    def initialized(self):
+        return self._store.initialized
+
+
+def _static_flag(key, value, version=1):
+    """Returns the representation of a flag that is always on and serves *value* to everyone."""
+    return {
+        "key": key,
+        "version": version,
+        "on": True,
+        "variations": [value],
+        "fallthrough": {"variation": 0},
+        "offVariation": 0,
+        "targets": [],
+        "rules": [],
+        "prerequisites": [],
+        "salt": "",
+    }
 
 
 def discord_user_to_dict(user):
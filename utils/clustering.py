@@ -18,6 +18,7 @@ else:
     figure out which task died, and take over for it
 """
 import asyncio
+import collections
 import datetime
 import json
 import logging
@@ -33,6 +34,18 @@ from utils import config
 
 log = logging.getLogger(__name__)
 
+# if the coordinating cluster dies, other clusters can take over coordination after this long, in seconds
+COORDINATION_LOCK_TTL = 120
+# discord allows one identify per bucket every 5 seconds
+IDENTIFY_LEASE_TTL = 5
+# how long a process can go without checking in before it loses its place in a bucket's queue, in seconds
+IDENTIFY_WAITER_TTL = 15
+# how long to give the first in line to reserve a free bucket before checking on it again, in seconds
+IDENTIFY_HANDOFF_GRACE = 0.5
+
+_waiter_id = str(uuid.uuid4())  # identifies this process in bucket queues
+_bucket_locks = collections.defaultdict(asyncio.Lock)  # bucket id -> lock held by the shard of ours waiting on it
+
 
 async def coordinate_shards(bot):
     if bot.shard_ids is not None:  # we're already set up
@@ -55,9 +68,15 @@ async def _coordinate_shards(bot):
     }
     """
     cluster_coordination_key = f"clusters.{config.GIT_COMMIT_SHA}:{config.NUM_CLUSTERS}"
-    coordinator_exists = await bot.rdb.exists(cluster_coordination_key)
     my_task_arn, my_family, my_ecs_cluster_name = await _get_ecs_metadata()
 
+    # read the state of the coordinator in one round trip (we hold the coordination lock, so it can't change under us)
+    async with bot.rdb.pipeline() as pipe:
+        coordinator_exists = pipe.exists(cluster_coordination_key)
+        canonical_num_shards = pipe.hget(cluster_coordination_key, "num_shards")
+        num_coordinator_fields = pipe.hlen(cluster_coordination_key)
+        my_id_exists = pipe.hexists(cluster_coordination_key, my_task_arn)
+
     # poll discord - how many shards, max concurrency?
     try:
         data = await bot.http.request(discord.http.Route("GET", "/gateway/bot"))
@@ -74,9 +93,9 @@ async def _coordinate_shards(bot):
         log.info(f"Resets at: {reset_at}")
 
     # get the total number of shards running on this acct
-    if coordinator_exists:
+    if coordinator_exists.result():
         # get the canonical number of shards
-        bot.shard_count = int(await bot.rdb.hget(cluster_coordination_key, "num_shards"))
+        bot.shard_count = int(canonical_num_shards.result())
     else:
         if config.NUM_SHARDS is not None:
             recommended_shards = config.NUM_SHARDS
@@ -88,9 +107,9 @@ async def _coordinate_shards(bot):
     log.debug(f"SHARD_COUNT={bot.shard_count}; MAX_CONCURRENCY={bot.launch_max_concurrency}")
 
     # claim unclaimed shards, or take over a dead task
-    num_existing_clusters = await bot.rdb.hlen(cluster_coordination_key) - 1
-    my_id_exists = await bot.rdb.hexists(cluster_coordination_key, my_task_arn)
-    if my_id_exists:
+    # the coordinator holds num_shards and one field per cluster
+    num_existing_clusters = max(num_coordinator_fields.result() - 1, 0)
+    if my_id_exists.result():
         await _claim_existing_cluster(bot, my_task_arn, cluster_coordination_key)
     elif num_existing_clusters < config.NUM_CLUSTERS:
         await _claim_new_cluster_shards(bot, my_task_arn, cluster_coordination_key, num_existing_clusters)
@@ -163,13 +182,23 @@ async def _take_over_dead_cluster(bot, my_task_arn, cluster_coordination_key, my
 # lock: don't race when coordinating clusters
 @asynccontextmanager
 async def coordination_lock(rdb):
+    """
+    Holds the cluster coordination lock for the duration of the block.
+
+    Waiters block on a wake list that the holder pushes to when it releases the lock, so the longest waiter is woken
+    as soon as the lock is free. The lock is a lease: if its holder dies, it expires after COORDINATION_LOCK_TTL.
+    """
     cluster_lock_key = f"clusters.{config.GIT_COMMIT_SHA}.lock:{config.NUM_CLUSTERS}"
+    wake_key = f"{cluster_lock_key}.wake"
     lock_value = str(uuid.uuid4())
-    i = 0
-    while not await rdb.setnx(cluster_lock_key, lock_value):
-        await asyncio.sleep(1)
-        i += 1
-        log.debug(f"Waiting for lock... ({i}s)")
+    start = time.monotonic()
+    while not await rdb.set(cluster_lock_key, lock_value, ex=COORDINATION_LOCK_TTL, nx=True):
+        ttl = await rdb.ttl(cluster_lock_key)
+        if ttl == -2:  # released between our SET and TTL
+            continue
+        # wait to be woken by the holder, or for the lease to run out
+        await rdb.blpop(wake_key, timeout=max(ttl, 1))
+        log.debug(f"Waiting for lock... ({time.monotonic() - start:.0f}s)")
 
     log.info(f"Acquired lock with value {lock_value!r}, coordinating shards!")
     try:
@@ -179,6 +208,11 @@ async def coordination_lock(rdb):
         locking_val = await rdb.get(cluster_lock_key)
         if locking_val == lock_value:
             await rdb.delete(cluster_lock_key)
+            # wake the next waiter; keep at most one token around in case no one is waiting
+            async with rdb.transaction() as tr:
+                tr.rpush(wake_key, lock_value)
+                tr.ltrim(wake_key, 0, 0)
+                tr.expire(wake_key, COORDINATION_LOCK_TTL)
         else:
             log.warning(f"Lock value is not what we set (ours was {lock_value!r}, is {locking_val!r}), ignoring value!")
 
@@ -186,22 +220,62 @@ async def coordination_lock(rdb):
 # lock: each shard reserves the bucket for 5s by doing a SET NX EX with the currently launching shard id
 async def wait_bucket_available(shard_id, bucket_id, rdb, *, pre_lock_hook=None):
     """
-    Waits until the given shard bucket is available. Calls ``pre_lock_hook`` exactly once before each attempt
-    to lock the appropriate bucket, with a kwarg ``first=True`` for the first attempt.
+    Waits until the given shard bucket is available, then reserves it for IDENTIFY_LEASE_TTL seconds.
+    Calls ``pre_lock_hook`` once (with a kwarg ``first=True``) before joining the queue for the bucket, so a hook that
+    waits a while doesn't hold up the processes behind this one or lose its place in the queue.
+
+    Shards take a bucket in the order they started waiting for it: the shards of this process queue on a local lock,
+    and the processes waiting on a bucket queue in a sorted set, where a process that stops checking in for
+    IDENTIFY_WAITER_TTL seconds loses its place. Rather than polling, a waiter sleeps until the current reservation
+    expires, which is exactly when the bucket frees up.
     """
     if pre_lock_hook is None:
 
         async def pre_lock_hook(first=False):
-            if not first:
-                await asyncio.sleep(0.2)
-
-    # this might be improved by using a semaphore instead of a lock for each bucket - unclear how the Discord
-    # concurrency ratelimit operates, but this could mitigate the grocery store checkout problem
-    cluster_lock_key = f"shards.{config.GIT_COMMIT_SHA}.lock:{bucket_id}"
-    start = time.monotonic()
-    await pre_lock_hook(first=True)
-    while not await rdb.set(cluster_lock_key, shard_id, ex=5, nx=True):
-        await pre_lock_hook()
-        log.debug(f"Waiting for shard lock... ({time.monotonic() - start:.2}s)")
+            pass
+
+    lease_key = f"shards.{config.GIT_COMMIT_SHA}.lock:{bucket_id}"
+    queue_key = f"shards.{config.GIT_COMMIT_SHA}.queue:{bucket_id}"
+    seen_key = f"shards.{config.GIT_COMMIT_SHA}.queue-seen:{bucket_id}"
+    async with _bucket_locks[bucket_id]:
+        await pre_lock_hook(first=True)
+        start = time.monotonic()
+        try:
+            while True:
+                # check in, and see who is first in line and when the bucket frees up
+                now = time.time()
+                async with rdb.pipeline() as pipe:
+                    pipe.zadd(queue_key, now, _waiter_id, nx=True)
+                    pipe.zadd(seen_key, now, _waiter_id)
+                    pipe.expire(queue_key, IDENTIFY_WAITER_TTL)
+                    pipe.expire(seen_key, IDENTIFY_WAITER_TTL)
+                    queue = pipe.zrange(queue_key)
+                    alive = pipe.zrangebyscore(seen_key, now - IDENTIFY_WAITER_TTL)
+                    lease_ms = pipe.pttl(lease_key)
+                alive = set(alive.result())
+                waiters = [w for w in queue.result() if w in alive]
+                if dead := [w for w in queue.result() if w not in alive]:
+                    log.info(f"Removing {len(dead)} dead waiters from bucket {bucket_id}")
+                    async with rdb.pipeline() as pipe:
+                        pipe.zrem(queue_key, *dead)
+                        pipe.zrem(seen_key, *dead)
+
+                lease_ms = lease_ms.result()
+                if waiters[0] == _waiter_id and lease_ms == -2:  # our turn, and the bucket is free
+                    if await rdb.set(lease_key, shard_id, ex=IDENTIFY_LEASE_TTL, nx=True):
+                        break
+                    continue
+
+                # sleep until the bucket frees up; if it is already free, give the first in line a moment to take it
+                delay = lease_ms / 1000 if lease_ms > 0 else IDENTIFY_HANDOFF_GRACE
+                log.debug(
+                    f"Waiting for shard lock... ({time.monotonic() - start:.2f}s, "
+                    f"{waiters.index(_waiter_id)} ahead in queue)"
+                )
+                await asyncio.sleep(delay)
+        finally:
+            async with rdb.pipeline() as pipe:
+                pipe.zrem(queue_key, _waiter_id)
+                pipe.zrem(seen_key, _waiter_id)
 
     log.info(f"Bucket {bucket_id} is available, launching shard ID {shard_id}")
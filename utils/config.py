@@ -36,6 +36,10 @@ DEFAULT_PREFIX = os.getenv("DEFAULT_PREFIX", "!")
 # ---- monitoring ----
 SENTRY_DSN = os.getenv("SENTRY_DSN")
 DD_SERVICE = os.getenv("DD_SERVICE")
+# if set, report whenever the event loop is blocked for longer than this many seconds
+LOOP_WATCHDOG_THRESHOLD = (
+    float(os.getenv("LOOP_WATCHDOG_THRESHOLD")) if "LOOP_WATCHDOG_THRESHOLD" in os.environ else None
+)
 
 # ---- character sheets ---
 NO_DICECLOUD = os.environ.get("NO_DICECLOUD", "DICECLOUD_USER" not in os.environ)
@@ -56,6 +60,10 @@ DDB_AUTH_SERVICE_URL = os.getenv("DDB_AUTH_SERVICE_URL")
 DYNAMO_REGION = os.getenv("DYNAMO_REGION", "us-east-1")  # actually AWS_REGION for all resources :p
 DYNAMO_ENTITLEMENTS_TABLE = os.getenv("DYNAMO_ENTITLEMENTS_TABLE", "entitlements-live")
 NLP_KINESIS_DELIVERY_STREAM = os.getenv("NLP_KINESIS_DELIVERY_STREAM")
+# optional - if set, NLP events are appended to this file as JSON lines instead of being sent to kinesis
+NLP_LOCAL_SINK_PATH = os.getenv("NLP_LOCAL_SINK_PATH")
+NLP_BATCH_SIZE = int(os.getenv("NLP_BATCH_SIZE", 100))  # firehose accepts at most 500 records per batch
+NLP_FLUSH_INTERVAL = float(os.getenv("NLP_FLUSH_INTERVAL", 5))
 # env: AWS_ACCESS_KEY_ID
 # env: AWS_SECRET_ACCESS_KEY
 
@@ -1,3 +1,4 @@
+import contextlib
 import logging
 
 import discord
@@ -23,6 +24,7 @@ class AvraeContext(Context):
         self._exploration = _sentinel
         self._encounter = _sentinel
         self._server_settings = _sentinel
+        self.combat_lock = None  # set by Combat.acquire_lock to serialize combat modifications
         # NLP metadata
         self.nlp_is_alias = False  # set in aliasing.helpers
         self.nlp_character = None  # set just below
@@ -53,11 +55,28 @@ class AvraeContext(Context):
         :rtype: Combat
         """
         if self._combat is not _sentinel:
+            # the lock may have been released since the combat was loaded (e.g. in a command completion listener)
+            await Combat.acquire_lock(self)
             return self._combat
         combat = await Combat.from_ctx(self)
         self._combat = combat
         return combat
 
+    @contextlib.asynccontextmanager
+    async def combat_unlocked(self):
+        """
+        Lets other commands use the channel's combat for the duration of the block (e.g. while waiting for the user to
+        reply to a prompt), if this invocation holds its lock, and takes the lock again after.
+        """
+        if self.combat_lock is None:
+            yield
+            return
+        Combat.release_lock(self)
+        try:
+            yield
+        finally:
+            await Combat.acquire_lock(self)
+
     async def get_exploration(self):
         """
         Gets the exploration active in this context.
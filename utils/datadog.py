@@ -2,6 +2,7 @@ import logging
 
 import ddtrace
 import ddtrace.sampler
+from ddtrace.constants import MANUAL_KEEP_KEY
 from ddtrace.profiling import Profiler
 
 from utils import config
@@ -62,3 +63,34 @@ def _patch_aliasing():
             await real_handle_aliases(*args, **kwargs)
 
     aliasing.helpers.handle_aliases = _handle_aliases
+
+
+# ==== reporting ====
+def _start_kept_span(name, resource):
+    """
+    Starts a span in a trace of its own that is always kept, so reports are counted in full instead of being sampled
+    like regular traces.
+    """
+    span = ddtrace.tracer.start_span(name, resource=resource)
+    span.set_tag(MANUAL_KEEP_KEY)
+    return span
+
+
+def report_loop_block(duration, activity, stack=None):
+    """Reports that the event loop was blocked for *duration* seconds by *activity* (see utils.loopwatch)."""
+    span = _start_kept_span("event_loop.blocked", resource=activity)
+    span.set_metric("blocked.seconds", duration)
+    if stack is not None:
+        span.set_tag("blocked.stack", stack)
+    span.finish()
+
+
+def report_command_io(io_account):
+    """Reports the I/O a command did (see utils.accounting)."""
+    span = _start_kept_span("command.io", resource=io_account.name)
+    span.set_metric("io.seconds", io_account.elapsed)
+    for kind in io_account.counts:
+        span.set_metric(f"io.{kind}.count", io_account.counts[kind])
+        span.set_metric(f"io.{kind}.seconds", io_account.seconds[kind])
+    span.set_metric("io.mongo.docs", io_account.mongo_docs)
+    span.finish()
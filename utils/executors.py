@@ -0,0 +1,102 @@
+"""
+Named thread pools for blocking work.
+
+Each class of blocking work runs on a pool of its own with its own size limit, so one class saturating its pool (e.g. a
+compendium reload) cannot starve the others (e.g. alias evaluation), as it would if they all shared the loop's default
+executor.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import threading
+import time
+
+from utils import accounting
+
+# map: executor name -> max number of threads
+EXECUTOR_SIZES = {
+    "draconic": 8,  # alias/snippet evaluation
+    "launchdarkly": 2,  # flag evaluation before the flag store is initialized
+    "gsheet": 8,  # gspread calls
+    "dicecloud": 2,  # dicecloud client connection
+    "compendium": 1,  # compendium reloads
+    "image": 2,  # token image processing
+    "sheet-parse": 4,  # character sheet parsing, see cogs5e.sheets.utils.ParseScheduler
+    "nlp-sink": 1,  # NLP event writes to a local file, see cogs5e.initiative.upenn_nlp.FileSink
+}
+
+_executors = {}
+
+
+class BoundedExecutor(concurrent.futures.ThreadPoolExecutor):
+    """A thread pool that keeps count of how much work is waiting for it and running on it."""
+
+    def __init__(self, name, max_workers):
+        super().__init__(max_workers=max_workers, thread_name_prefix=name)
+        self.name = name
+        self.stats = collections.Counter()  # submitted, completed, errored
+        self.queued = 0
+        self.running = 0
+        self.max_queue_time = 0.0  # the longest any work has waited for a thread, in seconds
+        self._stats_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._stats_lock:
+            self.queued += 1
+            self.stats["submitted"] += 1
+        io_account = accounting.current_account()
+        return super().submit(self._run, time.monotonic(), io_account, fn, args, kwargs)
+
+    def _run(self, submitted_at, io_account, fn, args, kwargs):
+        with self._stats_lock:
+            self.queued -= 1
+            self.running += 1
+            self.max_queue_time = max(self.max_queue_time, time.monotonic() - submitted_at)
+        try:
+            return fn(*args, **kwargs)
+        except BaseException:
+            with self._stats_lock:
+                self.stats["errored"] += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self.running -= 1
+                self.stats["completed"] += 1
+            if io_account is not None:
+                io_account.record("executor", time.monotonic() - submitted_at)
+
+    def summary(self):
+        return {
+            "size": self._max_workers,
+            "queued": self.queued,
+            "running": self.running,
+            "max_queue_time": round(self.max_queue_time, 3),
+            **self.stats,
+        }
+
+
+def get_executor(name) -> BoundedExecutor:
+    """
+    Returns the executor for the given class of work, creating it on first use.
+
+    :param name: The name of the executor, one of the keys of EXECUTOR_SIZES.
+    """
+    if name not in _executors:
+        _executors[name] = BoundedExecutor(name, EXECUTOR_SIZES[name])
+    return _executors[name]
+
+
+def run_in_executor(name, func, *args):
+    """Runs ``func(*args)`` on the named executor, returning an awaitable for its result."""
+    return asyncio.get_event_loop().run_in_executor(get_executor(name), func, *args)
+
+
+def executor_stats():
+    """Returns a map of executor name -> summary of its usage, for every executor that has been used."""
+    return {name: executor.summary() for name, executor in _executors.items()}
+
+
+def shutdown_executors():
+    for executor in _executors.values():
+        executor.shutdown(wait=False)
+    _executors.clear()
@@ -4,6 +4,7 @@ Created on Oct 29, 2016
 @author: andrew
 """
 import asyncio
+import contextlib
 import logging
 import random
 import re
@@ -228,7 +229,8 @@ async def get_selection(ctx, choices, delete=True, pm=False, message=None, force
             selectMsg = await ctx.author.send(embed=embed)
 
         try:
-            m = await ctx.bot.wait_for("message", timeout=30, check=chk)
+            async with _waiting_for_reply(ctx):
+                m = await ctx.bot.wait_for("message", timeout=30, check=chk)
         except asyncio.TimeoutError:
             m = None
 
@@ -272,7 +274,8 @@ async def confirm(ctx, message, delete_msgs=False, response_check=get_positivity
     """
     msg = await ctx.channel.send(message)
     try:
-        reply = await ctx.bot.wait_for("message", timeout=30, check=auth_and_chan(ctx))
+        async with _waiting_for_reply(ctx):
+            reply = await ctx.bot.wait_for("message", timeout=30, check=auth_and_chan(ctx))
     except asyncio.TimeoutError:
         return None
     reply_bool = response_check(reply.content) if reply is not None else None
@@ -285,6 +288,15 @@ async def confirm(ctx, message, delete_msgs=False, response_check=get_positivity
     return reply_bool
 
 
+def _waiting_for_reply(ctx):
+    """
+    Returns a context manager to wait for the user's reply in. The channel's combat is not held while the user takes
+    their time (see AvraeContext.combat_unlocked).
+    """
+    combat_unlocked = getattr(ctx, "combat_unlocked", None)
+    return combat_unlocked() if combat_unlocked is not None else contextlib.nullcontext()
+
+
 # ==== display helpers ====
 def a_or_an(string, upper=False):
     if string.startswith("^") or string.endswith("^"):
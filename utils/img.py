@@ -1,7 +1,6 @@
 """
 Image processing utilities.
 """
-import asyncio
 import enum
 import hashlib
 import os
@@ -11,6 +10,8 @@ import aiohttp
 from PIL import Image, ImageChops
 
 from cogs5e.models.errors import ExternalImportError
+from utils import accounting
+from utils.executors import run_in_executor
 
 TOKEN_SIZE = (256, 256)
 
@@ -70,7 +71,7 @@ async def generate_token(img_url, is_subscriber=False, token_args=None):
         return out_bytes
 
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[accounting.http_trace_config()]) as session:
             async with session.get(img_url) as resp:
                 if not 199 < resp.status < 300:
                     raise ExternalImportError(
@@ -81,7 +82,7 @@ async def generate_token(img_url, is_subscriber=False, token_args=None):
                 if not content_type.startswith("image/"):
                     raise ExternalImportError(f"This does not look like an image file (content type {content_type}).")
                 img_bytes = await resp.read()
-        processed = await asyncio.get_event_loop().run_in_executor(None, process_img, img_bytes, template)
+        processed = await run_in_executor("image", process_img, img_bytes, template)
     except Exception:
         raise
 
@@ -103,7 +104,7 @@ async def fetch_monster_image(img_url: str):
     if os.path.exists(cache_path):
         return cache_path
 
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(trace_configs=[accounting.http_trace_config()]) as session:
         async with session.get(img_url) as resp:
             if not 199 < resp.status < 300:
                 raise ExternalImportError(
@@ -0,0 +1,157 @@
+"""
+Optional watchdog that detects when the event loop is blocked, and by what.
+
+A heartbeat task on the loop notes every time it runs. A sampling thread watches the heartbeat: when the loop has not
+run it for longer than the threshold, the loop is stuck in a callback, so the thread captures the loop thread's stack
+and the activity (command, alias, automation) of the task that is running. When the loop gets going again, the block is
+logged, counted against that activity, and reported to Datadog.
+"""
+import asyncio
+import collections
+import contextlib
+import logging
+import sys
+import threading
+import time
+import traceback
+import weakref
+
+from utils import config
+
+log = logging.getLogger(__name__)
+
+# how often the heartbeat runs and the sampling thread checks on it, in seconds
+LOOP_WATCH_INTERVAL = 0.05
+# the number of frames of the loop thread's stack to keep
+STACK_DEPTH = 12
+# the number of offenders to remember a stack for
+MAX_OFFENDERS = 100
+
+_activities = weakref.WeakKeyDictionary()  # map: task -> what it is doing
+
+
+@contextlib.contextmanager
+def activity(label):
+    """
+    Attributes anything that blocks the loop while the current task is in this block to *label*
+    (e.g. ``command: attack``). Activities nest, so automation run by a command is attributed to both.
+    """
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:  # no running loop
+        task = None
+    if task is None:
+        yield
+        return
+
+    previous = _activities.get(task)
+    _activities[task] = label if previous is None else f"{previous} > {label}"
+    try:
+        yield
+    finally:
+        if previous is None:
+            _activities.pop(task, None)
+        else:
+            _activities[task] = previous
+
+
+class LoopWatchdog:
+    def __init__(self, loop, threshold, interval=LOOP_WATCH_INTERVAL):
+        """
+        :param threshold: How long the loop can be blocked before it is reported, in seconds.
+        """
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = interval
+        self.stats = collections.Counter()  # beats, blocked
+        self.max_lag = 0.0
+        self.offenders = collections.Counter()  # map: activity -> number of blocks
+        self.blocked_time = collections.Counter()  # map: activity -> total time blocked, in seconds
+        self.stacks = {}  # map: activity -> stack of its latest block
+        self._last_beat = time.monotonic()
+        self._captured_beat = None  # the beat we last captured a stack after, so each block is captured once
+        self._capture = None  # (activity, stack) captured by the sampling thread, waiting to be recorded
+        self._capture_lock = threading.Lock()
+        self._loop_thread_id = None
+        self._task = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Starts watching the loop. Must be called from the loop's thread."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = self.loop.create_task(self._heartbeat())
+        threading.Thread(target=self._sample, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def top_offenders(self, n=10):
+        """Returns a list of (activity, number of blocks, total time blocked) of the activities that blocked most."""
+        return [(name, count, self.blocked_time[name]) for name, count in self.offenders.most_common(n)]
+
+    # ==== loop ====
+    async def _heartbeat(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            self.stats["beats"] += 1
+            lag = now - start - self.interval
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self._record_block(lag)
+
+    def _record_block(self, lag):
+        with self._capture_lock:
+            capture, self._capture = self._capture, None
+        name, stack = capture if capture is not None else ("unknown", None)
+
+        self.stats["blocked"] += 1
+        self.offenders[name] += 1
+        self.blocked_time[name] += lag
+        if stack is not None:
+            self.stacks[name] = stack
+        if len(self.stacks) > MAX_OFFENDERS:
+            # forget the stacks of the activities that have blocked least
+            keep = {activity for activity, _ in self.offenders.most_common(MAX_OFFENDERS)}
+            self.stacks = {activity: s for activity, s in self.stacks.items() if activity in keep}
+
+        log.warning(f"Event loop was blocked for {lag:.3f}s by {name}:\n{stack or '(no stack captured)'}")
+        if config.DD_SERVICE is not None:
+            from utils import datadog
+
+            datadog.report_loop_block(lag, name, stack)
+
+    # ==== sampling thread ====
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            last_beat = self._last_beat
+            # the heartbeat sleeps for an interval between beats, so the loop is only blocked for the time past that
+            if time.monotonic() - last_beat - self.interval < self.threshold or self._captured_beat == last_beat:
+                continue
+            self._captured_beat = last_beat
+            try:
+                capture = self._capture_loop_state()
+            except Exception:
+                log.warning("Could not capture blocked event loop state", exc_info=True)
+                continue
+            with self._capture_lock:
+                self._capture = capture
+
+    def _capture_loop_state(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)[-STACK_DEPTH:]) if frame is not None else None
+        task = asyncio.current_task(self.loop)
+        if task is None:
+            name = "callback"
+        else:
+            name = _activities.get(task) or f"task: {task.get_coro().__qualname__}"
+        return name, stack
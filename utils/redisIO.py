@@ -4,9 +4,76 @@ Created on Dec 28, 2016
 @author: andrew
 """
 import abc
+import asyncio
 import json
 import logging
+import time
 import uuid
+from contextlib import asynccontextmanager
+
+import orjson
+
+from utils import accounting, config
+
+# channel used to send commands to all clusters
+COMMAND_PUBSUB_CHANNEL = f"admin-commands:{config.ENVIRONMENT}"  # >:c
+
+
+# ==== serialization ====
+# framed payloads start with this byte, followed by one byte identifying the serializer that wrote them
+# unframed payloads are plain JSON, as written by jset() and friends
+FRAME_MARKER = b"\x00"
+
+
+class Serializer(abc.ABC):
+    """Turns objects into bytes to store in redis and back. Each serializer has a unique one-byte *frame_id*."""
+
+    frame_id: bytes
+
+    @abc.abstractmethod
+    def dumps(self, obj) -> bytes:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def loads(self, data: bytes):
+        raise NotImplementedError
+
+
+class JSONSerializer(Serializer):
+    frame_id = b"\x01"
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj).encode()
+
+    def loads(self, data: bytes):
+        return json.loads(data)
+
+
+class ORJSONSerializer(Serializer):
+    frame_id = b"\x02"
+
+    def dumps(self, obj) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, data: bytes):
+        return orjson.loads(data)
+
+
+SERIALIZERS = {s.frame_id: s for s in (JSONSerializer(), ORJSONSerializer())}
+
+
+def encode_object(obj, serializer: Serializer) -> bytes:
+    return FRAME_MARKER + serializer.frame_id + serializer.dumps(obj)
+
+
+def decode_object(data: bytes):
+    """Decodes a payload written by encode_object() with any known serializer, or a plain JSON payload."""
+    if not data.startswith(FRAME_MARKER):
+        return json.loads(data)
+    serializer = SERIALIZERS.get(data[1:2])
+    if serializer is None:
+        raise ValueError(f"Unknown serializer frame {data[1:2]!r}")
+    return serializer.loads(data[2:])
 
 
 class RedisIO:
@@ -14,11 +81,13 @@ class RedisIO:
     A simple class to interface with the redis database.
     """
 
-    def __init__(self, _db):
+    def __init__(self, _db, serializer: Serializer = None):
         """
         :type _db: :class:`aioredis.Redis`
+        :param serializer: The serializer used to write objects with set_object() and friends. Defaults to orjson.
         """
         self._db = _db
+        self.serializer = serializer or SERIALIZERS[ORJSONSerializer.frame_id]
 
     async def get(self, key, default=None):
         encoded_data = await self._db.get(key)
@@ -56,6 +125,45 @@ class RedisIO:
         async for key_bin in self._db.iscan(match=match, count=count):
             yield key_bin.decode()
 
+    async def mget(self, *keys, default=None):
+        """Gets the values of many keys in one round trip, returning a list in the same order."""
+        if not keys:
+            return []
+        values = await self._db.mget(*keys, encoding="utf-8")
+        return [value if value is not None else default for value in values]
+
+    async def mset(self, mapping, *, ex=0):
+        """Sets many keys in one round trip, optionally all expiring after *ex* seconds."""
+        if not mapping:
+            return
+        if not ex:
+            pairs = [item for pair in mapping.items() for item in pair]
+            return await self._db.mset(*pairs)
+        async with self.transaction() as tr:
+            for key, value in mapping.items():
+                tr.set(key, value, ex=ex)
+
+    # ==== objects ====
+    async def get_object(self, key, default=None):
+        """Gets an object written by set_object() (or a JSON value written by jset())."""
+        data = await self._db.get(key)
+        return decode_object(data) if data is not None else default
+
+    async def set_object(self, key, obj, *, ex=0):
+        """Sets a key to an object, serialized with this instance's serializer."""
+        return await self.set(key, encode_object(obj, self.serializer), ex=ex)
+
+    async def mget_objects(self, *keys, default=None):
+        """Gets many objects in one round trip, returning a list in the same order."""
+        if not keys:
+            return []
+        values = await self._db.mget(*keys)
+        return [decode_object(value) if value is not None else default for value in values]
+
+    async def mset_objects(self, mapping, *, ex=0):
+        """Sets many keys to objects in one round trip, optionally all expiring after *ex* seconds."""
+        await self.mset({key: encode_object(obj, self.serializer) for key, obj in mapping.items()}, ex=ex)
+
     # ==== hashmaps ====
     async def set_dict(self, key, dictionary):
         return await self._db.hmset_dict(key, **dictionary)
@@ -75,6 +183,13 @@ class RedisIO:
         out = await self._db.hget(key, field, encoding="utf-8")
         return out if out is not None else default
 
+    async def hmget(self, key, *fields, default=None):
+        """Gets many fields of a hash in one round trip, returning a list in the same order."""
+        if not fields:
+            return []
+        values = await self._db.hmget(key, *fields, encoding="utf-8")
+        return [value if value is not None else default for value in values]
+
     async def hset(self, key, field, value):
         return await self._db.hset(key, field, value)
 
@@ -128,6 +243,20 @@ class RedisIO:
     async def rpush(self, key, *values):
         return await self._db.rpush(key, *values)
 
+    async def blpop(self, key, *, timeout=0):
+        """
+        Pops the first item of a list, waiting up to *timeout* seconds (forever if 0) for one to be pushed.
+        Returns None on timeout. Blocks a connection of its own, so other commands are not held up behind it.
+        """
+        with await self._db as conn:
+            result = await conn.blpop(key, timeout=timeout, encoding="utf-8")
+        return result[1] if result is not None else None
+
+    # ==== scripting ====
+    async def eval(self, script, keys=None, args=None):
+        """Runs a Lua script atomically on the server."""
+        return await self._db.eval(script, keys=keys or [], args=args or [])
+
     # ==== pubsub ====
     async def subscribe(self, *channels):
         return await self._db.subscribe(*channels)
@@ -135,12 +264,136 @@ class RedisIO:
     async def publish(self, channel, data):
         return await self._db.publish(channel, data)
 
+    # ==== batching ====
+    @asynccontextmanager
+    async def pipeline(self):
+        """
+        Batches commands to be sent in one round trip when the block exits. Commands are not atomic.
+
+        .. code-block:: python
+
+            async with rdb.pipeline() as pipe:
+                a = pipe.get("a")
+                b = pipe.jget("b")
+            print(a.result(), b.result())
+        """
+        batch = RedisBatch(self._db.pipeline())
+        yield batch
+        await batch.execute()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Like pipeline(), but the commands are run atomically in a MULTI/EXEC block."""
+        batch = RedisBatch(self._db.multi_exec())
+        yield batch
+        await batch.execute()
+
     # ==== misc ====
     async def close(self):
         self._db.close()
         await self._db.wait_closed()
 
 
+class RedisBatch:
+    """
+    A batch of commands created by :meth:`RedisIO.pipeline` or :meth:`RedisIO.transaction`.
+    Each command returns a future that resolves to its result once the batch is executed.
+    """
+
+    def __init__(self, pipe):
+        self._pipe = pipe
+        self._results = []
+
+    def _then(self, fut, transform):
+        out = asyncio.get_event_loop().create_future()
+
+        def callback(f):
+            if f.cancelled():
+                out.cancel()
+            elif f.exception() is not None:
+                out.set_exception(f.exception())
+            else:
+                try:
+                    out.set_result(transform(f.result()))
+                except Exception as e:
+                    out.set_exception(e)
+
+        fut.add_done_callback(callback)
+        self._results.append(out)
+        return out
+
+    async def execute(self):
+        start = time.monotonic()
+        await self._pipe.execute()
+        accounting.record("redis", time.monotonic() - start)
+        # let the result callbacks run so every future is resolved when the batch exits
+        await asyncio.gather(*self._results, return_exceptions=True)
+
+    def get(self, key, default=None):
+        return self._then(self._pipe.get(key, encoding="utf-8"), lambda v: v if v is not None else default)
+
+    def set(self, key, value, *, ex=0):
+        return self._then(self._pipe.set(key, value, expire=ex), lambda v: v)
+
+    def delete(self, *keys):
+        return self._then(self._pipe.delete(*keys), lambda v: v)
+
+    def exists(self, *keys):
+        return self._then(self._pipe.exists(*keys), lambda v: v)
+
+    def incr(self, key):
+        return self._then(self._pipe.incr(key), lambda v: v)
+
+    def expire(self, key, seconds):
+        return self._then(self._pipe.expire(key, seconds), lambda v: v)
+
+    def pttl(self, key):
+        return self._then(self._pipe.pttl(key), lambda v: v)
+
+    def jget(self, key, default=None):
+        return self._then(self._pipe.get(key), lambda v: json.loads(v) if v is not None else default)
+
+    def jset(self, key, data, *, ex=0):
+        return self.set(key, json.dumps(data), ex=ex)
+
+    def get_object(self, key, default=None):
+        return self._then(self._pipe.get(key), lambda v: decode_object(v) if v is not None else default)
+
+    def hget(self, key, field, default=None):
+        return self._then(self._pipe.hget(key, field, encoding="utf-8"), lambda v: v if v is not None else default)
+
+    def hset(self, key, field, value):
+        return self._then(self._pipe.hset(key, field, value), lambda v: v)
+
+    def hdel(self, key, *fields):
+        return self._then(self._pipe.hdel(key, *fields), lambda v: v)
+
+    def hlen(self, key):
+        return self._then(self._pipe.hlen(key), lambda v: v)
+
+    def hexists(self, key, field):
+        return self._then(self._pipe.hexists(key, field), lambda v: bool(v))
+
+    def rpush(self, key, *values):
+        return self._then(self._pipe.rpush(key, *values), lambda v: v)
+
+    def ltrim(self, key, start, stop):
+        return self._then(self._pipe.ltrim(key, start, stop), lambda v: v)
+
+    def zadd(self, key, score, member, *, nx=False):
+        exist = self._pipe.ZSET_IF_NOT_EXIST if nx else None
+        return self._then(self._pipe.zadd(key, score, member, exist=exist), lambda v: v)
+
+    def zrem(self, key, *members):
+        return self._then(self._pipe.zrem(key, *members), lambda v: v)
+
+    def zrange(self, key, start=0, stop=-1):
+        return self._then(self._pipe.zrange(key, start, stop, encoding="utf-8"), lambda v: v)
+
+    def zrangebyscore(self, key, min=float("-inf"), max=float("inf")):
+        return self._then(self._pipe.zrangebyscore(key, min, max, encoding="utf-8"), lambda v: v)
+
+
 class _PubSubMessageBase(abc.ABC):
     def __init__(self, type, id, sender):
         self.type = type
@@ -167,12 +420,16 @@ class PubSubCommand(_PubSubMessageBase):
 
     @classmethod
     def new(cls, bot, command, args=None, kwargs=None):
+        return cls.new_from(bot.cluster_id, command, args, kwargs)
+
+    @classmethod
+    def new_from(cls, sender, command, args=None, kwargs=None):
         if args is None:
             args = []
         if kwargs is None:
             kwargs = {}
         _id = str(uuid.uuid4())
-        return cls(_id, bot.cluster_id, command, args, kwargs)
+        return cls(_id, sender, command, args, kwargs)
 
     def to_dict(self):
         inst = super(PubSubCommand, self).to_dict()
@@ -208,4 +465,15 @@ def deserialize_ps_msg(message: str):
     return PS_DESER_MAP[t].from_dict(data)
 
 
+async def publish_command(rdb, command, args=None, kwargs=None, sender=None):
+    """
+    Sends a command to all clusters (including this one) that does not expect a reply, such as a cache invalidation.
+    Commands are handled by the AdminUtils cog.
+
+    :type rdb: RedisIO
+    """
+    request = PubSubCommand.new_from(sender, command, args, kwargs)
+    return await rdb.publish(COMMAND_PUBSUB_CHANNEL, request.to_json())
+
+
 pslogger = logging.getLogger("rdb.pubsub")
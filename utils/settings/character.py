@@ -3,6 +3,7 @@ from typing import Optional
 
 from pydantic import ValidationError, conint
 from pydantic.color import Color
+from pymongo import ReturnDocument
 
 from utils.functions import get_positivity
 from . import SettingsBaseModel
@@ -46,15 +47,23 @@ class CharacterSettings(SettingsBaseModel):
             srslots=old_settings.get("srslots") or False,
         )
 
-    async def commit(self, mdb, character):
-        """Commits the settings to the database for a given character."""
-        await mdb.characters.update_one(
+    async def commit(self, mdb, character, rdb=None):
+        """
+        Commits the settings to the database for a given character.
+        If *rdb* is passed, also tells other clusters to drop their cached copy of the character.
+        """
+        result = await mdb.characters.find_one_and_update(
             {"owner": character.owner, "upstream": character.upstream},
             {
                 "$set": {"options_v2": self.dict()},
                 "$unset": {"options": True},  # delete any old options - they should have been converted by now
+                "$inc": {"version": 1},
             },
+            projection={"version": True, "_id": False},
+            return_document=ReturnDocument.AFTER,
         )
+        if result is not None:
+            await character.on_commit(result["version"], rdb)
 
 
 # ==== legacy csettings ====
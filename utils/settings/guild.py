@@ -1,6 +1,7 @@
 import enum
 from typing import List, Optional, Literal
 
+import cachetools
 import disnake
 from pydantic import BaseModel
 
@@ -9,6 +10,10 @@ from utils.enums import CritDamageType
 
 DEFAULT_DM_ROLE_NAMES = {"dm", "gm", "dungeon master", "game master"}
 
+# guild id -> ServerSettings
+# invalidated on all clusters when settings are committed; the TTL bounds staleness if an invalidation is missed
+_settings_cache = cachetools.TTLCache(maxsize=20000, ttl=60 * 60)
+
 
 class InlineRollingType(enum.IntEnum):
     DISABLED = 0
@@ -46,17 +51,28 @@ class ServerSettings(SettingsBaseModel):
     @classmethod
     async def for_guild(cls, mdb, guild_id: int):
         """Returns the server settings for a given guild."""
+        if (cached := _settings_cache.get(guild_id)) is not None:
+            return cached.copy(deep=True)
+
         # new-style
         existing = await mdb.guild_settings.find_one({"guild_id": guild_id})
         if existing is not None:
-            return cls.parse_obj(existing)
-
+            inst = cls.parse_obj(existing)
         # old-style lookupsettings
-        old_style = await mdb.lookupsettings.find_one({"server": str(guild_id)})
-        if old_style is not None:
-            return cls.from_old_lookupsettings(guild_id, old_style)
+        elif (old_style := await mdb.lookupsettings.find_one({"server": str(guild_id)})) is not None:
+            inst = cls.from_old_lookupsettings(guild_id, old_style)
+            # migrate to new-style so we don't have to check old-style again
+            await mdb.guild_settings.update_one({"guild_id": guild_id}, {"$setOnInsert": inst.dict()}, upsert=True)
+        else:
+            inst = cls(guild_id=guild_id)
 
-        return cls(guild_id=guild_id)
+        _settings_cache[guild_id] = inst
+        return inst.copy(deep=True)
+
+    @staticmethod
+    def invalidate(guild_id: int):
+        """Removes the cached settings for a given guild from this process' cache."""
+        _settings_cache.pop(guild_id, None)
 
     @classmethod
     def from_old_lookupsettings(cls, guild_id: int, d):
@@ -68,9 +84,18 @@ class ServerSettings(SettingsBaseModel):
             lookup_pm_result=d.get("pm_result", False),
         )
 
-    async def commit(self, mdb):
-        """Commits the settings to the database."""
+    async def commit(self, mdb, rdb=None):
+        """
+        Commits the settings to the database.
+        If *rdb* is passed, also tells all other clusters to drop their cached copy of these settings.
+        """
         await mdb.guild_settings.update_one({"guild_id": self.guild_id}, {"$set": self.dict()}, upsert=True)
+        _settings_cache[self.guild_id] = self.copy(deep=True)
+        if rdb is not None:
+            # imported here since utils.redisIO is not needed by most users of settings
+            from utils.redisIO import publish_command
+
+            await publish_command(rdb, "invalidate_server_settings", [self.guild_id])
 
     # ==== helpers ====
     def is_dm(self, member: disnake.Member):